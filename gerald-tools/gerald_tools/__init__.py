@@ -1,2 +1,34 @@
-from .utils import *
-from .dataset import GERALDDataset
\ No newline at end of file
+import importlib
+
+from .utils.labels import *
+from .utils.tools import *
+from .utils.label_map import LabelMap
+from . import utils
+from .profiling import StageProfiler
+
+# Names that need torch, torchvision or OpenCV are imported on first access, so that labels and annotations can be
+# used in processes that never load images
+_LAZY = {"GERALDDataset": ".dataset",
+         "GERALDExporter": ".export",
+         "GERALDPreviewer": ".preview",
+         "GERALDSampler": ".sampler",
+         "HardExampleSampler": ".sampler",
+         "GERALDValidator": ".validate",
+         "fit_anchors": ".anchors"}
+
+
+def __getattr__(name):
+    if name in utils._LAZY:  # Transforms are forwarded to gerald_tools.utils, which owns their lazy imports
+        value = getattr(utils, name)
+        globals()[name] = value
+        return value
+    if name not in _LAZY:
+        raise AttributeError("module %r has no attribute %r" % (__name__, name))
+    module = importlib.import_module(_LAZY[name], __name__)
+    value = module if module.__name__.endswith("." + name) else getattr(module, name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY) | set(utils._LAZY))
@@ -0,0 +1,215 @@
+import argparse
+import json
+import time
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+
+from .utils.box_ops import wh_iou
+
+
+def box_table(annotations, im_input_size=(512, 512), label_map=None) -> np.ndarray:
+    """
+    Width and height of all boxes, rescaled from the source image size to the model input size
+    :param annotations: List of Annotation, e.g. GERALDDataset.subset_annotations
+    :param im_input_size: Model input size (w, h)
+    :param label_map: If given, boxes it drops or ignores are left out
+    :return: nx2 float64 ndarray
+    """
+    n_objects = np.array([len(an.objects) for an in annotations], dtype=np.int64)
+    src_size = np.array([(an.src_width, an.src_height) for an in annotations], dtype=np.float64).reshape((-1, 2))
+    wh = np.array([(o.w, o.h) for an in annotations for o in an.objects], dtype=np.float64).reshape((-1, 2))
+    wh *= np.asarray(im_input_size, dtype=np.float64) / np.repeat(src_size, n_objects, axis=0)
+    keep = (wh > 0).all(1)
+    if label_map is not None:
+        keep &= label_map([o.label.value for an in annotations for o in an.objects],
+                          [o.relevant for an in annotations for o in an.objects]) >= 0
+    return wh[keep]
+
+
+def _unique_weighted(wh: np.ndarray, decimals=1):
+    """
+    Collapses identical box sizes into one point with a weight, boxes are mostly a few thousand distinct sizes
+    """
+    return np.unique(np.round(wh, decimals), axis=0, return_counts=True)
+
+
+def _init_plus_plus(x, weights, k, rng):
+    """
+    k-means++ seeding with the IoU distance
+    """
+    centers = [x[rng.choice(len(x), p=weights / weights.sum())]]
+    dist = 1 - wh_iou(x, np.array(centers))[:, 0]
+    for _ in range(1, k):
+        p = weights * dist ** 2
+        if p.sum() <= 0:  # Fewer distinct sizes than anchors
+            p = weights
+        centers.append(x[rng.choice(len(x), p=p / p.sum())])
+        dist = np.minimum(dist, 1 - wh_iou(x, centers[-1][None])[:, 0])
+    return np.array(centers)
+
+
+def kmeans_anchors(wh: np.ndarray, k=9, iters=100, batch_size: Optional[int] = None, tol=1e-6,
+                   seed=331297) -> np.ndarray:
+    """
+    k-means with the distance 1 - IoU, identical box sizes are weighted instead of repeated
+    :param wh: nx2 box widths and heights
+    :param k: Number of anchors
+    :param iters: Maximum number of iterations (mini-batches)
+    :param batch_size: If given, mini-batch k-means on batches of this many boxes
+    :param tol: Stop when no anchor moves more than this (full batch only)
+    :param seed: Seed for initialization and batches
+    :return: kx2 anchors sorted by area
+    """
+    rng = np.random.default_rng(seed)
+    x, weights = _unique_weighted(wh)
+    weights = weights.astype(np.float64)
+    centers = _init_plus_plus(x, weights, k, rng)
+    seen = np.zeros(k)  # Boxes per anchor so far, gives the per anchor learning rate of mini-batch k-means
+
+    for _ in range(iters):
+        if batch_size is not None and batch_size < weights.sum():
+            idx = rng.choice(len(x), size=batch_size, p=weights / weights.sum())
+            bx, bw = x[idx], np.ones(batch_size)
+        else:
+            bx, bw = x, weights
+
+        assign = wh_iou(bx, centers).argmax(1)
+        mass = np.bincount(assign, weights=bw, minlength=k)
+        sums = np.stack([np.bincount(assign, weights=bw * bx[:, i], minlength=k) for i in range(2)], axis=1)
+        filled = mass > 0
+
+        new = centers.copy()
+        if batch_size is not None:
+            seen += mass
+            rate = np.divide(mass, seen, out=np.zeros(k), where=seen > 0)[:, None]
+            new[filled] += rate[filled] * (sums[filled] / mass[filled, None] - centers[filled])
+        else:
+            new[filled] = sums[filled] / mass[filled, None]
+            if not filled.all():  # Move empty anchors to the worst covered boxes
+                worst = np.argsort(wh_iou(x, new).max(1))[:np.count_nonzero(~filled)]
+                new[~filled] = x[worst]
+            if np.abs(new - centers).max() < tol:
+                centers = new
+                break
+        centers = new
+
+    return centers[np.argsort(centers.prod(1))]
+
+
+def kmedoids_anchors(wh: np.ndarray, k=9, iters=20, batch_size=256, seed=331297) -> np.ndarray:
+    """
+    Alternating k-medoids with the distance 1 - IoU, anchors are always sizes of real boxes
+    :param wh: nx2 box widths and heights
+    :param k: Number of anchors
+    :param iters: Maximum number of iterations
+    :param batch_size: Maximum number of medoid candidates evaluated per cluster and iteration
+    :param seed: Seed for initialization and candidate sampling
+    :return: kx2 anchors sorted by area
+    """
+    rng = np.random.default_rng(seed)
+    x, weights = _unique_weighted(wh)
+    weights = weights.astype(np.float64)
+    medoids = _init_plus_plus(x, weights, k, rng)
+
+    for _ in range(iters):
+        assign = wh_iou(x, medoids).argmax(1)
+        new = medoids.copy()
+        for j in range(k):
+            members = np.flatnonzero(assign == j)
+            if len(members) == 0:
+                continue
+            if len(members) > batch_size:  # Random candidates plus the current medoid, the cost never increases
+                candidates = x[rng.choice(members, batch_size - 1, replace=False)]
+                candidates = np.concatenate([medoids[j:j + 1], candidates])
+            else:
+                candidates = x[members]
+            cost = (1 - wh_iou(candidates, x[members])) @ weights[members]
+            new[j] = candidates[np.argmin(cost)]
+        if np.array_equal(new, medoids):
+            break
+        medoids = new
+
+    return medoids[np.argsort(medoids.prod(1))]
+
+
+def best_possible_recall(wh: np.ndarray, anchors: np.ndarray, iou_threshold=0.5) -> Dict:
+    """
+    How well a set of anchors covers the boxes, if every box may use its best anchor
+    :param wh: nx2 box widths and heights
+    :param anchors: kx2 anchors
+    :param iou_threshold: IoU a box needs with its best anchor to count as recalled
+    :return: Dict with best possible recall, mean best IoU and the number of boxes per anchor
+    """
+    iou = wh_iou(wh, anchors)
+    best = iou.max(1)
+    return {"bpr": float((best >= iou_threshold).mean()) if len(best) else 0.0,
+            "mean_iou": float(best.mean()) if len(best) else 0.0,
+            "boxes_per_anchor": np.bincount(iou.argmax(1), minlength=len(anchors)).tolist()}
+
+
+def fit_anchors(annotations, n_anchors: Sequence[int] = (3, 6, 9), im_input_sizes=((512, 512),), method="kmeans",
+                batch_size: Optional[int] = None, iou_threshold=0.5, seed=331297, label_map=None) -> Dict:
+    """
+    Fits anchor sets for every combination of model input size and number of anchors
+    :param annotations: List of Annotation, e.g. GERALDDataset.subset_annotations
+    :param n_anchors: Numbers of anchors to fit
+    :param im_input_sizes: Model input sizes (w, h)
+    :param method: "kmeans" or "kmedoids"
+    :param batch_size: Mini-batch size, full batch k-means if None
+    :param iou_threshold: IoU threshold of the best possible recall
+    :param seed: Seed for initialization
+    :param label_map: If given, boxes it drops or ignores are left out
+    :return: Dict "<w>x<h>" -> number of anchors -> anchors, best possible recall and mean IoU
+    """
+    if method not in ("kmeans", "kmedoids"):
+        raise ValueError("Method " + method + " is invalid!")
+
+    result = {}
+    for size in im_input_sizes:
+        wh = box_table(annotations, size, label_map)
+        fits = {}
+        for k in n_anchors:
+            t0 = time.perf_counter()
+            if method == "kmeans":
+                anchors = kmeans_anchors(wh, k, batch_size=batch_size, seed=seed)
+            else:
+                anchors = kmedoids_anchors(wh, k, batch_size=batch_size or 256, seed=seed)
+            fits[k] = {"anchors": np.round(anchors, 2).tolist(),
+                       **best_possible_recall(wh, anchors, iou_threshold),
+                       "time_s": time.perf_counter() - t0}
+        result["%dx%d" % tuple(size)] = fits
+    return result
+
+
+def main(argv=None):
+    from .dataset import GERALDDataset
+
+    parser = argparse.ArgumentParser(description="Fits detector anchors to the boxes of GERALD")
+    parser.add_argument("-p", "--path", type=str, required=True, help="Path to GERALD dataset")
+    parser.add_argument("-s", "--subset", type=str, default="train", help="Subset the anchors are fitted on")
+    parser.add_argument("-k", "--n-anchors", type=int, nargs="+", default=[3, 6, 9], help="Numbers of anchors")
+    parser.add_argument("-i", "--input-size", type=int, nargs="+", default=[512, 512],
+                        help="Model input sizes as w h pairs, e.g. 512 512 1024 576")
+    parser.add_argument("-m", "--method", type=str, default="kmeans", choices=["kmeans", "kmedoids"])
+    parser.add_argument("-b", "--batch-size", type=int, default=None, help="Mini-batch size")
+    parser.add_argument("-o", "--out", type=str, default=None, help="Output JSON file")
+    args = parser.parse_args(argv)
+
+    if len(args.input_size) % 2:
+        parser.error("Input sizes have to be given as w h pairs")
+    sizes = list(zip(args.input_size[::2], args.input_size[1::2]))
+
+    dataset = GERALDDataset(args.path, subset=args.subset)
+    result = fit_anchors(dataset.subset_annotations, args.n_anchors, sizes, method=args.method,
+                         batch_size=args.batch_size, label_map=dataset.label_map)
+    text = json.dumps(result, indent=2)
+    if args.out:
+        with open(args.out, 'w') as fp:
+            fp.write(text)
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
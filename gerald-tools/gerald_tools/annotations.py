@@ -0,0 +1,168 @@
+import json
+import logging
+import os
+import threading
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from .utils import Annotation, GERALDLabels, WeatherCondition, LightCondition
+from .utils.files import file_fingerprint
+from .voc import VOCRecord, read_voc_xml
+
+_registries: Dict[str, "AnnotationRegistry"] = {}
+_registries_lock = threading.Lock()
+
+
+def import_xml_annotation(xml_path: str, infos: Dict) -> Annotation:
+    """
+    Parses a single Pascal VOC annotation of GERALD
+    :param xml_path: Path to the XML file
+    :param infos: Content of the info.json of the dataset
+    :return: Annotation
+    """
+    return annotation_from_record(read_voc_xml(xml_path), infos)
+
+
+def annotation_from_record(record: VOCRecord, infos: Dict) -> Annotation:
+    """
+    Creates an Annotation from parsed VOC content and the info.json of the dataset
+    :param record: Parsed XML file
+    :param infos: Content of the info.json of the dataset
+    :return: Annotation
+    """
+    annotation = Annotation()
+
+    annotation.src_name = record.filename
+    annotation.src_width = record.width
+    annotation.src_height = record.height
+    annotation.src_depth = record.depth
+    annotation.src_time = float(annotation.src_name.split("=")[1][:-4]) if "=" in annotation.src_name else 0.0
+
+    if annotation.src_name in infos:
+        annotation.weather = WeatherCondition[infos[annotation.src_name]["weather"]]
+        annotation.light = LightCondition[infos[annotation.src_name]["light"]]
+        annotation.author = infos[annotation.src_name]["author"]
+        annotation.author_url = infos[annotation.src_name]["author url"]
+        annotation.src_url = infos[annotation.src_name]["source url"]
+        annotation.hash = _hex_to_hash(infos[annotation.src_name]["pHash"])
+
+    if record.weather is not None:
+        annotation.weather = WeatherCondition[record.weather]
+    if record.light is not None:
+        annotation.light = LightCondition[record.light]
+
+    boxes = np.round(record.boxes).astype(np.int64).tolist()
+    for name, difficult, (x_min, y_min, x_max, y_max) in zip(record.names, record.difficult.tolist(), boxes):
+        annotation.add_ground_truth_object(x_min, y_min, x_max, y_max, GERALDLabels[name], bool(difficult))
+
+    return annotation
+
+
+def _hex_to_hash(phash: str):
+    from imagehash import hex_to_hash  # Pulls in PIL and scipy, only needed if there is an info.json entry
+    return hex_to_hash(phash)
+
+
+def get_annotation_registry(path: str) -> "AnnotationRegistry":
+    """
+    Returns the annotation registry of a dataset directory, all datasets on the same path share one registry
+    :param path: Path to the GERALD dataset
+    :return: AnnotationRegistry
+    """
+    key = os.path.realpath(path)
+    with _registries_lock:
+        if key not in _registries:
+            _registries[key] = AnnotationRegistry(path)
+        return _registries[key]
+
+
+class AnnotationRegistry:
+    def __init__(self, path: str):
+        """
+        Keeps the parsed annotations of one dataset directory and re-parses only files that changed on disk
+        :param path: Path to the GERALD dataset
+        """
+        self.path = path
+        self.an_path = os.path.join(path, "Annotations")
+        self.info_path = os.path.join(path, "info.json")
+
+        self.infos = {}
+        self._info_fingerprint = None
+        self._entries: Dict[str, Tuple[Tuple[int, int], Annotation]] = {}
+        self._filenames: List[str] = []
+        self.version = 0  # Incremented whenever the annotations change
+        self._lock = threading.RLock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.pop("_lock")  # Locks can not be pickled, e.g. for DataLoader workers started with spawn
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, filename):
+        return filename in self._entries
+
+    def __getitem__(self, filename) -> Annotation:
+        return self._entries[filename][1]
+
+    @property
+    def filenames(self) -> List[str]:
+        """
+        Filenames (without extension) of all annotations, sorted like the XML files in the directory listing
+        """
+        return list(self._filenames)
+
+    def refresh(self) -> Dict[str, List[str]]:
+        """
+        Rescans the directory listing and parses new or modified XML files. A changed info.json invalidates all
+        annotations because weather, light and source information is merged into them.
+        :return: Dict with lists of "added", "modified" and "removed" filenames
+        """
+        with self._lock:
+            info_fingerprint = file_fingerprint(self.info_path)
+            invalidate = info_fingerprint != self._info_fingerprint
+            if invalidate:
+                with open(self.info_path, 'r') as fp:
+                    self.infos = json.load(fp)
+                self._info_fingerprint = info_fingerprint
+
+            listing = {}
+            with os.scandir(self.an_path) as it:
+                for entry in it:
+                    filename, ext = os.path.splitext(entry.name)
+                    if ext == ".xml" and entry.is_file():
+                        st = entry.stat()
+                        listing[filename] = (st.st_mtime_ns, st.st_size)
+
+            old = self._entries
+            removed = sorted(fn for fn in old if fn not in listing)
+            added, modified = [], []
+            for fn in sorted(listing):
+                if fn not in old:
+                    added.append(fn)
+                elif invalidate or old[fn][0] != listing[fn]:
+                    modified.append(fn)
+
+            entries = {fn: old[fn] for fn in listing if fn in old}
+            todo = added + modified
+            if todo:
+                from tqdm.auto import tqdm
+
+                logging.info("Importing %d XML annotations" % len(todo))
+                for fn in tqdm(todo, disable=len(todo) < 100):
+                    an = import_xml_annotation(os.path.join(self.an_path, fn + ".xml"), self.infos)
+                    entries[fn] = (listing[fn], an)
+
+            self._entries = entries
+            if added or modified or removed:
+                self.version += 1
+            self._filenames = sorted(self._entries, key=lambda fn: fn + ".xml")  # Same order as the directory listing
+
+        return {"added": added, "modified": modified, "removed": removed}
@@ -0,0 +1,175 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+from cv2 import cv2
+
+from .synthetic import make_synthetic_gerald
+
+
+def _timeit(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    return {"mean_ms": 1e3 * float(np.mean(times)), "min_ms": 1e3 * float(np.min(times)),
+            "max_ms": 1e3 * float(np.max(times))}
+
+
+def peak_rss_mb():
+    """
+    Peak resident set size of this process and its (finished) children in MB, None where unsupported
+    """
+    try:
+        import resource
+    except ImportError:
+        return {"self": None, "children": None}
+
+    scale = 1 / 1024 if sys.platform != "darwin" else 1 / 1024 ** 2  # kB on Linux, bytes on macOS
+    return {"self": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale,
+            "children": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale}
+
+
+def bench_init(path: str, repeat=3):
+    """
+    Cold (annotations not yet parsed) and warm initialization time of GERALDDataset
+    """
+    from . import annotations
+    from .dataset import GERALDDataset
+
+    def cold():
+        annotations._registries.clear()
+        GERALDDataset(path)
+
+    result = {"cold": _timeit(cold, repeat)}
+    result["warm"] = _timeit(lambda: GERALDDataset(path), repeat)
+    return result
+
+
+def bench_loader(path: str, workers=(0, 1, 2, 4), batch_size=8, n_batches=10):
+    """
+    Samples per second through a DataLoader for different numbers of workers
+    """
+    from torch.utils.data import DataLoader
+    from .dataset import GERALDDataset
+
+    result = {}
+    for n_workers in workers:
+        dataset = GERALDDataset(path, random_augment=False)
+        loader = DataLoader(dataset, batch_size=batch_size, shuffle=False, num_workers=n_workers,
+                            collate_fn=dataset.collate_fn)
+        n_samples = 0
+        t0 = time.perf_counter()
+        for i, (imgs, targets, idxs) in enumerate(loader):
+            n_samples += len(idxs)
+            if i + 1 >= n_batches:
+                break
+        elapsed = time.perf_counter() - t0
+        result[str(n_workers)] = {"samples_per_s": n_samples / elapsed, "samples": n_samples}
+    return result
+
+
+def bench_transforms(size=(1920, 1080), n_targets=8, repeat=10):
+    """
+    Latency of the transforms in utils.transforms on a single sample
+    """
+    import torch
+    from .utils import transforms as T
+
+    w, h = size
+    rng = np.random.default_rng(0)
+    im = rng.random((h, w, 3))
+    targets = torch.tensor([[w / 2, h / 2, 20, 60, 1, 0]] * n_targets, dtype=torch.float)
+
+    trfms = {"ToTensor": T.ToTensor(),
+             "Rescale": T.Rescale((512, 512)),
+             "Rotate90": T.Rotate(90),
+             "FlipUD": T.Flip("ud"),
+             "FlipLR": T.Flip("lr"),
+             "GaussianNoise": T.GaussianNoise(0.0, .05),
+             "ColorJitter": T.ColorJitter(brightness=(0.75, 1.25), saturation=(0.75, 1.25), hue=.1),
+             "CenterCrop": T.CenterCrop(0.5),
+             # RandomCrop adapts its size to the image on every call, so a new one is used per sample
+             "RandomCrop": lambda sample: T.RandomCrop(min_size=(w // 8, h // 8), max_size=(w // 4, h // 4))(sample)}
+
+    return {name: _timeit(lambda: trfm((im, targets.clone(), 0)), repeat) for name, trfm in trfms.items()}
+
+
+def bench_collate(path: str, batch_size=16, repeat=10):
+    """
+    Cost of GERALDDataset.collate_fn for one batch
+    """
+    from .dataset import GERALDDataset
+
+    dataset = GERALDDataset(path, random_augment=False)
+    samples = [dataset[i % len(dataset)] for i in range(batch_size)]
+    return _timeit(lambda: dataset.collate_fn([(s[0], s[1].clone(), s[2]) for s in samples]), repeat)
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=os.path.dirname(__file__),
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(path=None, n_images=64, size=(1920, 1080), workers=(0, 1, 2, 4), batch_size=8, n_batches=8):
+    """
+    Runs all benchmarks, on a temporary synthetic dataset if no path is given
+    :param path: Path to a GERALD dataset
+    :param n_images: Number of synthetic images
+    :param size: Size of the synthetic images (w, h)
+    :param workers: Numbers of DataLoader workers to measure
+    :param batch_size: Batch size for loader and collate benchmarks
+    :param n_batches: Batches per loader measurement
+    :return: Dict with results and environment information
+    """
+    import torch
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if path is None:
+            path = make_synthetic_gerald(tmp, n_images=n_images, size=size)
+
+        results = {"init": bench_init(path),
+                   "loader": bench_loader(path, workers=workers, batch_size=batch_size, n_batches=n_batches),
+                   "transforms": bench_transforms(size=size),
+                   "collate": bench_collate(path, batch_size=batch_size)}
+
+    return {"meta": {"commit": _git_commit(),
+                     "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                     "python": platform.python_version(),
+                     "numpy": np.__version__,
+                     "torch": torch.__version__,
+                     "opencv": cv2.__version__,
+                     "cpus": os.cpu_count()},
+            "results": results,
+            "peak_rss_mb": peak_rss_mb()}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks for loading, transforming and collating GERALD")
+    parser.add_argument("-p", "--path", type=str, default=None, help="GERALD dataset, synthetic data if not given")
+    parser.add_argument("-o", "--out", type=str, default=None, help="Output JSON file")
+    parser.add_argument("-n", "--n-images", type=int, default=64, help="Number of synthetic images")
+    parser.add_argument("-w", "--workers", type=int, nargs="+", default=[0, 1, 2, 4], help="DataLoader workers")
+    args = parser.parse_args(argv)
+
+    report = run_benchmarks(path=args.path, n_images=args.n_images, workers=args.workers)
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, 'w') as fp:
+            fp.write(text)
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
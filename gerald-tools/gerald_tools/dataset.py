@@ -1,27 +1,42 @@
-import json
 import logging
 import os
 import random
-import xml.etree.ElementTree as ET
 from cv2 import cv2
-from typing import List
 from torch.utils.data import Dataset
 from torchvision.transforms import transforms, ColorJitter
 
 import numpy as np
 import torch
-from imagehash import ImageHash
 from tqdm.auto import tqdm
 
-from . import GaussianNoise, ToTensor, Flip
-from .utils import Annotation, GERALDLabels, WeatherCondition, LightCondition
+from .annotations import get_annotation_registry, import_xml_annotation
+from .pyramid import PyramidStore
+from .readahead import ReadAhead
+from .splits import load_or_compute_splits
+from .utils import GERALDLabels, WeatherCondition, LightCondition, box_ops
+from .utils.label_map import IGNORE, LabelMap
+from .utils.transforms import GaussianNoise, ToTensor, Flip
+from .voc import VOCRecord, read_voc_xml
 
+LABEL_VALUES = {label.name: label.value for label in GERALDLabels}
+
+
+# Subsets filtering by weather or light condition, also available as "val_<name>"
+CONDITION_SUBSETS = {"sunny": ("weather", WeatherCondition.Sunny),
+                     "cloudy": ("weather", WeatherCondition.Cloudy),
+                     "rainy": ("weather", WeatherCondition.Rainy),
+                     "foggy": ("weather", WeatherCondition.Foggy),
+                     "snowy": ("weather", WeatherCondition.Snowy),
+                     "unknown": ("weather", WeatherCondition.Unknown),
+                     "daylight": ("light", LightCondition.Daylight),
+                     "twilight": ("light", LightCondition.Twilight),
+                     "dark": ("light", LightCondition.Dark)}
 
-class GERALDDataset(Dataset):
-    annotations: List[Annotation] = None
 
+class GERALDDataset(Dataset):
     def __init__(self, path: str, transform=None, subset="all", shuffle=True,
-                 random_augment=True, im_input_size=(512, 512), split=0.8, test=0.1):
+                 random_augment=True, im_input_size=(512, 512), split=0.8, test=0.1, profiler=None, k_folds=None,
+                 fold=0, split_file=None, label_map=None, pyramid=None):
         """
         Dataset class for pytorch use-cases
         :param path: Path to the GERALD dataset
@@ -32,6 +47,14 @@ class GERALDDataset(Dataset):
         :param im_input_size: input size for e.g. a neural network
         :param split: split ratio for training and validation data
         :param test: percentage of data used for testing
+        :param profiler: Optional StageProfiler recording the time spent in each stage of __getitem__ and collate_fn
+        :param k_folds: Number of folds for cross-validation, split is ignored if given
+        :param fold: Fold used as val subset for cross-validation
+        :param split_file: Index file (.npz) the splits are loaded from, or saved to if missing. New images are added
+            to it, existing assignments never change.
+        :param label_map: LabelMap applied to the targets, GERALDLabels values are used as classes if None
+        :param pyramid: PyramidStore or its path (see pyramid.build_pyramid). Images are read from the level nearest
+            to the requested size instead of being decoded, files missing in or changed since the pyramid are decoded.
         """
         logging.info("Initializing GERALD Dataset")
         logging.info("Using " + subset + " subset")
@@ -39,9 +62,6 @@ class GERALDDataset(Dataset):
 
         self.path = path
 
-        with open(self.path + '/info.json', 'r') as fp:
-            self.infos = json.load(fp)
-
         self.subset = subset
         self.labels = GERALDLabels
         self.im_path = self.path + "/JPEGImages/"
@@ -49,6 +69,10 @@ class GERALDDataset(Dataset):
 
         self.split = split  # Train/val split
         self.test = test  # Percentage of test data
+        self.shuffle = shuffle
+        self.k_folds = k_folds
+        self.fold = fold
+        self.split_file = split_file
 
         self.model_input_size = im_input_size
 
@@ -56,17 +80,18 @@ class GERALDDataset(Dataset):
 
         self.random_augment = random_augment
         self.transform = transform
-        self.filenames = self.get_all_filenames()
-        self.n_images = len(self.filenames)
+        self.profiler = profiler
+        self.read_ahead = None
+        self.pyramid = PyramidStore(pyramid) if isinstance(pyramid, str) else pyramid
+        self.label_map = label_map if label_map is not None else LabelMap()
+        self.n_classes = self.label_map.n_classes
 
-        self.n_train_images = round(self.split * self.n_images)
-        self.n_val_images = round((1 - self.split) * self.n_images)
-        self.n_test_images = round(self.test * self.n_images)
-        self.n_classes = len(GERALDLabels)
+        # Annotations are shared between all datasets on the same path and only re-parsed if the files change
+        self.registry = get_annotation_registry(self.path)
+        self.registry.refresh()
+        self.infos = self.registry.infos
 
-        if shuffle:  # Use fixed seed for constant shuffle
-            random.seed(331297)
-            random.shuffle(self.filenames)
+        self._load_filenames()
 
         logging.info("Total number of images: %5d" % len(self.filenames))
         logging.info("Number of train images: %5d" % self.n_train_images)
@@ -74,146 +99,7 @@ class GERALDDataset(Dataset):
         logging.info("Number of test of images: %5d" % self.n_test_images)
         logging.info("Use random data augmentation: " + str(self.random_augment))
 
-        if not self.annotations:  # Load all annotations
-            GERALDDataset.annotations = self.import_xml_annotations(self.filenames)
-
-        if self.subset == "train":
-            self.subset_filenames = self.filenames[:self.n_train_images]
-            self.subset_annotations = self.annotations[:self.n_train_images]
-            logging.info("Signals in the train subset:")
-        elif self.subset == "val":
-            self.subset_filenames = self.filenames[self.n_train_images:]
-            self.subset_annotations = self.annotations[self.n_train_images:]
-            logging.info("Signals in the val subset:")
-        elif self.subset == "val_sunny":
-            self.subset_filenames = self.filenames[self.n_train_images:]
-            self.subset_annotations = self.annotations[self.n_train_images:]
-
-            idxs = [i for i, an in enumerate(self.subset_annotations) if an.weather == WeatherCondition.Sunny]
-            self.subset_filenames = [fn for i, fn in enumerate(self.subset_filenames) if i in idxs]
-            self.subset_annotations = [an for i, an in enumerate(self.subset_annotations) if i in idxs]
-
-            logging.info("Signals in the val (sunny) subset:")
-        elif self.subset == "val_cloudy":
-            self.subset_filenames = self.filenames[self.n_train_images:]
-            self.subset_annotations = self.annotations[self.n_train_images:]
-
-            idxs = [i for i, an in enumerate(self.subset_annotations) if an.weather == WeatherCondition.Cloudy]
-            self.subset_filenames = [fn for i, fn in enumerate(self.subset_filenames) if i in idxs]
-            self.subset_annotations = [an for i, an in enumerate(self.subset_annotations) if i in idxs]
-
-            logging.info("Signals in the val (cloudy) subset:")
-        elif self.subset == "val_rainy":
-            self.subset_filenames = self.filenames[self.n_train_images:]
-            self.subset_annotations = self.annotations[self.n_train_images:]
-
-            idxs = [i for i, an in enumerate(self.subset_annotations) if an.weather == WeatherCondition.Rainy]
-            self.subset_filenames = [fn for i, fn in enumerate(self.subset_filenames) if i in idxs]
-            self.subset_annotations = [an for i, an in enumerate(self.subset_annotations) if i in idxs]
-
-            logging.info("Signals in the val (rainy) subset:")
-        elif self.subset == "val_foggy":
-            self.subset_filenames = self.filenames[self.n_train_images:]
-            self.subset_annotations = self.annotations[self.n_train_images:]
-
-            idxs = [i for i, an in enumerate(self.subset_annotations) if an.weather == WeatherCondition.Foggy]
-            self.subset_filenames = [fn for i, fn in enumerate(self.subset_filenames) if i in idxs]
-            self.subset_annotations = [an for i, an in enumerate(self.subset_annotations) if i in idxs]
-
-            logging.info("Signals in the val (foggy) subset:")
-        elif self.subset == "val_snowy":
-            self.subset_filenames = self.filenames[self.n_train_images:]
-            self.subset_annotations = self.annotations[self.n_train_images:]
-
-            idxs = [i for i, an in enumerate(self.subset_annotations) if an.weather == WeatherCondition.Snowy]
-            self.subset_filenames = [fn for i, fn in enumerate(self.subset_filenames) if i in idxs]
-            self.subset_annotations = [an for i, an in enumerate(self.subset_annotations) if i in idxs]
-
-            logging.info("Signals in the val (snowy) subset:")
-
-        elif self.subset == "val_daylight":
-            self.subset_filenames = self.filenames[self.n_train_images:]
-            self.subset_annotations = self.annotations[self.n_train_images:]
-
-            idxs = [i for i, an in enumerate(self.subset_annotations) if an.light == LightCondition.Daylight]
-            self.subset_filenames = [fn for i, fn in enumerate(self.subset_filenames) if i in idxs]
-            self.subset_annotations = [an for i, an in enumerate(self.subset_annotations) if i in idxs]
-
-            logging.info("Signals in the val (daylight) subset:")
-        elif self.subset == "val_twilight":
-            self.subset_filenames = self.filenames[self.n_train_images:]
-            self.subset_annotations = self.annotations[self.n_train_images:]
-
-            idxs = [i for i, an in enumerate(self.subset_annotations) if an.light == LightCondition.Twilight]
-            self.subset_filenames = [fn for i, fn in enumerate(self.subset_filenames) if i in idxs]
-            self.subset_annotations = [an for i, an in enumerate(self.subset_annotations) if i in idxs]
-
-            logging.info("Signals in the val (twilight) subset:")
-        elif self.subset == "val_dark":
-            self.subset_filenames = self.filenames[self.n_train_images:]
-            self.subset_annotations = self.annotations[self.n_train_images:]
-
-            idxs = [i for i, an in enumerate(self.subset_annotations) if an.light == LightCondition.Dark]
-            self.subset_filenames = [fn for i, fn in enumerate(self.subset_filenames) if i in idxs]
-            self.subset_annotations = [an for i, an in enumerate(self.subset_annotations) if i in idxs]
-
-            logging.info("Signals in the val (dark) subset:")
-        elif self.subset == "test":
-            self.test_idxs = random.choices(np.arange(0, len(self.filenames), 1), k=self.n_test_images)
-            self.subset_filenames = [self.filenames[i] for i in self.test_idxs]
-            self.subset_annotations = [self.annotations[i] for i in self.test_idxs]
-            logging.info("Signals in the test subset:")
-        elif self.subset == "daylight":
-            self.subset_filenames = [os.path.splitext(an.src_name)[0] for an in self.annotations if
-                                     an.light == LightCondition.Daylight]
-            self.subset_annotations = [an for an in self.annotations if an.light == LightCondition.Daylight]
-            logging.info("Signals in the daylight subset:")
-        elif self.subset == "twilight":
-            self.subset_filenames = [os.path.splitext(an.src_name)[0] for an in self.annotations if
-                                     an.light == LightCondition.Twilight]
-            self.subset_annotations = [an for an in self.annotations if an.light == LightCondition.Twilight]
-            logging.info("Signals in the twilight subset:")
-        elif self.subset == "dark":
-            self.subset_filenames = [os.path.splitext(an.src_name)[0] for an in self.annotations if
-                                     an.light == LightCondition.Dark]
-            self.subset_annotations = [an for an in self.annotations if an.light == LightCondition.Dark]
-            logging.info("Signals in the dark subset:")
-        elif self.subset == "sunny":
-            self.subset_filenames = [os.path.splitext(an.src_name)[0] for an in self.annotations if
-                                     an.weather == WeatherCondition.Sunny]
-            self.subset_annotations = [an for an in self.annotations if an.weather == WeatherCondition.Sunny]
-            logging.info("Signals in the sunny subset:")
-        elif self.subset == "cloudy":
-            self.subset_filenames = [os.path.splitext(an.src_name)[0] for an in self.annotations if
-                                     an.weather == WeatherCondition.Cloudy]
-            self.subset_annotations = [an for an in self.annotations if an.weather == WeatherCondition.Cloudy]
-            logging.info("Signals in the cloudy subset:")
-        elif self.subset == "rainy":
-            self.subset_filenames = [os.path.splitext(an.src_name)[0] for an in self.annotations if
-                                     an.weather == WeatherCondition.Rainy]
-            self.subset_annotations = [an for an in self.annotations if an.weather == WeatherCondition.Rainy]
-            logging.info("Signals in the rainy subset:")
-        elif self.subset == "foggy":
-            self.subset_filenames = [os.path.splitext(an.src_name)[0] for an in self.annotations if
-                                     an.weather == WeatherCondition.Foggy]
-            self.subset_annotations = [an for an in self.annotations if an.weather == WeatherCondition.Foggy]
-            logging.info("Signals in the foggy subset:")
-        elif self.subset == "snowy":
-            self.subset_filenames = [os.path.splitext(an.src_name)[0] for an in self.annotations if
-                                     an.weather == WeatherCondition.Snowy]
-            self.subset_annotations = [an for an in self.annotations if an.weather == WeatherCondition.Snowy]
-            logging.info("Signals in the snowy subset:")
-        elif self.subset == "unknown":
-            self.subset_filenames = [os.path.splitext(an.src_name)[0] for an in self.annotations if
-                                     an.weather == WeatherCondition.Unknown]
-            self.subset_annotations = [an for an in self.annotations if an.weather == WeatherCondition.Unknown]
-            logging.info("Signals in the unknown subset:")
-        elif self.subset == "all":
-            self.subset_filenames = self.filenames
-            self.subset_annotations = self.annotations
-            logging.info("Signals in the dataset:")
-        else:
-            raise ValueError("Subset " + self.subset + " is invalid!")
+        self._select_subset()
 
         self.n_targets = 0
         self.signal_distribution = {signal: {"Rel": 0,
@@ -226,6 +112,114 @@ class GERALDDataset(Dataset):
         self.im_area = self.model_input_size[0] * self.model_input_size[1]
         logging.info("Image area (Model input): %d px" % self.im_area)
 
+    def refresh(self):
+        """
+        Rescans the dataset directory and updates annotations, indexes and subset in place. Only new or modified
+        XML files are parsed again.
+        :return: Dict with lists of "added", "modified" and "removed" filenames
+        """
+        changes = self.registry.refresh()
+        if self.registry.version != self._registry_version:  # Might also be refreshed by another dataset
+            self.infos = self.registry.infos
+            self._load_filenames()
+            self._select_subset()
+            if self.read_ahead:
+                logging.warning("Dataset changed, read-ahead disabled until the next enable_read_ahead()")
+                self.disable_read_ahead()
+        return changes
+
+    def enable_read_ahead(self, order, batch_size=1, num_workers=0, n_threads=4, depth=32, max_bytes=256 * 2 ** 20):
+        """
+        Prefetches the JPEG bytes in a background thread pool, so that reading overlaps with decoding.
+        Call before every epoch with the order of that epoch (DataLoader workers get a copy of the dataset when
+        iteration starts, persistent workers keep the order they started with). Pass
+        readahead.worker_init_fn as worker_init_fn of the DataLoader to start reading when the workers start.
+        :param order: GERALDSampler (after set_epoch), whose indices of the epoch are used, or the indices in the
+            exact order the sampler yields them. Do not use list(sampler) of a RandomSampler, every iteration draws a
+            new permutation.
+        :param batch_size: Batch size of the DataLoader
+        :param num_workers: Number of DataLoader workers, reading starts right away if 0
+        :param n_threads: Reader threads per worker
+        :param depth: Maximum number of images read ahead per worker
+        :param max_bytes: Maximum number of prefetched and in-flight bytes per worker
+        """
+        self.disable_read_ahead()
+        if hasattr(order, "indices"):  # GERALDSampler, a resumed epoch skips the consumed samples
+            order = order.indices()[order.start:].tolist()
+        self.read_ahead = ReadAhead(self._image_path, order, batch_size=batch_size, num_workers=num_workers,
+                                    n_threads=n_threads, depth=depth, max_bytes=max_bytes)
+        if num_workers == 0:
+            self.read_ahead.start()
+
+    def disable_read_ahead(self):
+        if self.read_ahead:
+            self.read_ahead.close()
+        self.read_ahead = None
+
+    def _image_path(self, idx):
+        return self.im_path + self.subset_filenames[idx] + ".jpg"
+
+    def _load_filenames(self):
+        self._registry_version = self.registry.version
+        filenames = self.get_all_filenames()
+        self.n_images = len(filenames)
+
+        # Stratified splits on the sorted filenames, independent of shuffling. After a refresh, images that were
+        # assigned before keep their fold.
+        self.splits = load_or_compute_splits(self.split_file, filenames, [self.registry[fn] for fn in filenames],
+                                             k_folds=self.k_folds, split=self.split, test=self.test,
+                                             base=getattr(self, "splits", None))
+
+        # Private generator with fixed seed for constant shuffle, the global random state stays untouched
+        order = list(range(self.n_images))
+        if self.shuffle:
+            random.Random(331297).shuffle(order)
+
+        self.filenames = [filenames[i] for i in order]
+        self.annotations = [self.registry[fn] for fn in self.filenames]
+        self.split_masks = {name: self.splits.mask(name, self.fold)[order] for name in ("train", "val", "test")}
+
+        self.n_train_images = int(self.split_masks["train"].sum())
+        self.n_val_images = int(self.split_masks["val"].sum())
+        self.n_test_images = int(self.split_masks["test"].sum())
+
+    def _take(self, mask):
+        idxs = np.flatnonzero(mask)
+        self.subset_filenames = [self.filenames[i] for i in idxs]
+        self.subset_annotations = [self.annotations[i] for i in idxs]
+
+    def _select_subset(self):
+        if self.subset in ("train", "val", "test"):
+            self._take(self.split_masks[self.subset])
+            logging.info("Signals in the %s subset:" % self.subset)
+        elif self.subset.startswith("val_") and self.subset[4:] in CONDITION_SUBSETS:
+            attr, condition = CONDITION_SUBSETS[self.subset[4:]]
+            self._take(self.split_masks["val"] & np.array([getattr(an, attr) == condition
+                                                           for an in self.annotations], dtype=bool))
+            logging.info("Signals in the val (%s) subset:" % self.subset[4:])
+        elif self.subset in CONDITION_SUBSETS:
+            attr, condition = CONDITION_SUBSETS[self.subset]
+            self.subset_annotations = [an for an in self.annotations if getattr(an, attr) == condition]
+            self.subset_filenames = [os.path.splitext(an.src_name)[0] for an in self.subset_annotations]
+            logging.info("Signals in the %s subset:" % self.subset)
+        elif self.subset == "all":
+            self.subset_filenames = self.filenames
+            self.subset_annotations = self.annotations
+            logging.info("Signals in the dataset:")
+        else:
+            raise ValueError("Subset " + self.subset + " is invalid!")
+
+        if self.pyramid is not None:  # Row of every subset image in the pyramid, -1 if it has to be decoded
+            self._pyramid_rows = []
+            for fn in self.subset_filenames:
+                row = self.pyramid.index.get(fn, -1)
+                if row >= 0 and not self.pyramid.valid(row, self.an_path + fn + ".xml", self.im_path + fn + ".jpg"):
+                    row = -1
+                self._pyramid_rows.append(row)
+            n_missing = self._pyramid_rows.count(-1)
+            if n_missing:
+                logging.warning("%d images are not in the pyramid or changed since it was built" % n_missing)
+
     def __len__(self):
         return len(self.subset_filenames)
 
@@ -233,26 +227,53 @@ class GERALDDataset(Dataset):
         if torch.is_tensor(idx):
             idx = idx.tolist()
 
-        im_path = self.im_path + self.subset_filenames[idx] + ".jpg"
-
-        # Imdecode to support non unicode filepaths
-        im = cv2.imdecode(np.fromfile(im_path, dtype=np.uint8), cv2.IMREAD_UNCHANGED)
-        an = self.import_single_xml_annotation(self.subset_filenames[idx])
+        size = None
+        if isinstance(idx, (tuple, list)):  # (index, (w, h)) from a MultiScaleBatchSampler
+            idx, size = idx[0], tuple(idx[1])
+
+        prof = self.profiler
+        t = prof.now() if prof else 0.0
+
+        row = self._pyramid_rows[idx] if self.pyramid is not None else -1
+        if row >= 0:
+            im, targets, relevant = self.pyramid.read(row, size)
+            if prof:
+                t = prof.lap("pyramid", t, im.nbytes)
+            targets = self.label_map.apply(targets, relevant)
+            if prof:
+                t = prof.lap("targets", t)
+        else:
+            # Imdecode to support non unicode filepaths
+            raw = self.read_ahead.read(idx) if self.read_ahead else np.fromfile(self._image_path(idx), dtype=np.uint8)
+            if prof:
+                t = prof.lap("read", t, raw.nbytes)
+            im = cv2.imdecode(raw, cv2.IMREAD_UNCHANGED)
+            if prof:
+                t = prof.lap("decode", t, im.nbytes)
+            record = read_voc_xml(self.an_path + self.subset_filenames[idx] + ".xml")
+            if prof:
+                t = prof.lap("parse", t)
+            targets = self.build_targets(record, self.label_map)
+            if prof:
+                t = prof.lap("targets", t)
+
+            h, w = im.shape[:2]
+            if size is not None and (w, h) != size:
+                im = cv2.resize(im, size, interpolation=cv2.INTER_AREA if size[0] < w else cv2.INTER_LINEAR)
+                box_ops.scale(targets, size[0] / w, size[1] / h, inplace=True)
+                if prof:
+                    t = prof.lap("resize", t, im.nbytes)
 
         im = cv2.cvtColor(im, cv2.COLOR_BGR2RGB) / 255
+        if prof:
+            t = prof.lap("color", t, im.nbytes)
 
-        targets = torch.zeros([len(an.objects), 6], dtype=torch.float)
-
-        for i, obj in enumerate(an.objects):
-            targets[i, 0] = obj.x_c
-            targets[i, 1] = obj.y_c
-            targets[i, 2] = obj.w
-            targets[i, 3] = obj.h
-            targets[i, 4] = obj.label.value
-            targets[i, 5] = 0  # Placeholder for sample index
+        targets = torch.from_numpy(targets)  # Zero-copy, timed with the next stage
 
         if self.transform:  # Transforms from Dataset initialization
             im, targets, idx = self.transform((im, targets, idx))
+            if prof:
+                t = prof.lap("transform", t)
 
         if self.random_augment:
             if np.random.rand() < 0.25:  # 1/4 chance of image being rotated or flipped
@@ -260,6 +281,8 @@ class GERALDDataset(Dataset):
                 # trfms = [Rotate(90), Rotate(180), Rotate(270), Flip("ud"), Flip("lr")]
                 trfm = np.random.choice(trfms, 1)[0]
                 im, targets, idx = trfm((im, targets, idx))
+                if prof:
+                    t = prof.lap("augment:Flip", t)
             # if self.model_input_size[0] == self.model_input_size[1] and np.random.rand() < 0.25:  # 1/4 chance of image being rotated (only for quad. input)
             #     trfms = [Rotate(90), Rotate(270)]
             #     trfm = np.random.choice(trfms, 1)[0]
@@ -267,14 +290,59 @@ class GERALDDataset(Dataset):
             if np.random.rand() < 0.5:  # 1/2 chance of added color jitter
                 trfm = ColorJitter(brightness=(0.75, 1.25), saturation=(0.75, 1.25), hue=.1)
                 im, targets, idx = trfm((im, targets, idx))
+                if prof:
+                    t = prof.lap("augment:ColorJitter", t)
 
             if np.random.rand() < 0.1:  # 1/10 chance of added Gaussian Noise
                 trfm = GaussianNoise(0.0, .05)
                 im, targets, idx = trfm((im, targets, idx))
+                if prof:
+                    prof.lap("augment:GaussianNoise", t)
 
         return im, targets, idx
 
+    @staticmethod
+    def build_targets(record: VOCRecord, label_map: LabelMap = None):
+        """
+        Converts the objects of a parsed XML file to a nx6 array (x_c, y_c, w, h, label, sample index placeholder)
+        :param record: Parsed XML file
+        :param label_map: If given, labels are mapped to its classes and dropped targets are removed
+        :return: nx6 float32 ndarray
+        """
+        boxes = np.round(record.boxes)  # Same integer coordinates as the GroundTruthObjects of an Annotation
+
+        targets = np.zeros((len(record), 6), dtype=np.float32)
+        targets[:, 0] = np.round((boxes[:, 0] + boxes[:, 2]) / 2)
+        targets[:, 1] = np.round((boxes[:, 1] + boxes[:, 3]) / 2)
+        targets[:, 2] = boxes[:, 2] - boxes[:, 0]
+        targets[:, 3] = boxes[:, 3] - boxes[:, 1]
+        targets[:, 4] = [LABEL_VALUES[name] for name in record.names]
+        if label_map is not None:
+            targets = label_map.apply(targets, record.difficult)
+        return targets
+
+    def class_counts(self, relevant_only=False):
+        """
+        Number of targets per class of the label map in the subset
+        :param relevant_only: Only count targets that are relevant for the train
+        :return: Dict class name -> count, ignored targets are counted as "ignore"
+        """
+        labels = np.array([o.label.value for an in self.subset_annotations for o in an.objects], dtype=np.int64)
+        relevant = np.array([o.relevant for an in self.subset_annotations for o in an.objects], dtype=bool)
+        if relevant_only:
+            labels = labels[relevant]
+            relevant = relevant[relevant]
+
+        classes = self.label_map(labels, relevant)
+        counts = np.bincount(classes[classes >= 0], minlength=self.n_classes)
+        result = dict(zip(self.label_map.names, counts.tolist()))
+        result["ignore"] = int(np.count_nonzero(classes == IGNORE))
+        return result
+
     def collate_fn(self, batch):
+        prof = self.profiler
+        t = prof.now() if prof else 0.0
+
         trfms = transforms.Compose([ToTensor()])
         for i, sample in enumerate(batch):
             batch[i] = trfms(sample)
@@ -288,13 +356,14 @@ class GERALDDataset(Dataset):
         imgs = torch.stack(imgs)
         targets = torch.cat(targets, 0)
 
+        if prof:
+            prof.lap("collate", t, imgs.nelement() * imgs.element_size())
+
         self.batch_count += 1
         return imgs, targets, idxs
 
     def get_all_filenames(self):
-        files = sorted(os.listdir(self.an_path))
-        filenames = [os.path.splitext(filename)[0] for filename in files]
-        return filenames
+        return self.registry.filenames
 
     def import_xml_annotations(self, filenames):
         logging.info("Importing XML annotations")
@@ -307,44 +376,4 @@ class GERALDDataset(Dataset):
         return annotations
 
     def import_single_xml_annotation(self, filename, calc_hash=False):
-        with open(self.an_path + filename + ".xml", 'rb') as xml_file:
-            xml = ET.parse(xml_file)
-
-        root = xml.getroot()
-
-        annotation = Annotation()
-
-        annotation.src_name = root.findall("./filename")[0].text
-        annotation.src_width = int(root.findall("./size/width")[0].text)
-        annotation.src_height = int(root.findall("./size/height")[0].text)
-        annotation.src_depth = int(root.findall("./size/depth")[0].text)
-        annotation.src_time = float(annotation.src_name.split("=")[1][:-4]) if "=" in annotation.src_name else 0.0
-
-        if annotation.src_name in self.infos:
-            annotation.weather = WeatherCondition[self.infos[annotation.src_name]["weather"]]
-            annotation.light = LightCondition[self.infos[annotation.src_name]["light"]]
-            annotation.author = self.infos[annotation.src_name]["author"]
-            annotation.author_url = self.infos[annotation.src_name]["author url"]
-            annotation.src_url = self.infos[annotation.src_name]["source url"]
-
-            phash = self.infos[annotation.src_name]["pHash"]
-            annotation.hash = ImageHash(np.array(list(bin(int(phash, 16))[2:])).reshape((8, 8)).astype(bool))
-
-        if root.findall("./weather"):
-            annotation.weather = WeatherCondition[root.findall("./weather")[0].text]
-        if root.findall("./light"):
-            annotation.light = LightCondition[root.findall("./light")[0].text]
-
-        objects = root.findall("./object")
-
-        for obj in objects:
-            if obj.findall("./bndbox") is not None:
-                label = GERALDLabels[obj.findall("./name")[0].text]
-                relevant = bool(int(obj.findall("./difficult")[0].text))
-                x_min = round(float(obj.findall("./bndbox/xmin")[0].text))
-                y_min = round(float(obj.findall("./bndbox/ymin")[0].text))
-                x_max = round(float(obj.findall("./bndbox/xmax")[0].text))
-                y_max = round(float(obj.findall("./bndbox/ymax")[0].text))
-                annotation.add_ground_truth_object(x_min, y_min, x_max, y_max, label, relevant)
-
-        return annotation
+        return import_xml_annotation(self.an_path + filename + ".xml", self.infos)
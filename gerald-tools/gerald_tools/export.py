@@ -0,0 +1,219 @@
+import json
+import logging
+import os
+from typing import Dict, List
+
+import numpy as np
+from cv2 import cv2
+
+from .utils.files import file_fingerprint, map_jobs
+from .utils.label_map import DROP
+
+FORMATS = ("yolo", "coco", "packed")
+MANIFEST_NAME = "manifest.json"
+
+
+def _export_image(job):
+    """
+    Reads, resizes and writes a single image
+    :param job: Tuple of source path, destination path and new size (w, h)
+    :return: Destination path
+    """
+    src, dst, size = job
+    im = cv2.imdecode(np.fromfile(src, dtype=np.uint8), cv2.IMREAD_UNCHANGED)  # Support non unicode filepaths
+    if size is not None and (im.shape[1], im.shape[0]) != tuple(size):
+        im = cv2.resize(im, tuple(size), interpolation=cv2.INTER_AREA)
+    ok, buf = cv2.imencode(".jpg", im, [cv2.IMWRITE_JPEG_QUALITY, 95])
+    if not ok:
+        raise IOError("Could not encode %s" % src)
+    buf.tofile(dst)
+    return dst
+
+
+class GERALDExporter:
+    def __init__(self, dataset, out_path: str, formats=FORMATS, image_size=None, n_workers=None):
+        """
+        Exports the parsed annotations of a GERALDDataset to the formats of common training frameworks
+        :param dataset: GERALDDataset, the selected subset is exported
+        :param out_path: Output directory
+        :param formats: Any of "yolo" (one txt per image), "coco" (single JSON) and "packed" (NumPy target file)
+        :param image_size: If given (w, h), resized image copies are written to <out_path>/images
+        :param n_workers: Number of processes used for the image copies (0 for serial, None for all cpus)
+        """
+        for fmt in formats:
+            if fmt not in FORMATS:
+                raise ValueError("Export format " + fmt + " is invalid!")
+
+        self.dataset = dataset
+        self.out_path = out_path
+        self.formats = tuple(formats)
+        self.image_size = tuple(image_size) if image_size is not None else None
+        self.n_workers = n_workers
+
+        self.manifest_path = os.path.join(self.out_path, MANIFEST_NAME)
+        self.yolo_path = os.path.join(self.out_path, "yolo")
+        self.coco_path = os.path.join(self.out_path, "coco")
+        self.packed_path = os.path.join(self.out_path, "packed")
+        self.images_path = os.path.join(self.out_path, "images")
+
+    def export(self, incremental=True):
+        """
+        Writes all requested formats. Per image outputs are only rewritten for images whose source XML, JPEG or
+        info.json entry changed since the last export, aggregated files (COCO, packed) only if anything changed at all.
+        The dataset is refreshed first, so the written annotations match the fingerprints stored in the manifest.
+        :param incremental: If False, everything is exported again
+        :return: Dict with the number of exported, changed and removed images
+        """
+        self.dataset.refresh()
+        filenames, annotations = self._sorted_subset()
+
+        infos = self.dataset.registry.infos
+        fingerprints = {fn: file_fingerprint(self.dataset.an_path + fn + ".xml", self.dataset.im_path + fn + ".jpg") +
+                        [json.dumps(infos.get(fn + ".jpg"), sort_keys=True)] for fn in filenames}
+        settings = {"formats": list(self.formats),
+                    "image_size": list(self.image_size) if self.image_size else None,
+                    "label_map": self.dataset.label_map.to_dict()}
+
+        old = self._load_manifest() if incremental else None
+        if old is None or old["settings"] != settings:
+            old = {"settings": settings, "files": {}}
+
+        changed = [fn for fn in filenames if old["files"].get(fn) != fingerprints[fn]]
+        removed = sorted(set(old["files"]) - set(fingerprints))
+
+        logging.info("Exporting %d images (%d changed, %d removed)" % (len(filenames), len(changed), len(removed)))
+
+        for p in self._output_dirs():
+            os.makedirs(p, exist_ok=True)
+
+        self._remove(removed)
+
+        lookup = dict(zip(filenames, annotations))
+        if "yolo" in self.formats:
+            self._write_yolo(changed, lookup)
+        if self.image_size is not None:
+            self._write_images(changed)
+        if changed or removed or not os.path.exists(self.manifest_path):
+            if "coco" in self.formats:
+                self._write_coco(filenames, annotations)
+            if "packed" in self.formats:
+                self._write_packed(filenames, annotations)
+
+        self._write_manifest({"settings": settings, "files": fingerprints})
+
+        return {"exported": len(filenames), "changed": len(changed), "removed": len(removed)}
+
+    def _sorted_subset(self):
+        pairs = sorted(zip(self.dataset.subset_filenames, self.dataset.subset_annotations), key=lambda p: p[0])
+        return [p[0] for p in pairs], [p[1] for p in pairs]
+
+    def _output_dirs(self):
+        dirs = []
+        if "yolo" in self.formats:
+            dirs.append(os.path.join(self.yolo_path, "labels"))
+        if "coco" in self.formats:
+            dirs.append(self.coco_path)
+        if "packed" in self.formats:
+            dirs.append(self.packed_path)
+        if self.image_size is not None:
+            dirs.append(self.images_path)
+        return dirs
+
+    def _classes(self, an) -> np.ndarray:
+        """
+        Class of every object under the label map of the dataset, or DROP/IGNORE
+        """
+        return self.dataset.label_map([obj.label.value for obj in an.objects], [obj.relevant for obj in an.objects])
+
+    def _out_size(self, an):
+        return self.image_size if self.image_size is not None else (an.src_width, an.src_height)
+
+    def _load_manifest(self):
+        if not os.path.exists(self.manifest_path):
+            return None
+        with open(self.manifest_path, 'r') as fp:
+            return json.load(fp)
+
+    def _write_manifest(self, manifest):
+        tmp = self.manifest_path + ".tmp"
+        with open(tmp, 'w') as fp:
+            json.dump(manifest, fp)
+        os.replace(tmp, self.manifest_path)
+
+    def _remove(self, filenames: List[str]):
+        for fn in filenames:
+            for p in (os.path.join(self.yolo_path, "labels", fn + ".txt"), os.path.join(self.images_path, fn + ".jpg")):
+                if os.path.exists(p):
+                    os.remove(p)
+
+    def _write_yolo(self, filenames: List[str], lookup: Dict):
+        with open(os.path.join(self.yolo_path, "classes.txt"), 'w') as fp:
+            fp.write("\n".join(self.dataset.label_map.names) + "\n")
+
+        for fn in filenames:  # YOLO has no ignore regions, ignored objects are left out
+            lines = ["%d %.6f %.6f %.6f %.6f" % (c, obj.x_c_nm, obj.y_c_nm, obj.w_nm, obj.h_nm)
+                     for obj, c in zip(lookup[fn].objects, self._classes(lookup[fn]).tolist()) if c >= 0]
+            with open(os.path.join(self.yolo_path, "labels", fn + ".txt"), 'w') as fp:
+                fp.write("".join(line + "\n" for line in lines))
+
+    def _write_images(self, filenames: List[str]):
+        jobs = [(self.dataset.im_path + fn + ".jpg", os.path.join(self.images_path, fn + ".jpg"), self.image_size)
+                for fn in filenames]
+        map_jobs(_export_image, jobs, self.n_workers)
+
+    def _write_coco(self, filenames: List[str], annotations: List):
+        images, objects = [], []
+        for image_id, (fn, an) in enumerate(zip(filenames, annotations)):
+            w, h = self._out_size(an)
+            sx, sy = w / an.src_width, h / an.src_height
+            images.append({"id": image_id, "file_name": fn + ".jpg", "width": w, "height": h,
+                           "weather": an.weather.name, "light": an.light.name})
+            for obj, c in zip(an.objects, self._classes(an).tolist()):
+                if c < 0:  # Dropped or ignored
+                    continue
+                bbox = [obj.x_min * sx, obj.y_min * sy, obj.w * sx, obj.h * sy]
+                objects.append({"id": len(objects), "image_id": image_id, "category_id": c,
+                                "bbox": bbox, "area": bbox[2] * bbox[3], "iscrowd": 0,
+                                "relevant": bool(obj.relevant)})
+
+        coco = {"images": images,
+                "annotations": objects,
+                "categories": [{"id": i, "name": name} for i, name in enumerate(self.dataset.label_map.names)]}
+
+        with open(os.path.join(self.coco_path, "annotations.json"), 'w') as fp:
+            json.dump(coco, fp)
+
+    def _write_packed(self, filenames: List[str], annotations: List):
+        """
+        Writes all targets into one array in the layout of GERALDDataset.__getitem__ (x_c, y_c, w, h, label, idx).
+        Targets of image i are targets[offsets[i]:offsets[i + 1]], ignored objects have the label IGNORE.
+        """
+        classes = [self._classes(an) for an in annotations]
+        keeps = [c != DROP for c in classes]
+        counts = np.array([np.count_nonzero(keep) for keep in keeps], dtype=np.int64)
+        offsets = np.zeros(len(annotations) + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+
+        targets = np.zeros((offsets[-1], 6), dtype=np.float32)
+        relevant = np.zeros(offsets[-1], dtype=bool)
+        sizes = np.zeros((len(annotations), 2), dtype=np.int32)
+
+        for i, an in enumerate(annotations):
+            w, h = self._out_size(an)
+            sizes[i] = w, h
+            if not counts[i]:
+                continue
+            sx, sy = w / an.src_width, h / an.src_height
+            rows = slice(offsets[i], offsets[i + 1])
+            objects = [obj for obj, keep in zip(an.objects, keeps[i]) if keep]
+            targets[rows, :4] = [(obj.x_c, obj.y_c, obj.w, obj.h) for obj in objects]
+            targets[rows, 4] = classes[i][keeps[i]]
+            targets[rows, 0] *= sx
+            targets[rows, 2] *= sx
+            targets[rows, 1] *= sy
+            targets[rows, 3] *= sy
+            targets[rows, 5] = i
+            relevant[rows] = [obj.relevant for obj in objects]
+
+        np.savez(os.path.join(self.packed_path, "targets.npz"), targets=targets, offsets=offsets,
+                 relevant=relevant, sizes=sizes, filenames=np.array(filenames))
@@ -0,0 +1,203 @@
+import argparse
+import json
+import logging
+import math
+import os
+from typing import List, Optional, Sequence
+
+import numpy as np
+from cv2 import cv2
+
+from .utils.files import map_jobs, n_processes
+from .voc import read_voc_xml
+
+RELEVANT_COLOR = (0, 200, 0)  # BGR
+IRRELEVANT_COLOR = (0, 140, 255)
+TEXT_COLOR = (0, 0, 0)
+_REDUCED = ((8, cv2.IMREAD_REDUCED_COLOR_8), (4, cv2.IMREAD_REDUCED_COLOR_4), (2, cv2.IMREAD_REDUCED_COLOR_2))
+
+
+def draw_targets(im: np.ndarray, boxes: np.ndarray, names: Sequence[str], relevant: Sequence[bool],
+                 font_scale=0.4, thickness=1) -> np.ndarray:
+    """
+    Draws boxes and label names into an image buffer. Relevant objects are green, irrelevant ones orange.
+    :param im: BGR uint8 image, modified in place
+    :param boxes: nx4 x_min, y_min, x_max, y_max in pixels of im
+    :param names: Label name per box
+    :param relevant: Relevant flag per box
+    :param font_scale: Scale of the label text
+    :param thickness: Line thickness
+    :return: im
+    """
+    for (x0, y0, x1, y1), name, rel in zip(np.round(boxes).astype(np.int64).tolist(), names, relevant):
+        color = RELEVANT_COLOR if rel else IRRELEVANT_COLOR
+        cv2.rectangle(im, (x0, y0), (x1, y1), color, thickness)
+        (tw, th), baseline = cv2.getTextSize(name, cv2.FONT_HERSHEY_SIMPLEX, font_scale, 1)
+        ty = y0 - 2 if y0 - th - baseline - 2 >= 0 else y1 + th + 2  # Above the box, below if it does not fit
+        cv2.rectangle(im, (x0, ty - th - 1), (x0 + tw + 1, ty + baseline - 1), color, cv2.FILLED)
+        cv2.putText(im, name, (x0 + 1, ty - 1), cv2.FONT_HERSHEY_SIMPLEX, font_scale, TEXT_COLOR, 1, cv2.LINE_AA)
+    return im
+
+
+def render_preview(im_path: str, xml_path: str, size=None) -> np.ndarray:
+    """
+    Decodes an image at (about) the requested size and draws its annotation
+    :param im_path: Path to the JPEG
+    :param xml_path: Path to the VOC XML
+    :param size: Output size (w, h), the source size if None
+    :return: BGR uint8 image
+    """
+    record = read_voc_xml(xml_path)
+    data = np.fromfile(im_path, dtype=np.uint8)  # Imdecode to support non unicode filepaths
+
+    im = None
+    if size is not None:  # Let libjpeg skip most of the work if the preview is much smaller than the image
+        for factor, flag in _REDUCED:
+            if record.width // factor >= size[0] and record.height // factor >= size[1]:
+                im = cv2.imdecode(data, flag)
+                break
+    if im is None:
+        im = cv2.imdecode(data, cv2.IMREAD_COLOR)
+    if im is None:
+        raise IOError("Could not decode %s" % im_path)
+
+    if size is not None and (im.shape[1], im.shape[0]) != tuple(size):
+        im = cv2.resize(im, tuple(size), interpolation=cv2.INTER_AREA)
+
+    boxes = record.boxes * np.array([im.shape[1] / record.width, im.shape[0] / record.height] * 2)
+    return draw_targets(im, boxes, record.names, record.difficult.astype(bool))
+
+
+def _render_images(job):
+    """
+    Writes one preview per image
+    :param job: Tuple of (image path, XML path, output path) triples and the preview size
+    :return: Number of written previews
+    """
+    items, size = job
+    for im_path, xml_path, out_path in items:
+        cv2.imencode(".jpg", render_preview(im_path, xml_path, size))[1].tofile(out_path)
+    return len(items)
+
+
+def _render_sheet(job):
+    """
+    Writes one contact sheet
+    :param job: Tuple of (image path, XML path, caption) triples, output path, tile size and grid (columns, rows)
+    :return: Number of tiles
+    """
+    items, out_path, tile_size, grid = job
+    tw, th = tile_size
+    sheet = np.full((grid[1] * th, grid[0] * tw, 3), 32, dtype=np.uint8)
+
+    for i, (im_path, xml_path, caption) in enumerate(items):
+        row, col = divmod(i, grid[0])
+        tile = sheet[row * th:(row + 1) * th, col * tw:(col + 1) * tw]
+        tile[:] = render_preview(im_path, xml_path, tile_size)
+        cv2.putText(tile, caption, (3, th - 5), cv2.FONT_HERSHEY_SIMPLEX, 0.4, (0, 0, 0), 3, cv2.LINE_AA)
+        cv2.putText(tile, caption, (3, th - 5), cv2.FONT_HERSHEY_SIMPLEX, 0.4, (255, 255, 255), 1, cv2.LINE_AA)
+
+    cv2.imencode(".jpg", sheet, [cv2.IMWRITE_JPEG_QUALITY, 90])[1].tofile(out_path)
+    return len(items)
+
+
+class GERALDPreviewer:
+    def __init__(self, dataset, out_path: str, labels: Optional[Sequence] = None, relevant_only=False,
+                 n_workers=None):
+        """
+        Renders annotated previews of a GERALDDataset subset for visual review
+        :param dataset: GERALDDataset, the selected subset is rendered
+        :param out_path: Output directory
+        :param labels: Only render images containing any of these labels (GERALDLabels or names)
+        :param relevant_only: Only count relevant objects for the label filter
+        :param n_workers: Number of processes (0 for serial, None for all cpus)
+        """
+        self.dataset = dataset
+        self.out_path = out_path
+        self.labels = {label if isinstance(label, str) else label.name for label in labels} if labels else None
+        self.relevant_only = relevant_only
+        self.n_workers = n_workers
+
+    def filenames(self) -> List[str]:
+        """
+        Sorted filenames of the subset that pass the label filter
+        """
+        selected = []
+        for fn, an in zip(self.dataset.subset_filenames, self.dataset.subset_annotations):
+            if self.labels is not None and not any(obj.label.name in self.labels and
+                                                   (obj.relevant or not self.relevant_only) for obj in an.objects):
+                continue
+            selected.append(fn)
+        return sorted(selected)
+
+    def render_previews(self, size=None) -> int:
+        """
+        Writes <out_path>/previews/<filename>.jpg for every selected image
+        :param size: Preview size (w, h), the source size if None
+        :return: Number of previews
+        """
+        out = os.path.join(self.out_path, "previews")
+        os.makedirs(out, exist_ok=True)
+
+        items = [(self.dataset.im_path + fn + ".jpg", self.dataset.an_path + fn + ".xml", os.path.join(out, fn + ".jpg"))
+                 for fn in self.filenames()]
+        chunk = max(1, min(64, len(items) // (4 * n_processes(self.n_workers))))
+        jobs = [(items[i:i + chunk], tuple(size) if size else None) for i in range(0, len(items), chunk)]
+        logging.info("Rendering %d previews" % len(items))
+        return sum(map_jobs(_render_images, jobs, self.n_workers))
+
+    def render_contact_sheets(self, tile_size=(320, 180), grid=(6, 6)) -> List[str]:
+        """
+        Writes tiled contact sheets <out_path>/sheets/sheet_<n>.jpg and an index.json listing the images per sheet
+        :param tile_size: Size of one tile (w, h)
+        :param grid: Tiles per sheet (columns, rows)
+        :return: Paths of the sheets
+        """
+        out = os.path.join(self.out_path, "sheets")
+        os.makedirs(out, exist_ok=True)
+
+        filenames = self.filenames()
+        per_sheet = grid[0] * grid[1]
+        n_sheets = math.ceil(len(filenames) / per_sheet)
+
+        jobs, index = [], {}
+        for s in range(n_sheets):
+            names = filenames[s * per_sheet:(s + 1) * per_sheet]
+            sheet_path = os.path.join(out, "sheet_%04d.jpg" % s)
+            items = [(self.dataset.im_path + fn + ".jpg", self.dataset.an_path + fn + ".xml", fn) for fn in names]
+            jobs.append((items, sheet_path, tuple(tile_size), tuple(grid)))
+            index[os.path.basename(sheet_path)] = names
+
+        logging.info("Rendering %d images on %d contact sheets" % (len(filenames), n_sheets))
+        map_jobs(_render_sheet, jobs, self.n_workers)
+        with open(os.path.join(out, "index.json"), 'w') as fp:
+            json.dump(index, fp, indent=1)
+        return [job[1] for job in jobs]
+
+
+def main(argv=None):
+    from .dataset import GERALDDataset
+
+    parser = argparse.ArgumentParser(description="Renders annotated previews or contact sheets of GERALD")
+    parser.add_argument("-p", "--path", type=str, required=True, help="Path to GERALD dataset")
+    parser.add_argument("-o", "--out", type=str, required=True, help="Output directory")
+    parser.add_argument("-s", "--subset", type=str, default="all", help="Subset of GERALD")
+    parser.add_argument("-l", "--labels", type=str, nargs="+", default=None, help="Only images with these labels")
+    parser.add_argument("-r", "--relevant-only", action="store_true", help="Label filter only on relevant objects")
+    parser.add_argument("--previews", action="store_true", help="One preview per image instead of contact sheets")
+    parser.add_argument("--size", type=int, nargs=2, default=None, help="Preview or tile size (w h)")
+    parser.add_argument("--grid", type=int, nargs=2, default=[6, 6], help="Tiles per contact sheet (columns rows)")
+    parser.add_argument("-w", "--workers", type=int, default=None, help="Number of processes")
+    args = parser.parse_args(argv)
+
+    dataset = GERALDDataset(args.path, subset=args.subset, shuffle=False)
+    previewer = GERALDPreviewer(dataset, args.out, labels=args.labels, relevant_only=args.relevant_only,
+                                n_workers=args.workers)
+    if args.previews:
+        previewer.render_previews(size=args.size)
+    else:
+        previewer.render_contact_sheets(tile_size=args.size or (320, 180), grid=args.grid)
+
+
+if __name__ == "__main__":
+    main()
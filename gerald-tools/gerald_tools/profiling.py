@@ -0,0 +1,178 @@
+import csv
+import glob
+import json
+import os
+import time
+from collections import deque
+from multiprocessing.util import Finalize
+from typing import Callable, Dict, Optional
+
+import numpy as np
+
+PERCENTILES = (50, 90, 99)
+
+
+def _worker_id():
+    """
+    Id of the DataLoader worker of this process, -1 for the main process
+    """
+    try:
+        from torch.utils.data import get_worker_info
+    except ImportError:
+        return -1
+    info = get_worker_info()
+    return info.id if info is not None else -1
+
+
+def _flush(events: deque, trace_dir: str):
+    """
+    Appends the events to the trace file of this process and clears them. Registered as finalizer with the events
+    instead of the profiler, so the finalizer registry does not keep the profiler alive.
+    """
+    if not events:
+        return
+    with open(os.path.join(trace_dir, "stages-%d.jsonl" % os.getpid()), 'a') as fp:
+        fp.write("".join(json.dumps(e) + "\n" for e in events))
+    events.clear()
+
+
+class StageProfiler:
+    def __init__(self, trace_dir: Optional[str] = None, flush_every=1000, callback: Optional[Callable] = None,
+                 max_events=1000000):
+        """
+        Records the duration and processed bytes of the stages of the sample pipeline (read, decode, parse, ...).
+        Every DataLoader worker records into its own copy, use trace_dir to collect the events of all workers.
+        :param trace_dir: If given, events are appended to <trace_dir>/stages-<pid>.jsonl every flush_every events
+        :param flush_every: Number of events kept in memory before they are written to trace_dir
+        :param callback: Called as callback(stage, start, duration, nbytes, worker) for every event
+        :param max_events: Maximum number of events kept in memory, older events are dropped
+        """
+        self.trace_dir = trace_dir
+        self.flush_every = flush_every
+        self.callback = callback
+        self.events = deque(maxlen=max_events)  # (stage, start [s], duration [s], nbytes, pid, worker)
+        self._pid = os.getpid()
+        self._worker = -1
+
+        if self.trace_dir is not None:
+            os.makedirs(self.trace_dir, exist_ok=True)
+            # Flushes the events left in memory when the owning process exits, workers register their own below
+            Finalize(self, _flush, args=(self.events, self.trace_dir), exitpriority=10)
+
+    @staticmethod
+    def now():
+        return time.perf_counter()
+
+    def lap(self, stage: str, start: float, nbytes=0) -> float:
+        """
+        Records a stage that started at start and ends now
+        :param stage: Name of the stage
+        :param start: Start time from now() or the previous lap()
+        :param nbytes: Bytes read or produced by the stage
+        :return: End time, to be used as start of the next stage
+        """
+        end = time.perf_counter()
+        self.record(stage, start, end - start, nbytes)
+        return end
+
+    def record(self, stage: str, start: float, duration: float, nbytes=0):
+        pid = os.getpid()
+        if pid != self._pid:  # First event in this (worker) process
+            self._pid = pid
+            self._worker = _worker_id()
+            self.events.clear()
+            if self.trace_dir is not None:  # Workers exit without atexit handlers, but run these finalizers
+                Finalize(self, _flush, args=(self.events, self.trace_dir), exitpriority=10)
+
+        self.events.append((stage, start, duration, int(nbytes), pid, self._worker))
+
+        if self.callback is not None:
+            self.callback(stage, start, duration, nbytes, self._worker)
+        if self.trace_dir is not None and len(self.events) >= self.flush_every:
+            self.flush()
+
+    def flush(self):
+        """
+        Appends all events in memory to the trace file of this process and clears them
+        """
+        if self.trace_dir is not None:
+            _flush(self.events, self.trace_dir)
+
+    @classmethod
+    def load(cls, trace_dir: str) -> "StageProfiler":
+        """
+        Merges the events written by all processes into one profiler
+        :param trace_dir: Directory passed to the profilers of the dataset
+        :return: StageProfiler
+        """
+        profiler = cls()
+        for path in sorted(glob.glob(os.path.join(trace_dir, "stages-*.jsonl"))):
+            with open(path, 'r') as fp:
+                profiler.events.extend(tuple(json.loads(line)) for line in fp if line.strip())
+        return profiler
+
+    def reset(self):
+        self.events.clear()
+
+    def _grouped(self, by_worker=False) -> Dict:
+        groups = {}
+        for stage, _, duration, nbytes, _, worker in self.events:
+            key = (worker, stage) if by_worker else stage
+            durations, sizes = groups.setdefault(key, ([], []))
+            durations.append(duration)
+            sizes.append(nbytes)
+        return groups
+
+    def summary(self, percentiles=PERCENTILES, by_worker=False) -> Dict:
+        """
+        Aggregated statistics per stage (and worker)
+        :param percentiles: Percentiles of the duration to compute
+        :param by_worker: If True, keys are (worker, stage) instead of stage
+        :return: Dict with count, total/mean/percentile durations in ms and processed bytes
+        """
+        result = {}
+        for key, (durations, sizes) in self._grouped(by_worker).items():
+            d = 1e3 * np.asarray(durations)
+            stats = {"count": len(d), "total_ms": float(d.sum()), "mean_ms": float(d.mean()),
+                     "bytes": int(np.sum(sizes))}
+            for p, v in zip(percentiles, np.percentile(d, percentiles)):
+                stats["p%g_ms" % p] = float(v)
+            result[key] = stats
+        return result
+
+    def histogram(self, stage: str, bins=20):
+        """
+        Histogram of the durations of one stage on logarithmic bins
+        :param stage: Name of the stage
+        :param bins: Number of bins
+        :return: counts, bin edges in ms
+        """
+        d = 1e3 * np.asarray([e[2] for e in self.events if e[0] == stage])
+        if len(d) == 0:
+            return np.zeros(bins, dtype=np.int64), np.zeros(bins + 1)
+        lo, hi = max(d.min(), 1e-6), max(d.max(), 2e-6)
+        return np.histogram(d, bins=np.geomspace(lo, hi, bins + 1))
+
+    def to_dict(self) -> Dict:
+        return {"summary": self.summary(),
+                "by_worker": {"%d/%s" % key: stats for key, stats in self.summary(by_worker=True).items()}}
+
+    def to_csv(self, path: str):
+        """
+        Writes one row per event
+        """
+        with open(path, 'w', newline='') as fp:
+            writer = csv.writer(fp)
+            writer.writerow(["stage", "start_s", "duration_ms", "bytes", "pid", "worker"])
+            for stage, start, duration, nbytes, pid, worker in self.events:
+                writer.writerow([stage, "%.6f" % start, "%.4f" % (1e3 * duration), nbytes, pid, worker])
+
+    def to_chrome_trace(self, path: str):
+        """
+        Writes the events in the Chrome trace format (chrome://tracing, Perfetto), one track per worker
+        """
+        events = [{"name": stage, "ph": "X", "ts": 1e6 * start, "dur": 1e6 * duration, "pid": pid, "tid": worker,
+                   "args": {"bytes": nbytes}}
+                  for stage, start, duration, nbytes, pid, worker in self.events]
+        with open(path, 'w') as fp:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, fp)
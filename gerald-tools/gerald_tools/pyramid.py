@@ -0,0 +1,215 @@
+import logging
+import os
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+from cv2 import cv2
+
+from .utils import box_ops
+from .utils.files import file_fingerprint, map_jobs, n_processes
+
+INDEX_NAME = "index.npz"
+
+
+def _level_path(path: str, level: int):
+    return os.path.join(path, "level_%d.u8" % level)
+
+
+def _build_images(job):
+    """
+    Decodes images once and writes all pyramid levels
+    :param job: Tuple of pyramid path, list of (image path, offsets per level, shapes per level)
+    :return: Number of images
+    """
+    path, items = job
+    n_levels = len(items[0][1]) if items else 0
+    levels = [np.memmap(_level_path(path, level), dtype=np.uint8, mode='r+') for level in range(n_levels)]
+
+    for im_path, offsets, shapes in items:
+        im = cv2.imdecode(np.fromfile(im_path, dtype=np.uint8), cv2.IMREAD_COLOR)  # Support non unicode filepaths
+        if im is None:
+            raise IOError("Could not decode %s" % im_path)
+        for level, (store, offset, (h, w, c)) in enumerate(zip(levels, offsets, shapes)):
+            if (im.shape[0], im.shape[1]) != (h, w):
+                if level == 0:  # Level 0 has the size from the XML, the targets are relative to it
+                    raise ValueError("Image size of %s does not match its annotation" % im_path)
+                # Resize from the previous level, each step is a cheap 2:1 area reduction for the default scales
+                im = cv2.resize(im, (w, h), interpolation=cv2.INTER_AREA)
+            store[offset:offset + h * w * c] = im.reshape(-1)
+
+    for store in levels:
+        store.flush()
+    return len(items)
+
+
+def build_pyramid(dataset, out_path: str, scales: Sequence[float] = (1, 0.5, 0.25), n_workers=None) -> "PyramidStore":
+    """
+    Stores every image of the dataset subset at a few fixed scales in memory-mappable uint8 files, together with
+    the targets of every level
+    :param dataset: GERALDDataset, all images of the selected subset are stored
+    :param out_path: Output directory
+    :param scales: Scale of every level relative to the source image, in decreasing order
+    :param n_workers: Number of processes (0 for serial, None for all cpus)
+    :return: PyramidStore
+    """
+    scales = sorted(scales, reverse=True)
+    filenames = sorted(dataset.subset_filenames)
+    annotations = [dataset.registry[fn] for fn in filenames]
+    n, n_levels = len(filenames), len(scales)
+    os.makedirs(out_path, exist_ok=True)
+
+    src = np.array([(an.src_height, an.src_width, 3) for an in annotations], dtype=np.int64).reshape((-1, 3))
+    shapes = np.zeros((n_levels, n, 3), dtype=np.int64)
+    offsets = np.zeros((n_levels, n + 1), dtype=np.int64)
+    for level, scale in enumerate(scales):
+        shapes[level] = src
+        shapes[level, :, :2] = np.maximum(1, np.round(src[:, :2] * scale))
+        np.cumsum(shapes[level].prod(1), out=offsets[level, 1:])
+
+    # Targets of level 0 in the layout of GERALDDataset.build_targets, with raw label values
+    counts = np.array([len(an.objects) for an in annotations], dtype=np.int64)
+    target_offsets = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(counts, out=target_offsets[1:])
+    base = np.array([(o.x_c, o.y_c, o.w, o.h, o.label.value, 0) for an in annotations for o in an.objects],
+                    dtype=np.float32).reshape((-1, 6))
+    relevant = np.array([o.relevant for an in annotations for o in an.objects], dtype=bool)
+
+    targets = np.zeros((n_levels,) + base.shape, dtype=np.float32)
+    for level in range(n_levels):
+        sx = np.repeat(shapes[level, :, 1] / np.maximum(src[:, 1], 1), counts)
+        sy = np.repeat(shapes[level, :, 0] / np.maximum(src[:, 0], 1), counts)
+        targets[level] = base
+        targets[level, :, 0:4:2] *= sx[:, None]
+        targets[level, :, 1:4:2] *= sy[:, None]
+
+    for level in range(n_levels):
+        with open(_level_path(out_path, level), 'wb') as fp:
+            fp.truncate(int(offsets[level, -1]))
+
+    items = [(dataset.im_path + fn + ".jpg", offsets[:, i].tolist(), shapes[:, i].tolist())
+             for i, fn in enumerate(filenames)]
+    chunk = max(1, min(64, n // (4 * n_processes(n_workers))))
+    jobs = [(out_path, items[i:i + chunk]) for i in range(0, n, chunk)]
+
+    logging.info("Building pyramid with %d levels for %d images" % (n_levels, n))
+    map_jobs(_build_images, jobs, n_workers)
+
+    fingerprints = np.array([file_fingerprint(dataset.an_path + fn + ".xml", dataset.im_path + fn + ".jpg")
+                             for fn in filenames], dtype=np.int64).reshape((-1, 4))
+    np.savez(os.path.join(out_path, INDEX_NAME), filenames=np.array(filenames), scales=np.array(scales),
+             shapes=shapes, offsets=offsets, targets=targets, target_offsets=target_offsets, relevant=relevant,
+             fingerprints=fingerprints)
+    return PyramidStore(out_path)
+
+
+class PyramidStore:
+    def __init__(self, path: str):
+        """
+        Read access to a pyramid written by build_pyramid. The level files are memory-mapped on first use in every
+        process, so DataLoader workers share the page cache instead of copying images.
+        :param path: Directory of the pyramid
+        """
+        self.path = path
+        with np.load(os.path.join(path, INDEX_NAME)) as index:
+            self.filenames: List[str] = index["filenames"].tolist()
+            self.scales = index["scales"]
+            self.shapes = index["shapes"]
+            self.offsets = index["offsets"]
+            self.targets = index["targets"]
+            self.target_offsets = index["target_offsets"]
+            self.relevant = index["relevant"]
+            self.fingerprints = index["fingerprints"]
+        self.index = {fn: i for i, fn in enumerate(self.filenames)}
+        self._levels = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_levels"] = None
+        return state
+
+    def __len__(self):
+        return len(self.filenames)
+
+    def valid(self, i: int, xml_path: str, im_path: str) -> bool:
+        """
+        True if the source files of entry i did not change since the pyramid was built
+        """
+        return file_fingerprint(xml_path, im_path) == self.fingerprints[i].tolist()
+
+    def level_for(self, i: int, size: Optional[Tuple[int, int]]) -> int:
+        """
+        Smallest level that is at least as large as size (w, h), level 0 if none is
+        """
+        if size is None:
+            return 0
+        h, w = self.shapes[:, i, 0], self.shapes[:, i, 1]
+        fits = np.flatnonzero((w >= size[0]) & (h >= size[1]))
+        return int(fits[-1]) if len(fits) else 0
+
+    def image(self, i: int, level: int) -> np.ndarray:
+        """
+        HxWx3 BGR uint8 view into the memory-mapped level
+        """
+        if self._levels is None:
+            self._levels = [np.memmap(_level_path(self.path, lvl), dtype=np.uint8, mode='r')
+                            for lvl in range(len(self.scales))]
+        offset, shape = self.offsets[level, i], self.shapes[level, i]
+        return self._levels[level][offset:offset + shape.prod()].reshape(shape)
+
+    def read(self, i: int, size: Optional[Tuple[int, int]] = None):
+        """
+        Image and targets of entry i from the nearest level, resized to size
+        :param i: Index of the entry
+        :param size: Output size (w, h), the size of level 0 if None
+        :return: BGR uint8 image, nx6 float32 targets (raw label values), n relevant flags
+        """
+        level = self.level_for(i, size)
+        im = self.image(i, level)
+        rows = slice(self.target_offsets[i], self.target_offsets[i + 1])
+        targets = self.targets[level, rows]
+
+        h, w = im.shape[:2]
+        if size is not None and (w, h) != tuple(size):
+            interpolation = cv2.INTER_AREA if size[0] < w else cv2.INTER_LINEAR
+            im = cv2.resize(im, tuple(size), interpolation=interpolation)
+            targets = box_ops.scale(targets, size[0] / w, size[1] / h)
+        else:
+            im = np.array(im)  # Copy out of the memory map, the caller may modify the image
+            targets = targets.copy()
+        return im, targets, self.relevant[rows]
+
+
+class MultiScaleBatchSampler:
+    def __init__(self, sampler, batch_size: int, sizes: Sequence[Tuple[int, int]], drop_last=False, seed=331297):
+        """
+        Batches indices of a sampler and picks one output size per batch. Yields lists of (index, (w, h)), which
+        GERALDDataset.__getitem__ accepts, so that all images of a batch have the same size.
+        :param sampler: Sampler of dataset indices, e.g. GERALDSampler
+        :param batch_size: Batch size
+        :param sizes: Output sizes (w, h) to choose from
+        :param drop_last: Drop the last incomplete batch
+        :param seed: Seed for the size choice, combined with the epoch of the sampler if it has one
+        """
+        self.sampler = sampler
+        self.batch_size = batch_size
+        self.sizes = [tuple(size) for size in sizes]
+        self.drop_last = drop_last
+        self.seed = seed
+
+    def __iter__(self):
+        rng = np.random.default_rng([self.seed, getattr(self.sampler, "epoch", 0)])
+        batch = []
+        for idx in self.sampler:
+            batch.append(idx)
+            if len(batch) == self.batch_size:
+                size = self.sizes[rng.integers(len(self.sizes))]
+                yield [(i, size) for i in batch]
+                batch = []
+        if batch and not self.drop_last:
+            size = self.sizes[rng.integers(len(self.sizes))]
+            yield [(i, size) for i in batch]
+
+    def __len__(self):
+        if self.drop_last:
+            return len(self.sampler) // self.batch_size
+        return (len(self.sampler) + self.batch_size - 1) // self.batch_size
@@ -0,0 +1,161 @@
+import os
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional, Sequence
+
+import numpy as np
+
+
+def _worker_info():
+    try:
+        from torch.utils.data import get_worker_info
+    except ImportError:
+        return None
+    return get_worker_info()
+
+
+class ReadAhead:
+    def __init__(self, path_of: Callable[[int], str], order: Sequence[int], batch_size=1, num_workers=0,
+                 n_threads=4, depth=32, max_bytes=256 * 2 ** 20):
+        """
+        Prefetches raw file bytes in the order in which a sampler will request them, so that reading overlaps with
+        decoding. Each DataLoader worker only prefetches the indices of the batches it will be assigned.
+        Reading starts on the first read() of a process, or earlier with start() (e.g. through worker_init_fn).
+        :param path_of: Returns the file path of a dataset index
+        :param order: Dataset indices in the exact order the sampler yields them. Use a deterministic order, e.g.
+            GERALDSampler.indices() of the current epoch or the seeded index list that is also passed as sampler.
+            list(sampler) of a RandomSampler draws a different permutation than the DataLoader will.
+        :param batch_size: Batch size of the DataLoader
+        :param num_workers: Number of DataLoader workers (0 if loading in the main process)
+        :param n_threads: Number of reader threads per process
+        :param depth: Maximum number of files read ahead
+        :param max_bytes: Maximum number of bytes of scheduled and finished, not yet consumed reads
+        """
+        self.path_of = path_of
+        self.order = list(order)
+        self.batch_size = batch_size
+        self.num_workers = num_workers
+        self.n_threads = n_threads
+        self.depth = depth
+        self.max_bytes = max_bytes
+
+        self.hits = 0
+        self.misses = 0
+        self._pid = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        for key in ("_pid", "_executor", "_lock", "_pending", "_positions", "_order", "_cursor", "_next",
+                    "_buffered"):
+            state.pop(key, None)
+        state["_pid"] = None
+        return state
+
+    def _setup(self):
+        """
+        Per process state, created on first use so that no threads exist before DataLoader workers are forked
+        """
+        info = _worker_info()
+        if info is not None and self.num_workers > 0:  # Batches are assigned round-robin to the workers
+            self._order = [idx for pos, idx in enumerate(self.order)
+                           if (pos // self.batch_size) % self.num_workers == info.id]
+        else:
+            self._order = self.order
+
+        self._positions: Dict[int, deque] = {}
+        for pos, idx in enumerate(self._order):
+            self._positions.setdefault(idx, deque()).append(pos)
+
+        self._executor = ThreadPoolExecutor(max_workers=self.n_threads, thread_name_prefix="gerald-read-ahead")
+        self._lock = threading.Lock()
+        self._pending = {}  # Position -> (Future, reserved bytes)
+        self._cursor = 0  # Position of the next expected read
+        self._next = 0  # Next position to schedule
+        self._buffered = 0  # Bytes reserved for scheduled, running and finished but not consumed reads
+        self._pid = os.getpid()
+        self._schedule()
+
+    def start(self):
+        """
+        Starts reading ahead in this process before the first read()
+        """
+        if self._pid != os.getpid():
+            self._setup()
+
+    def _schedule(self):
+        self._next = max(self._next, self._cursor)
+        while self._next < len(self._order) and len(self._pending) < self.depth:
+            path = self.path_of(self._order[self._next])
+            try:
+                size = os.path.getsize(path)
+            except OSError:  # Reported by the read in the consuming thread
+                size = 0
+            with self._lock:
+                if self._pending and self._buffered + size > self.max_bytes:
+                    break
+                self._buffered += size  # Counted when scheduled, reads in flight can not exceed the cap
+            self._pending[self._next] = (self._executor.submit(np.fromfile, path, dtype=np.uint8), size)
+            self._next += 1
+
+    def _release(self, size):
+        with self._lock:
+            self._buffered -= size
+
+    def _position(self, idx) -> Optional[int]:
+        positions = self._positions.get(idx)
+        while positions and positions[0] < self._cursor:  # Skipped positions
+            positions.popleft()
+        return positions.popleft() if positions else None
+
+    def read(self, idx: int) -> np.ndarray:
+        """
+        Returns the bytes of the file of a dataset index, from the prefetch buffer if possible
+        :param idx: Dataset index
+        :return: uint8 ndarray
+        """
+        if self._pid != os.getpid():
+            self._setup()
+
+        pos = self._position(idx)
+        if pos is None:  # Not part of the announced order
+            self.misses += 1
+            return np.fromfile(self.path_of(idx), dtype=np.uint8)
+
+        for stale in [p for p in self._pending if p < pos]:  # Reads the sampler skipped
+            future, size = self._pending.pop(stale)
+            if future.cancel():
+                self._release(size)
+            else:
+                future.add_done_callback(lambda _, size=size: self._release(size))
+
+        pending = self._pending.pop(pos, None)
+        self._cursor = pos + 1
+
+        if pending is None:  # Requested before it was scheduled, read in this thread
+            self._schedule()
+            self.misses += 1
+            return np.fromfile(self.path_of(idx), dtype=np.uint8)
+
+        future, size = pending
+        self.hits += 1
+        data = future.result()
+        self._release(size)
+        self._schedule()
+        return data
+
+    def close(self):
+        if self._pid == os.getpid():
+            self._executor.shutdown(wait=False)
+            self._pid = None
+
+
+def worker_init_fn(worker_id):
+    """
+    DataLoader worker_init_fn that starts the read-ahead of a GERALDDataset as soon as the worker is up, so that
+    the first batch of every worker is already being read
+    """
+    info = _worker_info()
+    read_ahead = getattr(info.dataset, "read_ahead", None) if info is not None else None
+    if read_ahead:
+        read_ahead.start()
@@ -0,0 +1,300 @@
+import math
+from typing import Dict, Optional
+
+import numpy as np
+import torch
+import torch.distributed as dist
+from torch.utils.data import Sampler
+
+
+def _dist_info(num_replicas: Optional[int], rank: Optional[int]):
+    if num_replicas is None:
+        num_replicas = dist.get_world_size() if dist.is_available() and dist.is_initialized() else 1
+    if rank is None:
+        rank = dist.get_rank() if dist.is_available() and dist.is_initialized() else 0
+    if not 0 <= rank < num_replicas:
+        raise ValueError("Invalid rank %d for %d replicas" % (rank, num_replicas))
+    return num_replicas, rank
+
+
+class GERALDSampler(Sampler):
+    def __init__(self, data_source, shuffle=True, seed=331297, num_replicas: Optional[int] = None,
+                 rank: Optional[int] = None, drop_last=False):
+        """
+        Deterministic, resumable sampler that shards a GERALD subset evenly across distributed ranks.
+        The permutation of every epoch is derived from (seed, epoch) with a private generator, the global random
+        state is never touched. Within a rank, the DataLoader hands out whole batches round-robin to its workers.
+        :param data_source: Dataset (e.g. GERALDDataset) or its length
+        :param shuffle: Use a new permutation every epoch, otherwise the dataset order
+        :param seed: Seed shared by all ranks
+        :param num_replicas: Number of ranks, taken from torch.distributed if None
+        :param rank: Rank of this process, taken from torch.distributed if None
+        :param drop_last: Drop the tail that does not divide evenly across ranks instead of padding it
+        """
+        self.n = data_source if isinstance(data_source, int) else len(data_source)
+        self.shuffle = shuffle
+        self.seed = seed
+        self.num_replicas, self.rank = _dist_info(num_replicas, rank)
+        self.drop_last = drop_last
+
+        if self.drop_last:
+            self.num_samples = self.n // self.num_replicas
+        else:
+            self.num_samples = math.ceil(self.n / self.num_replicas)
+        self.total_size = self.num_samples * self.num_replicas
+
+        self.epoch = 0
+        self.start = 0  # Samples of this rank already consumed in the current epoch
+        self.yielded = 0
+
+    def set_epoch(self, epoch: int):
+        """
+        Selects the permutation of the given epoch and starts it from the beginning
+        """
+        self.epoch = epoch
+        self.start = 0
+
+    def permutation(self, epoch: Optional[int] = None) -> np.ndarray:
+        """
+        Order of the whole dataset (all ranks) in an epoch
+        """
+        epoch = self.epoch if epoch is None else epoch
+        if not self.shuffle:
+            return np.arange(self.n)
+        return np.random.default_rng([self.seed, epoch]).permutation(self.n)
+
+    def indices(self, epoch: Optional[int] = None) -> np.ndarray:
+        """
+        Indices of this rank in an epoch, without the resume offset
+        """
+        order = self.permutation(epoch)
+        if self.drop_last:
+            order = order[:self.total_size]
+        elif self.total_size > self.n:  # Pad by repeating from the start so that all ranks get the same number
+            order = np.concatenate([order, np.resize(order, self.total_size - self.n)])
+        return order[self.rank:self.total_size:self.num_replicas]
+
+    def __iter__(self):
+        indices = self.indices()[self.start:]
+        self.yielded = self.start
+        for idx in indices.tolist():
+            self.yielded += 1
+            yield idx
+        self.start = 0  # A resumed epoch only skips samples once
+
+    def __len__(self):
+        return self.num_samples - self.start
+
+    def state_dict(self, consumed: Optional[int] = None) -> Dict:
+        """
+        Position of this rank, enough to continue at the exact sample after a restart
+        :param consumed: Samples of the current epoch this rank has processed. The DataLoader prefetches indices, so
+            pass the number of samples the training loop has seen. If None, the number of yielded indices is used.
+        :return: Dict
+        """
+        return {"seed": self.seed,
+                "epoch": self.epoch,
+                "consumed": self.yielded if consumed is None else consumed,
+                "n": self.n,
+                "num_replicas": self.num_replicas,
+                "shuffle": self.shuffle}
+
+    def load_state_dict(self, state: Dict):
+        if state["n"] != self.n or state["num_replicas"] != self.num_replicas:
+            raise ValueError("Sampler state was saved for %d samples on %d ranks, not %d samples on %d ranks" %
+                             (state["n"], state["num_replicas"], self.n, self.num_replicas))
+        self.seed = state["seed"]
+        self.shuffle = state["shuffle"]
+        self.epoch = state["epoch"]
+        self.start = state["consumed"]
+        self.yielded = state["consumed"]
+
+
+class SumTree:
+    def __init__(self, n: int):
+        """
+        Binary tree over n non-negative priorities in which every node holds the sum of its children. Updating k
+        priorities and drawing k samples both take O(k log n), vectorized over k.
+        :param n: Number of leaves
+        """
+        self.n = n
+        self.capacity = 1 << max(0, int(n - 1).bit_length())
+        self.tree = np.zeros(2 * self.capacity, dtype=np.float64)  # Root at 1, leaves at capacity + i
+        self.depth = self.capacity.bit_length() - 1
+
+    @property
+    def total(self) -> float:
+        return float(self.tree[1])
+
+    @property
+    def priorities(self) -> np.ndarray:
+        return self.tree[self.capacity:self.capacity + self.n]
+
+    def update(self, indices, priorities):
+        """
+        Sets the priorities of the given leaves, the last value wins for repeated indices
+        """
+        nodes = np.asarray(indices, dtype=np.int64) + self.capacity
+        self.tree[nodes] = priorities
+        for _ in range(self.depth):
+            nodes = np.unique(nodes // 2)
+            self.tree[nodes] = self.tree[2 * nodes] + self.tree[2 * nodes + 1]
+
+    def rebuild(self, priorities):
+        """
+        Sets all priorities at once in O(n)
+        """
+        self.tree[:] = 0
+        self.tree[self.capacity:self.capacity + self.n] = priorities
+        for level in range(self.depth, 0, -1):
+            lo = 1 << (level - 1)
+            self.tree[lo:2 * lo] = self.tree[2 * lo:4 * lo:2] + self.tree[2 * lo + 1:4 * lo:2]
+
+    def sample(self, values) -> np.ndarray:
+        """
+        Leaves whose cumulative priority range contains the given values
+        :param values: Values in [0, total)
+        :return: int64 ndarray of leaf indices
+        """
+        values = np.array(values, dtype=np.float64)
+        nodes = np.ones(len(values), dtype=np.int64)
+        for _ in range(self.depth):
+            left = self.tree[2 * nodes]
+            right = values >= left
+            values -= left * right
+            nodes = 2 * nodes + right
+        return np.minimum(nodes - self.capacity, self.n - 1)  # Rounding can overshoot into empty leaves
+
+
+class HardExampleSampler(GERALDSampler):
+    def __init__(self, data_source, num_samples: Optional[int] = None, temperature=1.0, uniform=0.2, momentum=0.9,
+                 default_loss=1.0, seed=331297, num_replicas: Optional[int] = None, rank: Optional[int] = None):
+        """
+        Samples GERALD images with replacement, proportional to their recent loss, so that hard images (dark, foggy,
+        tiny or rare signals) are seen more often. Feed back the per-image losses of every batch with update(),
+        keyed by the idxs returned by collate_fn. Priorities live in a SumTree.
+        Recorded losses take effect in set_epoch(), call it before every epoch on all ranks. The indices of an epoch
+        are drawn from these priorities with a generator seeded by (seed, epoch), so indices() (e.g. for read-ahead)
+        matches the iteration. All ranks draw the same global order and take disjoint strides of it. The sampler
+        lives in the main process, DataLoader workers only receive its indices.
+        :param data_source: Dataset (e.g. GERALDDataset) or its length
+        :param num_samples: Draws per epoch over all ranks, the dataset length if None. Shorter epochs refresh the
+            priorities more often.
+        :param temperature: Priorities are loss ** (1 / temperature), large values approach uniform sampling
+        :param uniform: Fraction of draws that are uniform, keeps easy images in the mix and visits unseen ones
+        :param momentum: Weight of the previous loss in the exponential moving average per image
+        :param default_loss: Loss of images without feedback yet
+        :param seed: Seed shared by all ranks
+        :param num_replicas: Number of ranks, taken from torch.distributed if None
+        :param rank: Rank of this process, taken from torch.distributed if None
+        """
+        super().__init__(data_source, shuffle=True, seed=seed, num_replicas=num_replicas, rank=rank)
+        if temperature <= 0:
+            raise ValueError("Temperature " + str(temperature) + " is invalid!")
+        if not 0 <= uniform <= 1:
+            raise ValueError("Uniform fraction " + str(uniform) + " is invalid!")
+
+        self.num_samples = math.ceil((self.n if num_samples is None else num_samples) / self.num_replicas)
+        self.total_size = self.num_samples * self.num_replicas
+        self.temperature = temperature
+        self.uniform = uniform
+        self.momentum = momentum
+        self.default_loss = default_loss
+
+        self.losses = np.full(self.n, np.nan)  # Moving average per image, nan without feedback
+        self.tree = SumTree(self.n)
+        self.tree.rebuild(self._priority(self.losses))
+        self._pending = []  # (indices, losses) of this rank since the last sync
+
+    def _priority(self, losses: np.ndarray) -> np.ndarray:
+        losses = np.where(np.isnan(losses), self.default_loss, losses)
+        return np.maximum(losses, 0) ** (1 / self.temperature) + 1e-8  # Every image keeps a chance
+
+    def update(self, indices, losses):
+        """
+        Records per-image losses of this rank, they take effect at the next set_epoch() or sync()
+        :param indices: Dataset indices, e.g. the idxs of collate_fn
+        :param losses: Loss per index (sequence, ndarray or tensor)
+        """
+        if torch.is_tensor(losses):
+            losses = losses.detach().float().cpu().numpy()
+        self._pending.append((np.asarray(indices, dtype=np.int64).reshape(-1),
+                              np.asarray(losses, dtype=np.float64).reshape(-1)))
+
+    def sync(self):
+        """
+        Applies the recorded losses of all ranks in rank order, so that every rank ends up with the same
+        priorities. Collective if torch.distributed is initialized, called by set_epoch().
+        """
+        pending = [self._pending]
+        if self.num_replicas > 1 and dist.is_available() and dist.is_initialized():
+            pending = [None] * self.num_replicas
+            dist.all_gather_object(pending, self._pending)
+        self._pending = []
+
+        for rank_pending in pending:
+            for indices, losses in rank_pending:
+                self._apply(indices, losses)
+
+    def _apply(self, indices: np.ndarray, losses: np.ndarray):
+        previous = self.losses[indices]
+        self.losses[indices] = np.where(np.isnan(previous), losses,
+                                        self.momentum * previous + (1 - self.momentum) * losses)
+        self.tree.update(indices, self._priority(self.losses[indices]))
+
+    def probabilities(self) -> np.ndarray:
+        """
+        Probability of every image per draw
+        """
+        return (1 - self.uniform) * self.tree.priorities / self.tree.total + self.uniform / self.n
+
+    def importance_weights(self, indices, beta=1.0) -> np.ndarray:
+        """
+        Weights that correct the loss of sampled images for the non-uniform sampling, normalized to a maximum of 1
+        :param indices: Dataset indices
+        :param beta: 0 for no correction, 1 for full correction
+        """
+        weights = (self.n * self.probabilities()) ** -beta
+        return weights[np.asarray(indices, dtype=np.int64)] / weights.max()
+
+    def permutation(self, epoch: Optional[int] = None) -> np.ndarray:
+        """
+        Draws of the whole epoch (all ranks) from the current priorities
+        """
+        rng = np.random.default_rng([self.seed, self.epoch if epoch is None else epoch])
+        order = self.tree.sample(rng.random(self.total_size) * self.tree.total)
+        uniform = rng.random(self.total_size) < self.uniform
+        order[uniform] = rng.integers(self.n, size=int(uniform.sum()))
+        return order
+
+    def indices(self, epoch: Optional[int] = None) -> np.ndarray:
+        return self.permutation(epoch)[self.rank:self.total_size:self.num_replicas]
+
+    def set_epoch(self, epoch: int):
+        """
+        Applies the recorded losses of all ranks (collective, see sync()) and starts the given epoch, whose indices
+        are drawn from the updated priorities. indices() and iteration agree until the next set_epoch().
+        """
+        self.sync()
+        super().set_epoch(epoch)
+
+    def state_dict(self, consumed: Optional[int] = None) -> Dict:
+        """
+        Position and priorities of this rank. The losses of this rank that are not synced yet are included, so every
+        rank should save its own state.
+        """
+        state = super().state_dict(consumed)
+        state.update({"losses": self.losses.tolist(),
+                      "pending": [[indices.tolist(), losses.tolist()] for indices, losses in self._pending],
+                      "temperature": self.temperature,
+                      "uniform": self.uniform})
+        return state
+
+    def load_state_dict(self, state: Dict):
+        super().load_state_dict(state)
+        self.temperature = state["temperature"]
+        self.uniform = state["uniform"]
+        self.losses = np.array(state["losses"], dtype=np.float64)
+        self.tree.rebuild(self._priority(self.losses))
+        self._pending = [(np.array(indices, dtype=np.int64), np.array(losses, dtype=np.float64))
+                         for indices, losses in state["pending"]]
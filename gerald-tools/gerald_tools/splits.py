@@ -0,0 +1,308 @@
+import json
+import logging
+import os
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+from .utils import GERALDLabels, WeatherCondition, LightCondition
+
+TEST = -1  # Fold id of the test set, train/val folds are numbered from 0
+UNASSIGNED = -2
+
+
+def video_of(filename: str) -> str:
+    """
+    Source video of a frame, GERALD filenames are <video>=<src_time>
+    """
+    return filename.split("=")[0]
+
+
+def stratification_matrix(annotations) -> np.ndarray:
+    """
+    Presence of every label, weather and light condition per image
+    :param annotations: List of Annotation
+    :return: nxC bool ndarray with C = |GERALDLabels| + |WeatherCondition| + |LightCondition|
+    """
+    n_labels, n_weather = len(GERALDLabels), len(WeatherCondition)
+    n_cols = n_labels + n_weather + len(LightCondition)
+
+    image_idx = np.repeat(np.arange(len(annotations)), [len(an.objects) for an in annotations])
+    label_idx = np.array([o.label.value for an in annotations for o in an.objects], dtype=np.int64)
+
+    matrix = np.zeros((len(annotations), n_cols), dtype=bool)
+    matrix[image_idx, label_idx] = True
+    rows = np.arange(len(annotations))
+    matrix[rows, n_labels + np.array([an.weather.value for an in annotations], dtype=np.int64)] = True
+    matrix[rows, n_labels + n_weather + np.array([an.light.value for an in annotations], dtype=np.int64)] = True
+    return matrix
+
+
+def iterative_stratification(counts: np.ndarray, sizes: np.ndarray, ratios: Sequence[float], seed=331297,
+                             base_counts: Optional[np.ndarray] = None,
+                             base_sizes: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Multi-label iterative stratification (Sechidis et al., 2011) of groups of images. The rarest remaining label is
+    distributed first, each group goes to the fold that still lacks most of that label.
+    :param counts: gxC ndarray, number of images of each group that contain a label
+    :param sizes: g ndarray, number of images per group
+    :param ratios: Desired fraction of images per fold
+    :param seed: Seed for breaking ties
+    :param base_counts: fxC ndarray, label counts already in every fold, e.g. when new groups are added
+    :param base_sizes: f ndarray, images already in every fold
+    :return: g int64 ndarray with the fold of every group
+    """
+    rng = np.random.default_rng(seed)
+    counts = np.asarray(counts, dtype=np.float64)
+    sizes = np.asarray(sizes, dtype=np.float64)
+    ratios = np.asarray(ratios, dtype=np.float64) / np.sum(ratios)
+    if base_counts is None:
+        base_counts = np.zeros((len(ratios), counts.shape[1]))
+    if base_sizes is None:
+        base_sizes = np.zeros(len(ratios))
+
+    # Label occurrences and images each fold still needs
+    desired = ratios[:, None] * (counts.sum(0) + base_counts.sum(0))[None, :] - base_counts
+    capacity = ratios * (sizes.sum() + np.sum(base_sizes)) - base_sizes
+    folds = np.full(len(sizes), -1, dtype=np.int64)
+    remaining = np.ones(len(sizes), dtype=bool)
+
+    def assign(group, column):
+        # Only folds with room for the whole group, the emptiest fold if the group fits nowhere
+        fits = capacity >= sizes[group]
+        allowed = fits if fits.any() else capacity == capacity.max()
+        score = np.where(allowed, capacity if column is None else desired[:, column], -np.inf)
+        candidates = np.flatnonzero(score == score.max())
+        if len(candidates) > 1 and column is not None:
+            candidates = candidates[capacity[candidates] == capacity[candidates].max()]
+        fold = candidates[rng.integers(len(candidates))] if len(candidates) > 1 else candidates[0]
+        folds[group] = fold
+        desired[fold] -= counts[group]
+        capacity[fold] -= sizes[group]
+        remaining[group] = False
+
+    while remaining.any():
+        present = (counts[remaining] > 0).sum(0)
+        if not present.any():  # Groups without any label only balance the fold sizes
+            for group in rng.permutation(np.flatnonzero(remaining)):
+                assign(group, None)
+            break
+        column = int(np.argmin(np.where(present > 0, present, np.iinfo(np.int64).max)))
+        for group in rng.permutation(np.flatnonzero(remaining & (counts[:, column] > 0))):
+            assign(group, column)
+
+    # Every fold with a non-zero ratio gets at least one group, taken from the fold that is most over its target
+    for fold in np.flatnonzero((ratios > 0) & (np.bincount(folds, minlength=len(ratios)) == 0)):
+        n_groups = np.bincount(folds, minlength=len(ratios))
+        donors = np.flatnonzero(n_groups > 1)
+        if not len(donors):
+            break
+        donor = donors[np.argmin(capacity[donors])]
+        group = np.flatnonzero(folds == donor)[np.argmin(sizes[folds == donor])]
+        folds[group] = fold
+        capacity[donor] += sizes[group]
+        capacity[fold] -= sizes[group]
+
+    return folds
+
+
+class GERALDSplits:
+    def __init__(self, filenames: List[str], folds: np.ndarray, k_folds: Optional[int] = None, split=0.8,
+                 test=0.1, seed=331297):
+        """
+        Assignment of every image to the test set or to one of the train/val folds
+        :param filenames: Filenames (without extension)
+        :param folds: Fold per filename, TEST for the test set. Without k-fold, fold 0 is train and 1 is val.
+        :param k_folds: Number of cross-validation folds, None for a single train/val split
+        :param split: Train/val split ratio the folds were computed with
+        :param test: Fraction of test images the folds were computed with
+        :param seed: Seed the folds were computed with
+        """
+        self.filenames = list(filenames)
+        self.folds = np.asarray(folds, dtype=np.int8)
+        self.k_folds = k_folds
+        self.split = split
+        self.test = test
+        self.seed = seed
+
+    @classmethod
+    def compute(cls, filenames: List[str], annotations, k_folds: Optional[int] = None, split=0.8, test=0.1,
+                seed=331297) -> "GERALDSplits":
+        """
+        Stratifies over label presence, weather and light. Frames of the same video always end up in the same fold,
+        so that near identical images can not leak from train into val or test.
+        :param filenames: Filenames (without extension)
+        :param annotations: Annotation per filename
+        :param k_folds: Number of cross-validation folds, None for a single train/val split
+        :param split: Train/val split ratio, ignored for k-fold
+        :param test: Fraction of images used for testing
+        :param seed: Seed for breaking ties
+        :return: GERALDSplits
+        """
+        if k_folds is not None and k_folds < 2:
+            raise ValueError("k_folds has to be at least 2, got %d" % k_folds)
+
+        splits = cls([], [], k_folds=k_folds, split=split, test=test, seed=seed)
+        groups, counts, sizes = _group_counts(filenames, annotations)
+        group_folds = iterative_stratification(counts, sizes, splits.ratios(), seed=seed) - 1  # Ratio 0 is test
+        splits = cls(filenames, group_folds[groups], k_folds=k_folds, split=split, test=test, seed=seed)
+        splits.check_fractions()
+        return splits
+
+    def extend(self, filenames: List[str], annotations) -> "GERALDSplits":
+        """
+        Adds images that are not in the splits yet, all existing assignments stay unchanged. New frames of a known
+        video join the fold of that video, new videos are stratified into the folds so that these stay balanced.
+        :param filenames: Filenames (without extension) of the dataset, known ones are skipped
+        :param annotations: Annotation per filename
+        :return: GERALDSplits with the existing and the new filenames
+        """
+        known = set(self.filenames)
+        new = [i for i, fn in enumerate(filenames) if fn not in known]
+        if not new:
+            return self
+
+        video_folds = {}
+        for fn, fold in zip(self.filenames, self.folds.tolist()):
+            video_folds.setdefault(video_of(fn), fold)
+        new_folds = np.array([video_folds.get(video_of(filenames[i]), UNASSIGNED) for i in new], dtype=np.int64)
+
+        unassigned = [i for i, fold in zip(new, new_folds) if fold == UNASSIGNED]
+        if unassigned:
+            # Fill up the folds relative to the images of the dataset that are already assigned
+            n_folds = len(self.ratios())
+            assigned = [i for i, fn in enumerate(filenames) if fn in known]
+            assigned_folds = self.select([filenames[i] for i in assigned]).folds.astype(np.int64) + 1
+            matrix = stratification_matrix([annotations[i] for i in assigned])
+            base_counts = np.zeros((n_folds, matrix.shape[1]), dtype=np.int64)
+            np.add.at(base_counts, assigned_folds, matrix)
+            base_sizes = np.bincount(assigned_folds, minlength=n_folds)
+
+            groups, counts, sizes = _group_counts([filenames[i] for i in unassigned],
+                                                  [annotations[i] for i in unassigned])
+            group_folds = iterative_stratification(counts, sizes, self.ratios(), seed=self.seed,
+                                                   base_counts=base_counts, base_sizes=base_sizes) - 1
+            new_folds[new_folds == UNASSIGNED] = group_folds[groups]
+
+        return GERALDSplits(self.filenames + [filenames[i] for i in new],
+                            np.concatenate([self.folds, new_folds.astype(np.int8)]), **self.settings())
+
+    def select(self, filenames: List[str]) -> "GERALDSplits":
+        """
+        Splits of the given filenames in the given order, all of them have to be assigned
+        """
+        index = {fn: i for i, fn in enumerate(self.filenames)}
+        folds = self.folds[np.array([index[fn] for fn in filenames], dtype=np.int64)]
+        return GERALDSplits(filenames, folds, **self.settings())
+
+    def fractions(self) -> np.ndarray:
+        """
+        Realised fraction of images per fold, test first like ratios()
+        """
+        counts = np.bincount(self.folds.astype(np.int64) + 1, minlength=len(self.ratios()))
+        return counts / max(1, len(self.folds))
+
+    def check_fractions(self, tolerance=0.05):
+        """
+        Logs a warning if a fold is empty or its fraction of images is further than tolerance from its target, e.g.
+        because there are few videos with many frames each
+        """
+        fractions, ratios = self.fractions(), np.array(self.ratios())
+        if np.any(np.abs(fractions - ratios) > tolerance) or np.any((fractions == 0) & (ratios > 0)):
+            logging.warning("Split fractions %s differ from the targets %s (test first)" %
+                            (np.round(fractions, 3).tolist(), np.round(ratios, 3).tolist()))
+
+    def ratios(self) -> List[float]:
+        """
+        Fraction of images per fold as used for the stratification, test first
+        """
+        fold_ratios = [1 / self.k_folds] * self.k_folds if self.k_folds else [self.split, 1 - self.split]
+        return [self.test] + [(1 - self.test) * r for r in fold_ratios]
+
+    def settings(self):
+        return {"k_folds": self.k_folds, "split": self.split, "test": self.test, "seed": self.seed}
+
+    def mask(self, subset: str, fold=0) -> np.ndarray:
+        """
+        Boolean mask over the filenames
+        :param subset: "train", "val" or "test"
+        :param fold: Validation fold for k-fold cross-validation
+        :return: bool ndarray
+        """
+        if subset == "test":
+            return self.folds == TEST
+        if self.k_folds is None:
+            val = self.folds == 1
+        else:
+            if not 0 <= fold < self.k_folds:
+                raise ValueError("Fold %d is invalid for %d folds!" % (fold, self.k_folds))
+            val = self.folds == fold
+        if subset == "val":
+            return val
+        if subset == "train":
+            return (self.folds != TEST) & ~val
+        raise ValueError("Subset " + subset + " is invalid!")
+
+    def save(self, path: str):
+        """
+        Writes the splits as compressed index file (filenames and one int8 per image)
+        """
+        tmp = path + ".tmp.npz"  # Written next to the target and renamed, concurrent jobs never see partial files
+        np.savez_compressed(tmp, filenames=np.array(self.filenames), folds=self.folds,
+                            settings=np.array(json.dumps(self.settings())))
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str) -> "GERALDSplits":
+        with np.load(path, allow_pickle=False) as data:
+            settings = json.loads(str(data["settings"]))
+            return cls(data["filenames"].tolist(), data["folds"], **settings)
+
+
+def load_or_compute_splits(path: Optional[str], filenames: List[str], annotations, k_folds: Optional[int] = None,
+                           split=0.8, test=0.1, seed=331297, base: Optional[GERALDSplits] = None) -> GERALDSplits:
+    """
+    Loads splits from an index file, or computes and saves them if the file is missing. Images that are not in the
+    stored splits are added with GERALDSplits.extend, existing assignments are never changed. The file only grows,
+    entries of images that were removed from the dataset are kept.
+    :param path: Index file (.npz), splits are only kept in memory if None
+    :param filenames: Filenames (without extension) of the dataset
+    :param annotations: Annotation per filename
+    :param base: Splits used instead of the file if there is none, e.g. the splits before a refresh
+    :return: GERALDSplits of the given filenames in the given order
+    """
+    settings = {"k_folds": k_folds, "split": split, "test": test, "seed": seed}
+    stored = base
+    if path is not None and os.path.exists(path):
+        stored = GERALDSplits.load(path)
+        if stored.settings() != settings:
+            raise ValueError("Splits in %s were computed with %s, not %s. Remove the file or use another split file "
+                             "to compute new splits." % (path, stored.settings(), settings))
+
+    if stored is None or stored.settings() != settings:
+        splits = GERALDSplits.compute(filenames, annotations, **settings)
+    else:
+        splits = stored.extend(filenames, annotations)
+        if splits is not stored:
+            logging.info("Added %d new images to the splits, existing assignments are unchanged" %
+                         (len(splits.filenames) - len(stored.filenames)))
+            splits.check_fractions()
+
+    if path is not None and (splits is not stored or not os.path.exists(path)):
+        splits.save(path)
+    return splits.select(filenames)
+
+
+def _group_counts(filenames: List[str], annotations):
+    """
+    Video group of every image, label presence counts and number of images per group
+    """
+    _, groups = np.unique([video_of(fn) for fn in filenames], return_inverse=True)
+    groups = groups.reshape(-1)
+    n_groups = int(groups.max()) + 1 if len(groups) else 0
+
+    matrix = stratification_matrix(annotations)
+    counts = np.zeros((n_groups, matrix.shape[1]), dtype=np.int64)
+    np.add.at(counts, groups, matrix)
+    sizes = np.bincount(groups, minlength=n_groups)
+    return groups, counts, sizes
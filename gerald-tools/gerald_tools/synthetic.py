@@ -0,0 +1,91 @@
+import json
+import os
+
+import numpy as np
+from cv2 import cv2
+
+from .utils import GERALDLabels, WeatherCondition, LightCondition
+from .voc import OBJECT_TEMPLATE, XML_TEMPLATE
+
+
+def write_sample(path: str, stem: str, objects, size=(64, 48), weather="Sunny", light="Daylight", im=None,
+                 infos=None):
+    """
+    Writes one image, its VOC XML and its info.json entry in the GERALD directory layout
+    :param path: Dataset directory containing JPEGImages/ and Annotations/
+    :param stem: Filename without extension
+    :param objects: List of (name, difficult, xmin, ymin, xmax, ymax)
+    :param size: Image size (w, h)
+    :param weather: Name of a WeatherCondition
+    :param light: Name of a LightCondition
+    :param im: Image (BGR), a flat gray image is used if None
+    :param infos: If given, the info.json entry is added to this dict instead of updating the info.json on disk
+    """
+    w, h = size
+    if im is None:
+        im = np.full((h, w, 3), 127, dtype=np.uint8)
+    cv2.imencode(".jpg", im)[1].tofile(os.path.join(path, "JPEGImages", stem + ".jpg"))
+
+    objs = "".join(OBJECT_TEMPLATE.format(name=o[0], difficult=o[1], xmin=o[2], ymin=o[3], xmax=o[4], ymax=o[5])
+                   for o in objects)
+    with open(os.path.join(path, "Annotations", stem + ".xml"), 'w') as fp:
+        fp.write(XML_TEMPLATE.format(filename=stem + ".jpg", width=w, height=h, objects=objs))
+
+    entry = {"weather": weather, "light": light, "author": "Tf on Tour",
+             "author url": "", "source url": "", "pHash": "8000000000000000"}
+
+    if infos is not None:
+        infos[stem + ".jpg"] = entry
+        return
+
+    info_path = os.path.join(path, "info.json")
+    infos = {}
+    if os.path.exists(info_path):
+        with open(info_path, 'r') as fp:
+            infos = json.load(fp)
+    infos[stem + ".jpg"] = entry
+    with open(info_path, 'w') as fp:
+        json.dump(infos, fp)
+
+
+def make_synthetic_gerald(path: str, n_images=200, size=(1920, 1080), objects_per_image=7, seed=0):
+    """
+    Generates a dataset with the GERALD layout (JPEGImages/, Annotations/, info.json) for benchmarks and tests
+    :param path: Output directory
+    :param n_images: Number of images
+    :param size: Image size (w, h)
+    :param objects_per_image: Mean number of objects per image
+    :param seed: Seed for images, boxes and conditions
+    :return: path
+    """
+    rng = np.random.default_rng(seed)
+    os.makedirs(os.path.join(path, "JPEGImages"), exist_ok=True)
+    os.makedirs(os.path.join(path, "Annotations"), exist_ok=True)
+
+    w, h = size
+    labels = [label.name for label in GERALDLabels]
+    weathers = [c.name for c in WeatherCondition]
+    lights = [c.name for c in LightCondition]
+
+    # Smooth background plus noise, compresses roughly like a real frame
+    base = cv2.resize(rng.integers(0, 255, (9, 16, 3), dtype=np.uint8), (w, h), interpolation=cv2.INTER_CUBIC)
+
+    infos = {}
+    for i in range(n_images):
+        noise = rng.integers(-20, 20, (h, w, 3), dtype=np.int16)
+        im = np.clip(np.roll(base, i * 7, axis=1) + noise, 0, 255).astype(np.uint8)
+
+        objects = []
+        for _ in range(rng.poisson(objects_per_image)):
+            bw, bh = int(rng.integers(4, max(5, w // 20))), int(rng.integers(8, max(9, h // 8)))  # Tall, thin signals
+            x, y = int(rng.integers(0, w - bw)), int(rng.integers(0, h - bh))
+            objects.append((labels[rng.integers(len(labels))], int(rng.integers(2)), x, y, x + bw, y + bh))
+
+        write_sample(path, "synthetic_%02d=%.2f" % (i % 10, i * 0.5), objects, size=size,
+                     weather=weathers[rng.integers(len(weathers))], light=lights[rng.integers(1, len(lights))],
+                     im=im, infos=infos)
+
+    with open(os.path.join(path, "info.json"), 'w') as fp:
+        json.dump(infos, fp)
+
+    return path
@@ -1,3 +1,28 @@
+import importlib
+
 from .tools import *
 from .labels import *
-from .transforms import *
\ No newline at end of file
+from .label_map import LabelMap
+
+_LAZY = {"transforms": ".transforms",
+         "ToTensor": ".transforms",
+         "Rescale": ".transforms",
+         "Rotate": ".transforms",
+         "Flip": ".transforms",
+         "GaussianNoise": ".transforms",
+         "ColorJitter": ".transforms",
+         "CenterCrop": ".transforms",
+         "RandomCrop": ".transforms"}
+
+
+def __getattr__(name):
+    if name not in _LAZY:
+        raise AttributeError("module %r has no attribute %r" % (__name__, name))
+    module = importlib.import_module(_LAZY[name], __name__)
+    value = module if module.__name__.endswith("." + name) else getattr(module, name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY))
@@ -0,0 +1,216 @@
+import numpy as np
+
+
+def _is_numpy(boxes):
+    return isinstance(boxes, np.ndarray)
+
+
+def _copy(boxes, inplace):
+    if inplace:
+        return boxes
+    return boxes.copy() if _is_numpy(boxes) else boxes.clone()
+
+
+def _round_(v):
+    if _is_numpy(v):
+        np.round(v, out=v)
+    else:
+        v.round_()
+
+
+def _floor_(v):
+    if _is_numpy(v):
+        np.floor(v, out=v)
+    else:
+        v.floor_()
+
+
+def _clamp_(v, lo, hi):
+    if _is_numpy(v):
+        np.clip(v, lo, hi, out=v)
+    else:
+        v.clamp_(lo, hi)
+
+
+def cxcywh_to_xyxy(boxes, inplace=False):
+    """
+    Converts (x_c, y_c, w, h) to (x_min, y_min, x_max, y_max). Like all functions in this module it works on torch
+    tensors and numpy arrays of Nx6 or BxNx6 targets, only the first four columns are changed.
+    :param boxes: ...x4 or more columns
+    :param inplace: Modify boxes instead of a copy
+    :return: Converted boxes
+    """
+    out = _copy(boxes, inplace)
+    out[..., 0:2] -= out[..., 2:4] / 2
+    out[..., 2:4] += out[..., 0:2]
+    return out
+
+
+def xyxy_to_cxcywh(boxes, inplace=False, round_center=False, floor_size=False):
+    """
+    Converts (x_min, y_min, x_max, y_max) to (x_c, y_c, w, h)
+    :param boxes: ...x4 or more columns
+    :param inplace: Modify boxes instead of a copy
+    :param round_center: Round the center to integer pixels
+    :param floor_size: Round width and height down to integer pixels
+    :return: Converted boxes
+    """
+    out = _copy(boxes, inplace)
+    out[..., 2:4] -= out[..., 0:2]
+    out[..., 0:2] += out[..., 2:4] / 2
+    if round_center:
+        _round_(out[..., 0:2])
+    if floor_size:
+        _floor_(out[..., 2:4])
+    return out
+
+
+def scale(boxes, sx: float, sy: float, inplace=False):
+    """
+    Scales boxes by positive factors, valid for both box formats
+    :param boxes: ...x4 or more columns
+    :param sx: Factor in x direction
+    :param sy: Factor in y direction
+    :param inplace: Modify boxes instead of a copy
+    :return: Scaled boxes
+    """
+    out = _copy(boxes, inplace)
+    out[..., 0:4:2] *= sx
+    out[..., 1:4:2] *= sy
+    return out
+
+
+def affine(boxes, matrix=((1, 0), (0, 1)), offset=(0, 0), inplace=False, round_center=False):
+    """
+    Maps (x_c, y_c, w, h) boxes with an axis aligned affine transformation, i.e. scaling, flipping, rotation by
+    multiples of 90 degrees and translation. The center is mapped to matrix @ center + offset, width and height by
+    the absolute values of the matrix.
+    :param boxes: ...x4 or more columns
+    :param matrix: 2x2 matrix with one non-zero entry per row
+    :param offset: Translation (x, y) applied after the matrix
+    :param inplace: Modify boxes instead of a copy
+    :param round_center: Round the mapped center before the offset is added
+    :return: Mapped boxes
+    """
+    (a, b), (c, d) = matrix
+    if a * b != 0 or c * d != 0:
+        raise ValueError("Matrix %s is not axis aligned" % str(matrix))
+
+    out = _copy(boxes, inplace)
+    if b != 0:  # Axes are swapped, only the x columns need a copy if the boxes are modified in place
+        x = _copy(out[..., 0:4:2], False) if inplace else boxes[..., 0:4:2]
+        out[..., 0:4:2] = out[..., 1:4:2]
+        out[..., 1:4:2] = x
+        sx, sy = b, c
+    else:
+        sx, sy = a, d
+    out[..., 0] *= sx
+    out[..., 1] *= sy
+    out[..., 2] *= abs(sx)
+    out[..., 3] *= abs(sy)
+
+    if round_center:
+        _round_(out[..., 0:2])
+    out[..., 0] += offset[0]
+    out[..., 1] += offset[1]
+    return out
+
+
+def translate(boxes, dx: float, dy: float, inplace=False):
+    """
+    Moves (x_c, y_c, w, h) boxes, e.g. into the coordinates of a crop at (-dx, -dy)
+    """
+    return affine(boxes, offset=(dx, dy), inplace=inplace)
+
+
+def clip(boxes, x_min: float, y_min: float, x_max: float, y_max: float, inplace=False):
+    """
+    Clips (x_min, y_min, x_max, y_max) boxes to a window
+    :param boxes: ...x4 or more columns
+    :param inplace: Modify boxes instead of a copy
+    :return: Clipped boxes
+    """
+    out = _copy(boxes, inplace)
+    _clamp_(out[..., 0:4:2], x_min, x_max)
+    _clamp_(out[..., 1:4:2], y_min, y_max)
+    return out
+
+
+def min_size_mask(boxes, min_w=0.0, min_h=0.0, xyxy=True):
+    """
+    Boxes that are larger than the given size
+    :param boxes: ...x4 or more columns
+    :param min_w: Boxes have to be wider than this
+    :param min_h: Boxes have to be higher than this
+    :param xyxy: Format of the boxes, (x_c, y_c, w, h) if False
+    :return: Boolean mask of shape boxes.shape[:-1]
+    """
+    if xyxy:
+        return ((boxes[..., 2] - boxes[..., 0]) > min_w) & ((boxes[..., 3] - boxes[..., 1]) > min_h)
+    return (boxes[..., 2] > min_w) & (boxes[..., 3] > min_h)
+
+
+def _clipped_extent(center, size, offset: float, lo: float, hi: float):
+    """
+    Extent along one axis of boxes moved by offset and clipped to [lo, hi], computed like crop does on the boxes
+    """
+    start = center + offset
+    start -= size / 2
+    end = start + size
+    _clamp_(start, lo, hi)
+    _clamp_(end, lo, hi)
+    return end - start
+
+
+def crop(boxes, left: float, top: float, width: float, height: float, tol=0.0):
+    """
+    Moves (x_c, y_c, w, h) boxes into a crop window, clips them to the window shrunk by tol and drops boxes that
+    end up empty. Centers are rounded and sizes rounded down to integer pixels.
+    :param boxes: Nx4 or more columns
+    :param left: x of the upper left corner of the window
+    :param top: y of the upper left corner of the window
+    :param width: Width of the window
+    :param height: Height of the window
+    :param tol: Tolerance between box borders and window borders
+    :return: Boxes inside the window
+    """
+    keep = (_clipped_extent(boxes[..., 0], boxes[..., 2], -left, tol, width - tol) > 0) & \
+           (_clipped_extent(boxes[..., 1], boxes[..., 3], -top, tol, height - tol) > 0)
+    out = translate(boxes[keep], -left, -top, inplace=True)  # The kept rows are the only copy of the boxes
+    cxcywh_to_xyxy(out, inplace=True)
+    clip(out, tol, tol, width - tol, height - tol, inplace=True)
+    return xyxy_to_cxcywh(out, inplace=True, round_center=True, floor_size=True)
+
+
+def box_iou(boxes1, boxes2):
+    """
+    Pairwise intersection over union of (x_min, y_min, x_max, y_max) boxes
+    :param boxes1: ...xNx4 or more columns
+    :param boxes2: ...xMx4 or more columns
+    :return: ...xNxM IoU
+    """
+    a, b = boxes1[..., :, None, :4], boxes2[..., None, :, :4]
+    if _is_numpy(a):
+        lo, hi = np.maximum(a[..., :2], b[..., :2]), np.minimum(a[..., 2:], b[..., 2:])
+        inter = np.clip(hi - lo, 0, None).prod(-1)
+    else:
+        lo, hi = a[..., :2].maximum(b[..., :2]), a[..., 2:].minimum(b[..., 2:])
+        inter = (hi - lo).clamp(min=0).prod(-1)
+    area1 = (a[..., 2] - a[..., 0]) * (a[..., 3] - a[..., 1])
+    area2 = (b[..., 2] - b[..., 0]) * (b[..., 3] - b[..., 1])
+    return inter / (area1 + area2 - inter)
+
+
+def wh_iou(wh1, wh2):
+    """
+    Pairwise IoU of boxes given by width and height only, as if they shared the same center (e.g. boxes and anchors)
+    :param wh1: ...xNx2
+    :param wh2: ...xMx2
+    :return: ...xNxM IoU
+    """
+    a, b = wh1[..., :, None, :2], wh2[..., None, :, :2]
+    if _is_numpy(a):
+        inter = np.minimum(a[..., 0], b[..., 0]) * np.minimum(a[..., 1], b[..., 1])
+    else:
+        inter = a[..., 0].minimum(b[..., 0]) * a[..., 1].minimum(b[..., 1])
+    return inter / (a[..., 0] * a[..., 1] + b[..., 0] * b[..., 1] - inter)
@@ -0,0 +1,58 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, List, Sequence
+
+
+def file_fingerprint(*paths) -> List:
+    """
+    Cheap change detection for source files
+    :param paths: Files to fingerprint
+    :return: List with modification time (ns) and size of every file, None for missing files
+    """
+    fingerprint = []
+    for p in paths:
+        try:
+            st = os.stat(p)
+            fingerprint += [st.st_mtime_ns, st.st_size]
+        except FileNotFoundError:
+            fingerprint += [None, None]
+    return fingerprint
+
+
+def image_phash(im):
+    """
+    Perceptual hash of a BGR image as stored in info.json (str() gives the hex string)
+    :param im: Image as returned by cv2.imread
+    :return: imagehash.ImageHash
+    """
+    from cv2 import cv2
+    from imagehash import phash  # Pulls in PIL and scipy
+    from PIL import Image
+
+    return phash(Image.fromarray(cv2.cvtColor(im, cv2.COLOR_BGR2RGB)))
+
+
+def n_processes(n_workers=None) -> int:
+    """
+    Number of processes for the n_workers argument of the tools (0 for serial, None for all cpus)
+    """
+    return 1 if n_workers == 0 else (n_workers or os.cpu_count() or 1)
+
+
+def map_jobs(fn: Callable, jobs: Sequence, n_workers=None) -> List:
+    """
+    Applies fn to every job, in a process pool unless n_workers is 0 or there is only a single job. fn has to be
+    defined at module level so that it can be pickled.
+    :param fn: Function called with a single job
+    :param jobs: Arguments of fn
+    :param n_workers: Number of processes (0 for serial, None for all cpus)
+    :return: Results in the order of the jobs
+    """
+    jobs = list(jobs)
+    if n_workers == 0 or len(jobs) <= 1:
+        return [fn(job) for job in jobs]
+
+    n_procs = min(n_processes(n_workers), len(jobs))
+    chunksize = max(1, len(jobs) // (4 * n_procs))
+    with ProcessPoolExecutor(max_workers=n_procs) as executor:
+        return list(executor.map(fn, jobs, chunksize=chunksize))
@@ -0,0 +1,132 @@
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from .labels import GERALDLabels, LABEL_GROUPS
+
+IGNORE = -1  # Target is kept with this label, e.g. as "don't care" region for the loss
+DROP = -2  # Target is removed
+
+IRRELEVANT = ("keep", "ignore", "drop")
+
+
+def _resolve(sources: Sequence[str]) -> List[GERALDLabels]:
+    """
+    Expands label and group names (see LABEL_GROUPS) to labels
+    """
+    labels = []
+    for source in sources:
+        if isinstance(source, GERALDLabels):
+            labels.append(source)
+        elif source in LABEL_GROUPS:
+            labels += LABEL_GROUPS[source]
+        elif source in GERALDLabels.__members__:
+            labels.append(GERALDLabels[source])
+        else:
+            raise ValueError("Label " + str(source) + " is invalid!")
+    return labels
+
+
+def _names(sources: Sequence) -> List[str]:
+    return [source.name if isinstance(source, GERALDLabels) else source for source in sources]
+
+
+class LabelMap:
+    def __init__(self, mapping: Optional[Dict[str, Sequence[str]]] = None, drop: Sequence[str] = (),
+                 ignore: Sequence[str] = (), keep_unmapped=True, irrelevant="keep"):
+        """
+        Maps GERALDLabels to the classes a model is trained on. The mapping is compiled into a lookup table indexed
+        by (relevant flag, label value), so applying it to targets is a single vectorized gather.
+        :param mapping: Output class name -> labels, label or group names (see LABEL_GROUPS) merged into that class
+        :param drop: Label and group names whose targets are removed
+        :param ignore: Label and group names whose targets get the label IGNORE
+        :param keep_unmapped: Labels not mentioned anywhere keep a class of their own, otherwise they are dropped
+        :param irrelevant: "keep", "ignore" or "drop" targets that are not relevant for the train
+        """
+        if irrelevant not in IRRELEVANT:
+            raise ValueError("Handling " + irrelevant + " of irrelevant targets is invalid!")
+
+        # Stored as names, so that to_dict() is JSON serializable
+        self.mapping = {name: _names(sources) for name, sources in (mapping or {}).items()}
+        self.drop = _names(drop)
+        self.ignore = _names(ignore)
+        self.keep_unmapped = keep_unmapped
+        self.irrelevant = irrelevant
+
+        lut = np.full(len(GERALDLabels), DROP, dtype=np.int64)
+        assigned = np.zeros(len(GERALDLabels), dtype=bool)
+        self.names: List[str] = []
+
+        for label in _resolve(self.drop):
+            lut[label.value], assigned[label.value] = DROP, True
+        for label in _resolve(self.ignore):
+            lut[label.value], assigned[label.value] = IGNORE, True
+
+        for name, sources in self.mapping.items():
+            labels = [label for label in _resolve(sources) if not assigned[label.value]]
+            if not labels:
+                continue
+            lut[[label.value for label in labels]] = len(self.names)
+            self.names.append(name)
+            assigned[[label.value for label in labels]] = True
+
+        if keep_unmapped:
+            for label in GERALDLabels:
+                if not assigned[label.value]:
+                    lut[label.value] = len(self.names)
+                    self.names.append(label.name)
+
+        irrelevant_lut = {"keep": lut, "ignore": np.where(lut == DROP, DROP, IGNORE),
+                          "drop": np.full_like(lut, DROP)}[irrelevant]
+        self.lut = np.stack([irrelevant_lut, lut])  # Row 0 for irrelevant, row 1 for relevant targets
+
+    @classmethod
+    def identity(cls) -> "LabelMap":
+        return cls()
+
+    @classmethod
+    def groups(cls, **kwargs) -> "LabelMap":
+        """
+        One class per group of LABEL_GROUPS
+        """
+        return cls({name: [name] for name in LABEL_GROUPS}, **kwargs)
+
+    @property
+    def n_classes(self):
+        return len(self.names)
+
+    def __call__(self, labels, relevant=None) -> np.ndarray:
+        """
+        Maps label values to class ids, IGNORE or DROP
+        :param labels: Array of GERALDLabels values
+        :param relevant: Array of relevant flags, all relevant if None
+        :return: int64 ndarray
+        """
+        labels = np.asarray(labels, dtype=np.int64)
+        if relevant is None:
+            return self.lut[1][labels]
+        return self.lut[np.asarray(relevant, dtype=bool).astype(np.int64), labels]
+
+    def apply(self, targets: np.ndarray, relevant=None) -> np.ndarray:
+        """
+        Remaps column 4 of nx6 targets and removes dropped targets
+        :param targets: nx6 ndarray (x_c, y_c, w, h, label, sample index)
+        :param relevant: Relevant flag per target, all relevant if None
+        :return: Remapped targets
+        """
+        classes = self(targets[:, 4], relevant)
+        keep = classes != DROP
+        out = targets[keep]
+        out[:, 4] = classes[keep]
+        return out
+
+    def to_dict(self) -> Dict:
+        return {"mapping": self.mapping, "drop": self.drop, "ignore": self.ignore,
+                "keep_unmapped": self.keep_unmapped, "irrelevant": self.irrelevant}
+
+    @classmethod
+    def from_dict(cls, config: Dict) -> "LabelMap":
+        return cls(**config)
+
+    def __repr__(self):
+        return "LabelMap | %d classes, irrelevant: %s" % (self.n_classes, self.irrelevant)
@@ -93,3 +93,19 @@ class WeatherCondition(OrderedEnum):
     Rainy = 3
     Snowy = 4
     Foggy = 5
+
+
+# Groups of GERALDLabels, in the order of the comments above
+LABEL_GROUPS = {"main": [GERALDLabels(v) for v in range(0, 11)],
+                "mast": [GERALDLabels(v) for v in range(11, 14)],
+                "electrical": [GERALDLabels.El_6],
+                "secondary": [GERALDLabels(v) for v in range(15, 27)],
+                "low_speed": [GERALDLabels(v) for v in range(27, 31)],
+                "shunting": [GERALDLabels.Ra_10],
+                "protection": [GERALDLabels(v) for v in range(32, 35)],
+                "assignment": [GERALDLabels(v) for v in range(35, 37)],
+                "switch": [GERALDLabels(v) for v in range(37, 39)],
+                "additional": [GERALDLabels(v) for v in range(39, 45)],
+                "other_signals": [GERALDLabels(v) for v in range(45, 48)],
+                "platform": [GERALDLabels(v) for v in range(48, 55)],
+                "other": [GERALDLabels(v) for v in range(55, 62)]}
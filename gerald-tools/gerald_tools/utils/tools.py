@@ -1,9 +1,8 @@
 from typing import List
 
 import numpy as np
-import matplotlib.patches as patches
-import matplotlib.pyplot as plt
 
+from . import box_ops
 from .labels import WeatherCondition, LightCondition, GERALDLabels
 
 
@@ -91,12 +90,8 @@ class BoundingBox:
 
         scale_w, scale_h = new_size[0] / self.src_width, new_size[1] / self.src_height
 
-        self.x_min = int(round(self.x_min * scale_w, 0))
-        self.y_min = int(round(self.y_min * scale_h, 0))
-        self.x_max = int(round(self.x_max * scale_w, 0))
-        self.y_max = int(round(self.y_max * scale_h, 0))
-
-        self.coords = np.array([self.x_min, self.y_min, self.x_max, self.y_max])
+        self.coords = np.round(box_ops.scale(self.coords.astype(np.float64), scale_w, scale_h)).astype(np.int64)
+        self.x_min, self.y_min, self.x_max, self.y_max = self.coords.tolist()
         self.x_c = int(round((self.x_max + self.x_min) / 2, 0))
         self.y_c = int(round((self.y_max + self.y_min) / 2, 0))
         self.w = self.x_max - self.x_min
@@ -188,6 +183,9 @@ class GroundTruthObject(BoundingBox):
 
 
 def plot_targets_over_im(im, targets):
+    import matplotlib.patches as patches  # Imported here to keep GUI backends out of headless processes
+    import matplotlib.pyplot as plt
+
     fig, ax = plt.subplots()
 
     ax.imshow(im, interpolation='nearest')
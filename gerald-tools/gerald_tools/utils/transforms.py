@@ -1,6 +1,3 @@
-import math
-from math import radians
-
 import numpy as np
 import torch
 import torch.nn.functional as F
@@ -9,6 +6,8 @@ from PIL import Image
 from cv2 import cv2
 from numpy.random.mtrand import random_integers
 
+from . import box_ops
+
 
 class ToTensor(object):
     """Convert ndarrays from given sample to Tensors."""
@@ -35,6 +34,8 @@ class Rescale(object):
         output_size (tuple or int): Desired output size. If tuple, output is
             matched to output_size. If int, smaller of image edges is matched
             to output_size keeping aspect ratio the same.
+        is_tensor (bool): If True, the sample is a whole batch from collate_fn
+            (B x C x H x W tensor and the targets of all images).
     """
 
     def __init__(self, output_size, is_tensor=False):
@@ -63,18 +64,13 @@ class Rescale(object):
 
         # Resize image and bounding boxes
         if self.is_tensor:
-            new_im = F.interpolate(im, size=self.output_size[::-1])
+            new_im = F.interpolate(im, size=(new_h, new_w))
         else:
             new_im = cv2.resize(im, (new_w, new_h))
 
-        new_targets = torch.zeros(targets.shape, dtype=torch.float)
-
-        new_targets[:, 0] = (targets[:, 0] * new_w / w).round()
-        new_targets[:, 1] = (targets[:, 1] * new_h / h).round()
-        new_targets[:, 2] = torch.clamp((targets[:, 2] * new_w / w), 1, new_w)  # Make sure width/height or never 0
-        new_targets[:, 3] = torch.clamp((targets[:, 3] * new_h / h), 1, new_h)
-        new_targets[:, 4:] = targets[:, 4:]
-        new_targets[:, 5:] = targets[:, 5:]
+        new_targets = box_ops.affine(targets.float(), matrix=((new_w / w, 0), (0, new_h / h)), round_center=True)
+        new_targets[..., 2].clamp_(1, new_w)  # Make sure width/height or never 0
+        new_targets[..., 3].clamp_(1, new_h)
 
         del im, targets, sample
 
@@ -82,95 +78,66 @@ class Rescale(object):
 
 
 class Rotate(object):
-    def __init__(self, angle=0):
+    def __init__(self, angle=0, is_tensor=False):
+        """
+        Counterclockwise rotation by a multiple of 90 degrees
+        :param angle: 0, 90, 180 or 270
+        :param is_tensor: If True, the sample is a whole batch from collate_fn (B x C x H x W tensor)
+        """
         assert angle in (0, 90, 180, 270), "Angle has to be 0, 90, 180, 270"
         self.angle = angle
+        self.is_tensor = is_tensor
 
     def __call__(self, sample):
         im, targets, idx = sample
-        new_targets = torch.zeros(targets.shape, dtype=torch.float)
 
         if self.angle == 0:  # 0 degrees rotation
             return sample
-        elif self.angle == 90:  # 90 degrees rotation
-            new_im = np.rot90(im, k=1)
-            h, w = new_im.shape[:2]
-
-            new_targets[:, 0:2] = self.rotate_points(targets[:, 0:2], angle=radians(-90), round_output=True)
-            new_targets[:, 1] += h
-
-            new_targets[:, 2] = targets[:, 3]
-            new_targets[:, 3] = targets[:, 2]
-        elif self.angle == 180:  # 180 degrees rotation
-            new_im = np.rot90(im, k=2)
-            h, w = new_im.shape[:2]
 
-            new_targets[:, 0:2] = self.rotate_points(targets[:, 0:2], angle=radians(-180), round_output=True)
-            new_targets[:, 0] += w
-            new_targets[:, 1] += h
-
-            new_targets[:, 2] = targets[:, 2]
-            new_targets[:, 3] = targets[:, 3]
-        elif self.angle == 270:  # 270 degrees rotation / or -90
-            new_im = np.rot90(im, k=3)
-            h, w = new_im.shape[:2]
-
-            new_targets[:, 0:2] = self.rotate_points(targets[:, 0:2], angle=radians(-270), round_output=True)
-            new_targets[:, 0] += w
-
-            new_targets[:, 2] = targets[:, 3]
-            new_targets[:, 3] = targets[:, 2]
+        # Counterclockwise rotation of the image, the y axis points down
+        if self.is_tensor:
+            new_im = torch.rot90(im, k=self.angle // 90, dims=(2, 3))
+            h, w = new_im.shape[2:]
         else:
-            raise ValueError("Rotation should be 0, 90, 180, or 270 degrees")
+            new_im = np.rot90(im, k=self.angle // 90)
+            h, w = new_im.shape[:2]
+        if self.angle == 90:
+            matrix, offset = ((0, 1), (-1, 0)), (0, h)
+        elif self.angle == 180:
+            matrix, offset = ((-1, 0), (0, -1)), (w, h)
+        else:  # 270 degrees rotation / or -90
+            matrix, offset = ((0, -1), (1, 0)), (w, 0)
 
-        new_targets[:, 4:] = targets[:, 4:]
-        new_targets[:, 5:] = targets[:, 5:]
+        new_targets = box_ops.affine(targets.float(), matrix=matrix, offset=offset, round_center=True)
 
         del im, targets, sample
         return new_im, new_targets, idx
 
-    @staticmethod
-    def rotate_points(points: torch.Tensor, angle=0.0, round_output=False):
-        """
-        Rotates a tensor of x,y coordinates with given angle
-        :param points: Nx2 Tensor
-        :param angle: Rotation angle
-        :param round_output: If True rounds output to int
-        :return: Nx2 Tensor with rotated points
-        """
-        rot_tensor = torch.tensor([[math.cos(angle), -math.sin(angle)],
-                                   [math.sin(angle), math.cos(angle)]], dtype=torch.float)
-        rot_points = rot_tensor @ points.t()
-        if round_output:
-            return rot_points.t().round()
-        else:
-            return rot_points.t()
-
 
 class Flip(object):
-    def __init__(self, kind="ud"):
+    def __init__(self, kind="ud", is_tensor=False):
+        """
+        Mirrors the image and its targets
+        :param kind: "ud" (up-down) or "lr" (left-right)
+        :param is_tensor: If True, the sample is a whole batch from collate_fn (B x C x H x W tensor)
+        """
         assert kind in ("ud", "lr"), "Kind has to be ud (up-down) or lr (left-right)"
         self.kind = kind
+        self.is_tensor = is_tensor
 
     def __call__(self, sample):
         im, targets, idx = sample
-        new_targets = torch.zeros(targets.shape, dtype=torch.float)
 
-        h, w = im.shape[:2]
+        h, w = im.shape[2:] if self.is_tensor else im.shape[:2]
         if self.kind == "ud":
-            new_im = np.flipud(im)
-            new_targets[:, 0] = targets[:, 0]
-            new_targets[:, 1] = h - targets[:, 1]
-
+            new_im = torch.flip(im, dims=(2,)) if self.is_tensor else np.flipud(im)
+            new_targets = box_ops.affine(targets.float(), matrix=((1, 0), (0, -1)), offset=(0, h))
         elif self.kind == "lr":
-            new_im = np.fliplr(im)
-            new_targets[:, 0] = w - targets[:, 0]
-            new_targets[:, 1] = targets[:, 1]
+            new_im = torch.flip(im, dims=(3,)) if self.is_tensor else np.fliplr(im)
+            new_targets = box_ops.affine(targets.float(), matrix=((-1, 0), (0, 1)), offset=(w, 0))
         else:
             raise ValueError("Flip has to be of kind up-down or left-right")
 
-        new_targets[:, 2:] = targets[:, 2:]
-
         del im, targets
 
         return new_im, new_targets, idx
@@ -186,7 +153,7 @@ class GaussianNoise(object):
 
         if type(im) == np.ndarray:
             new_im = im + np.random.random_sample(im.shape) * self.std + self.mean
-        elif type(im) == torch.tensor:
+        elif torch.is_tensor(im):  # Single images or whole batches
             new_im = im + torch.randn(im.size()) * self.std + self.mean
         else:
             raise ValueError("Type %s not supported for adding gaussian noise" % str(type(im)))
@@ -196,7 +163,7 @@ class GaussianNoise(object):
 
 class ColorJitter(object):
     """
-    Applies random color jitter to image
+    Applies random color jitter to a single HxWxC image (not batches, the jitter goes through PIL)
     """
 
     def __init__(self, **kwargs):
@@ -250,43 +217,18 @@ class CenterCrop(object):
             new_im = im[y_c - int(self.size[1] / 2): y_c + int(self.size[1] / 2),
                      x_c - int(self.size[0] / 2): x_c + int(self.size[0] / 2)]
 
-        crop_targets = torch.zeros(targets.shape, dtype=torch.float)
-        crop_targets[:, 0] = targets[:, 0] - int((w - self.size[0]) / 2)
-        crop_targets[:, 1] = targets[:, 1] - int((h - self.size[1]) / 2)
-        crop_targets[:, 2:] = targets[:, 2:]
-
         # Remove targets outside image
-        xyxy_targets = torch.zeros(targets.shape, dtype=torch.float)
-        xyxy_targets[:, 0] = crop_targets[:, 0] - crop_targets[:, 2] / 2
-        xyxy_targets[:, 1] = crop_targets[:, 1] - crop_targets[:, 3] / 2
-        xyxy_targets[:, 2] = crop_targets[:, 0] + crop_targets[:, 2] / 2
-        xyxy_targets[:, 3] = crop_targets[:, 1] + crop_targets[:, 3] / 2
-
-        xyxy_targets[:, 0] = torch.clamp(xyxy_targets[:, 0], self.tol, self.size[0] - self.tol)
-        xyxy_targets[:, 1] = torch.clamp(xyxy_targets[:, 1], self.tol, self.size[1] - self.tol)
-        xyxy_targets[:, 2] = torch.clamp(xyxy_targets[:, 2], self.tol, self.size[0] - self.tol)
-        xyxy_targets[:, 3] = torch.clamp(xyxy_targets[:, 3], self.tol, self.size[1] - self.tol)
-
-        xyxy_targets[:, 4:] = crop_targets[:, 4:]
+        new_targets = box_ops.crop(targets.float(), int((w - self.size[0]) / 2), int((h - self.size[1]) / 2),
+                                   self.size[0], self.size[1], tol=self.tol)
 
-        xyxy_targets = xyxy_targets[xyxy_targets[:, 0] != xyxy_targets[:, 2]]
-        xyxy_targets = xyxy_targets[xyxy_targets[:, 1] != xyxy_targets[:, 3]]
-
-        new_targets = torch.zeros(xyxy_targets.shape, dtype=torch.float)  # Back to xc, yc, w, h
-        new_targets[:, 0] = torch.round((xyxy_targets[:, 0] + xyxy_targets[:, 2]) / 2)
-        new_targets[:, 1] = torch.round((xyxy_targets[:, 1] + xyxy_targets[:, 3]) / 2)
-        new_targets[:, 2] = torch.floor(xyxy_targets[:, 2] - xyxy_targets[:, 0])
-        new_targets[:, 3] = torch.floor(xyxy_targets[:, 3] - xyxy_targets[:, 1])
-        new_targets[:, 4:] = xyxy_targets[:, 4:]
-
-        del im, targets, crop_targets, xyxy_targets, sample
+        del im, targets, sample
 
         return new_im, new_targets, idx
 
 
 class RandomCrop(object):
     """
-    Takes a random crop of the image
+    Takes a random crop of a single HxWxC image (not batches, every image needs its own crop with targets in it)
     """
 
     def __init__(self, min_size=(300, 100), max_size=(1000, 600), tol=2):
@@ -333,38 +275,12 @@ class RandomCrop(object):
 
             new_im = im[top: top + self.size[1], left: left + self.size[0]]
 
-            crop_targets = torch.zeros(targets.shape, dtype=torch.float)
-            crop_targets[:, 0] = targets[:, 0] - left
-            crop_targets[:, 1] = targets[:, 1] - top
-            crop_targets[:, 2:] = targets[:, 2:]
-
             # Remove targets outside image
-            xyxy_targets = torch.zeros(targets.shape, dtype=torch.float)
-            xyxy_targets[:, 0] = crop_targets[:, 0] - crop_targets[:, 2] / 2
-            xyxy_targets[:, 1] = crop_targets[:, 1] - crop_targets[:, 3] / 2
-            xyxy_targets[:, 2] = crop_targets[:, 0] + crop_targets[:, 2] / 2
-            xyxy_targets[:, 3] = crop_targets[:, 1] + crop_targets[:, 3] / 2
-
-            xyxy_targets[:, 0] = torch.clamp(xyxy_targets[:, 0], self.tol, self.size[0] - self.tol)
-            xyxy_targets[:, 1] = torch.clamp(xyxy_targets[:, 1], self.tol, self.size[1] - self.tol)
-            xyxy_targets[:, 2] = torch.clamp(xyxy_targets[:, 2], self.tol, self.size[0] - self.tol)
-            xyxy_targets[:, 3] = torch.clamp(xyxy_targets[:, 3], self.tol, self.size[1] - self.tol)
-
-            xyxy_targets[:, 4:] = crop_targets[:, 4:]
-
-            xyxy_targets = xyxy_targets[xyxy_targets[:, 0] != xyxy_targets[:, 2]]
-            xyxy_targets = xyxy_targets[xyxy_targets[:, 1] != xyxy_targets[:, 3]]
-
-            new_targets = torch.zeros(xyxy_targets.shape, dtype=torch.float)  # Back to xc, yc, w, h
-            new_targets[:, 0] = torch.round((xyxy_targets[:, 0] + xyxy_targets[:, 2]) / 2)
-            new_targets[:, 1] = torch.round((xyxy_targets[:, 1] + xyxy_targets[:, 3]) / 2)
-            new_targets[:, 2] = torch.floor(xyxy_targets[:, 2] - xyxy_targets[:, 0])
-            new_targets[:, 3] = torch.floor(xyxy_targets[:, 3] - xyxy_targets[:, 1])
-            new_targets[:, 4:] = xyxy_targets[:, 4:]
+            new_targets = box_ops.crop(targets.float(), left, top, self.size[0], self.size[1], tol=self.tol)
 
             if len(new_targets) > 0:
                 break
 
-        del im, targets, crop_targets, xyxy_targets, sample
+        del im, targets, sample
 
         return new_im, new_targets, idx
@@ -0,0 +1,234 @@
+import argparse
+import json
+import logging
+import os
+import sys
+import xml.etree.ElementTree as ET
+from typing import Dict, Optional
+
+import numpy as np
+from cv2 import cv2
+
+from .utils import GERALDLabels, WeatherCondition, LightCondition
+from .utils.files import file_fingerprint, image_phash, map_jobs
+from .voc import read_voc_xml
+
+CACHE_NAME = ".validation_cache.json"
+
+# Checks per image, in the order they are reported
+ISSUES = ("missing_image", "missing_annotation", "invalid_jpeg", "truncated_jpeg", "undecodable_image", "invalid_xml",
+          "filename_mismatch", "size_mismatch", "unknown_label", "empty_box", "box_out_of_frame", "missing_info",
+          "invalid_info", "stale_phash")
+
+
+def _check_jpeg(data: np.ndarray):
+    """
+    Checks the JPEG markers without decoding
+    :return: Issue code or None
+    """
+    if len(data) < 4 or data[0] != 0xFF or data[1] != 0xD8:  # Start of image
+        return "invalid_jpeg"
+    end = len(data)
+    while end > 2 and data[end - 1] == 0:  # Some writers pad the file
+        end -= 1
+    if data[end - 2] != 0xFF or data[end - 1] != 0xD9:  # End of image
+        return "truncated_jpeg"
+    return None
+
+
+def _validate_file(job):
+    """
+    Runs all checks of one image
+    :param job: Tuple of filename (without extension), image path, XML path, info.json entry (or None), whether to
+        recompute the pHash and the allowed pHash distance
+    :return: Filename, list of [issue code, message]
+    """
+    stem, im_path, xml_path, entry, check_hash, hash_tolerance = job
+    issues = []
+
+    record = None
+    if not os.path.exists(xml_path):
+        issues.append(["missing_annotation", "No XML file"])
+    else:
+        try:
+            record = read_voc_xml(xml_path)
+        except (ET.ParseError, IndexError, TypeError, ValueError) as e:
+            issues.append(["invalid_xml", "%s: %s" % (type(e).__name__, e)])
+
+    im = None
+    if not os.path.exists(im_path):
+        issues.append(["missing_image", "No JPEG file"])
+    else:
+        data = np.fromfile(im_path, dtype=np.uint8)
+        marker_issue = _check_jpeg(data)
+        if marker_issue is not None:
+            issues.append([marker_issue, "Missing %s marker" % ("start" if marker_issue == "invalid_jpeg" else "end")])
+        if marker_issue != "invalid_jpeg":
+            im = cv2.imdecode(data, cv2.IMREAD_COLOR)
+            if im is None:
+                issues.append(["undecodable_image", "OpenCV could not decode the image"])
+
+    if record is not None:
+        if record.filename != stem + ".jpg":
+            issues.append(["filename_mismatch", "XML references %s" % record.filename])
+
+        width, height = record.width, record.height
+        if im is not None and (im.shape[1], im.shape[0]) != (width, height):
+            issues.append(["size_mismatch", "XML size %dx%d, image size %dx%d" % (width, height, im.shape[1],
+                                                                                   im.shape[0])])
+            width, height = im.shape[1], im.shape[0]
+
+        unknown = sorted({name for name in record.names if name not in GERALDLabels.__members__})
+        if unknown:
+            issues.append(["unknown_label", ", ".join(str(name) for name in unknown)])
+
+        boxes = record.boxes
+        empty = (boxes[:, 2] <= boxes[:, 0]) | (boxes[:, 3] <= boxes[:, 1])
+        if empty.any():
+            issues.append(["empty_box", "Objects %s" % np.flatnonzero(empty).tolist()])
+        outside = (boxes[:, 0] < 0) | (boxes[:, 1] < 0) | (boxes[:, 2] > width) | (boxes[:, 3] > height)
+        if outside.any():
+            issues.append(["box_out_of_frame", "Objects %s" % np.flatnonzero(outside).tolist()])
+
+    if entry is None:
+        issues.append(["missing_info", "No info.json entry"])
+    else:
+        invalid = [key for key, enum in (("weather", WeatherCondition), ("light", LightCondition))
+                   if entry.get(key) not in enum.__members__]
+        stored_hash = None
+        try:
+            from imagehash import hex_to_hash
+            stored_hash = hex_to_hash(entry["pHash"])
+        except (KeyError, TypeError, ValueError):
+            invalid.append("pHash")
+        if invalid:
+            issues.append(["invalid_info", "Invalid %s" % ", ".join(invalid)])
+
+        if check_hash and stored_hash is not None and im is not None:
+            current = image_phash(im)
+            if current - stored_hash > hash_tolerance:
+                issues.append(["stale_phash", "Stored %s, image %s" % (stored_hash, current)])
+
+    return stem, issues
+
+
+class GERALDValidator:
+    def __init__(self, path: str, cache_path: Optional[str] = None, n_workers=None, check_hash=True,
+                 hash_tolerance=2):
+        """
+        Checks all files of a GERALD dataset directory for problems that would otherwise show up during training
+        :param path: Path to the GERALD dataset
+        :param cache_path: JSON file with the results of the last run, <path>/.validation_cache.json if None
+        :param n_workers: Number of processes (0 for serial, None for all cpus)
+        :param check_hash: Recompute the pHash of images and compare it with info.json
+        :param hash_tolerance: Maximum Hamming distance between stored and recomputed pHash
+        """
+        self.path = path
+        self.im_path = os.path.join(path, "JPEGImages")
+        self.an_path = os.path.join(path, "Annotations")
+        self.info_path = os.path.join(path, "info.json")
+        self.cache_path = cache_path if cache_path is not None else os.path.join(path, CACHE_NAME)
+        self.n_workers = n_workers
+        self.check_hash = check_hash
+        self.hash_tolerance = hash_tolerance
+
+    def validate(self, use_cache=True) -> Dict:
+        """
+        Validates every image, files whose image, XML and info.json entry did not change since the last run are
+        taken from the cache
+        :param use_cache: If False, all files are checked again
+        :return: Dict with the number of files, validated and cached files, issues per filename, issue counts and
+            dataset level problems
+        """
+        stems = sorted({os.path.splitext(fn)[0] for fn in os.listdir(self.im_path) if fn.endswith(".jpg")} |
+                       {os.path.splitext(fn)[0] for fn in os.listdir(self.an_path) if fn.endswith(".xml")})
+
+        problems = []
+        infos = {}
+        try:
+            with open(self.info_path, 'r') as fp:
+                infos = json.load(fp)
+        except (OSError, ValueError) as e:
+            problems.append("info.json could not be read: %s" % e)
+        orphans = sorted(set(infos) - {stem + ".jpg" for stem in stems})
+        if orphans:
+            problems.append("info.json has %d entries without image" % len(orphans))
+
+        settings = {"check_hash": self.check_hash, "hash_tolerance": self.hash_tolerance}
+        cache = self._load_cache() if use_cache else None
+        if cache is None or cache["settings"] != settings:
+            cache = {"settings": settings, "files": {}}
+
+        fingerprints, jobs, results = {}, [], {}
+        for stem in stems:
+            im, xml = os.path.join(self.im_path, stem + ".jpg"), os.path.join(self.an_path, stem + ".xml")
+            entry = infos.get(stem + ".jpg")
+            fingerprints[stem] = file_fingerprint(im, xml) + [json.dumps(entry, sort_keys=True)]
+            cached = cache["files"].get(stem)
+            if cached is not None and cached["fingerprint"] == fingerprints[stem]:
+                results[stem] = cached["issues"]
+            else:
+                jobs.append((stem, im, xml, entry, self.check_hash, self.hash_tolerance))
+
+        logging.info("Validating %d of %d files (%d cached)" % (len(jobs), len(stems), len(stems) - len(jobs)))
+        for stem, issues in map_jobs(_validate_file, jobs, self.n_workers):
+            results[stem] = issues
+
+        self._write_cache({"settings": settings,
+                           "files": {stem: {"fingerprint": fingerprints[stem], "issues": results[stem]}
+                                     for stem in stems}})
+
+        counts = {code: 0 for code in ISSUES}
+        for issues in results.values():
+            for code, _ in issues:
+                counts[code] += 1
+
+        return {"files": len(stems),
+                "validated": len(jobs),
+                "cached": len(stems) - len(jobs),
+                "issues": {stem: results[stem] for stem in stems if results[stem]},
+                "counts": {code: n for code, n in counts.items() if n},
+                "problems": problems}
+
+    def _load_cache(self):
+        if not os.path.exists(self.cache_path):
+            return None
+        try:
+            with open(self.cache_path, 'r') as fp:
+                return json.load(fp)
+        except ValueError:
+            logging.warning("Ignoring invalid validation cache %s" % self.cache_path)
+            return None
+
+    def _write_cache(self, cache):
+        tmp = self.cache_path + ".tmp"
+        try:
+            with open(tmp, 'w') as fp:
+                json.dump(cache, fp)
+            os.replace(tmp, self.cache_path)
+        except OSError as e:
+            logging.warning("Could not write validation cache %s: %s" % (self.cache_path, e))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Checks a GERALD dataset for broken or inconsistent files")
+    parser.add_argument("-p", "--path", type=str, required=True, help="Path to GERALD dataset")
+    parser.add_argument("-o", "--out", type=str, default=None, help="Output JSON report")
+    parser.add_argument("-w", "--workers", type=int, default=None, help="Number of processes")
+    parser.add_argument("--no-hash", action="store_true", help="Do not recompute pHashes")
+    parser.add_argument("--no-cache", action="store_true", help="Validate all files again")
+    args = parser.parse_args(argv)
+
+    report = GERALDValidator(args.path, n_workers=args.workers, check_hash=not args.no_hash).validate(
+        use_cache=not args.no_cache)
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, 'w') as fp:
+            fp.write(text)
+    else:
+        print(text)
+    return 1 if report["issues"] or report["problems"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,225 @@
+import argparse
+import json
+import logging
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Sequence
+
+from cv2 import cv2
+
+from .annotations import get_annotation_registry
+from .utils.files import image_phash, map_jobs
+from .voc import XML_TEMPLATE, read_voc_xml
+
+VIDEO_EXTENSIONS = (".mp4", ".mkv", ".webm", ".avi", ".mov")
+STUB_INFO = {"weather": "Unknown", "light": "Unknown", "author": "", "author url": "", "source url": ""}
+
+
+def frame_stem(video: str, src_time: float, time_format="%.2f") -> str:
+    """
+    Filename (without extension) of a frame, inverse of the src_time parsing of annotations
+    """
+    return video + "=" + time_format % src_time
+
+
+def find_videos(video_dir: str, names: Optional[Sequence[str]] = None) -> Dict[str, str]:
+    """
+    Local video files by name (filename without extension)
+    :param video_dir: Directory searched recursively
+    :param names: If given, only these videos
+    :return: Dict video name -> path
+    """
+    videos = {}
+    for root, _, files in os.walk(video_dir):
+        for fn in sorted(files):
+            name, ext = os.path.splitext(fn)
+            if ext.lower() in VIDEO_EXTENSIONS and (names is None or name in names):
+                videos.setdefault(name, os.path.join(root, fn))
+    return videos
+
+
+def frame_times(path: str, offsets: Sequence[float] = (0.0,)) -> Dict[str, List[float]]:
+    """
+    Times to extract around every annotated frame of a dataset
+    :param path: Path to the GERALD dataset
+    :param offsets: Offsets in seconds relative to the src_time of every frame, 0 re-extracts the frame itself
+    :return: Dict video name -> sorted times
+    """
+    registry = get_annotation_registry(path)
+    registry.refresh()
+    times = {}
+    for fn in registry.filenames:
+        if "=" not in fn:
+            continue
+        video = fn.split("=")[0]
+        src_time = registry[fn].src_time
+        times.setdefault(video, set()).update(max(0.0, src_time + offset) for offset in offsets)
+    return {video: sorted(ts) for video, ts in times.items()}
+
+
+def _decode(video_path: str, frames: List[int], out: queue.Queue):
+    """
+    Single forward pass over the video, frames that are not requested are only grabbed (no color conversion)
+    """
+    cap = cv2.VideoCapture(video_path)
+    try:
+        position = 0
+        for frame in frames:
+            while position < frame:
+                if not cap.grab():
+                    return
+                position += 1
+            ok, im = cap.read()
+            position += 1
+            if not ok:
+                return
+            out.put((frame, im))
+    finally:
+        cap.release()
+        out.put(None)
+
+
+def extract_frames(video_path: str, times: Sequence[float], out_path: str, video: Optional[str] = None,
+                   quality=95, overwrite=False, n_threads=4, time_format="%.2f") -> Dict[str, Dict]:
+    """
+    Extracts frames of one video at the given times into the GERALD layout. Existing annotations are kept, frames
+    without one get a stub XML without objects.
+    :param video_path: Path to the video
+    :param times: Times in seconds
+    :param out_path: GERALD dataset directory (JPEGImages/, Annotations/)
+    :param video: Video name used in the filenames, the video filename if None
+    :param quality: JPEG quality
+    :param overwrite: Replace existing images, e.g. to re-extract at a higher quality
+    :param n_threads: Threads encoding and writing frames while the video is decoded
+    :param time_format: Format of src_time in the filenames
+    :return: Dict image filename -> info.json fields of the written frame (pHash)
+    """
+    video = video if video is not None else os.path.splitext(os.path.basename(video_path))[0]
+    im_dir, an_dir = os.path.join(out_path, "JPEGImages"), os.path.join(out_path, "Annotations")
+    os.makedirs(im_dir, exist_ok=True)
+    os.makedirs(an_dir, exist_ok=True)
+
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise IOError("Could not open video %s" % video_path)
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    cap.release()
+    if not fps > 0:
+        raise IOError("Video %s has no frame rate" % video_path)
+
+    # Frame index per requested time (constant frame rate), several times can fall onto the same frame
+    stems_of = {}
+    for t in times:
+        stem = frame_stem(video, t, time_format)
+        if overwrite or not os.path.exists(os.path.join(im_dir, stem + ".jpg")):
+            stems_of.setdefault(int(round(t * fps)), []).append(stem)
+    frames = sorted(stems_of)
+
+    def write(stem, im):
+        cv2.imencode(".jpg", im, [cv2.IMWRITE_JPEG_QUALITY, quality])[1].tofile(os.path.join(im_dir, stem + ".jpg"))
+        entry = {"pHash": str(image_phash(im))}
+        xml_path = os.path.join(an_dir, stem + ".xml")
+        if not os.path.exists(xml_path):
+            with open(xml_path, 'w') as fp:
+                fp.write(XML_TEMPLATE.format(filename=stem + ".jpg", width=im.shape[1], height=im.shape[0],
+                                             objects=""))
+        elif read_voc_xml(xml_path).width != im.shape[1]:
+            logging.warning("Frame %s has a different size than its annotation" % stem)
+        return stem + ".jpg", entry
+
+    decoded = queue.Queue(maxsize=2 * n_threads)  # Bounded, decoding never runs far ahead of writing
+    decoder = threading.Thread(target=_decode, args=(video_path, frames, decoded), daemon=True)
+    decoder.start()
+
+    futures = []
+    with ThreadPoolExecutor(max_workers=n_threads) as executor:
+        while True:
+            item = decoded.get()
+            if item is None:
+                break
+            frame, im = item
+            futures += [executor.submit(write, stem, im) for stem in stems_of[frame]]
+    decoder.join()
+
+    entries = dict(f.result() for f in futures)
+    if len(entries) < sum(len(stems) for stems in stems_of.values()):
+        logging.warning("Video %s ended before all requested frames" % video)
+    return entries
+
+
+def _extract_job(job):
+    video_path, times, out_path, video, quality, overwrite, time_format = job
+    return video, extract_frames(video_path, times, out_path, video=video, quality=quality, overwrite=overwrite,
+                                 time_format=time_format)
+
+
+def extract_videos(videos: Dict[str, str], times: Dict[str, Sequence[float]], out_path: str, quality=95,
+                   overwrite=False, n_workers=None, time_format="%.2f") -> Dict[str, int]:
+    """
+    Extracts frames of several videos in parallel and updates the info.json of the dataset once at the end. New
+    frames inherit weather, light and source information from other frames of the same video.
+    :param videos: Dict video name -> video path, e.g. from find_videos
+    :param times: Dict video name -> times in seconds, e.g. from frame_times
+    :param out_path: GERALD dataset directory
+    :param quality: JPEG quality
+    :param overwrite: Replace existing images
+    :param n_workers: Number of processes (0 for serial, None for all cpus)
+    :param time_format: Format of src_time in the filenames
+    :return: Dict video name -> number of written frames
+    """
+    missing = sorted(set(times) - set(videos))
+    if missing:
+        logging.warning("No local copy of %d videos: %s" % (len(missing), ", ".join(missing)))
+
+    jobs = [(videos[v], times[v], out_path, v, quality, overwrite, time_format) for v in sorted(times) if v in videos]
+    results = map_jobs(_extract_job, jobs, n_workers)
+
+    info_path = os.path.join(out_path, "info.json")
+    infos = {}
+    if os.path.exists(info_path):
+        with open(info_path, 'r') as fp:
+            infos = json.load(fp)
+
+    by_video = {}
+    for name, entry in infos.items():
+        by_video.setdefault(name.split("=")[0], entry)
+
+    for video, entries in results:
+        template = {key: value for key, value in by_video.get(video, {}).items() if key in STUB_INFO}
+        for name, entry in entries.items():
+            merged = dict(infos.get(name, {}))
+            if name not in infos:
+                merged.update(STUB_INFO)
+                merged.update(template)
+            merged["pHash"] = entry["pHash"]
+            infos[name] = merged
+
+    tmp = info_path + ".tmp"
+    with open(tmp, 'w') as fp:
+        json.dump(infos, fp)
+    os.replace(tmp, info_path)
+
+    return {video: len(entries) for video, entries in results}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Extracts frames of local source videos into a GERALD dataset")
+    parser.add_argument("-p", "--path", type=str, required=True, help="Path to GERALD dataset")
+    parser.add_argument("-v", "--videos", type=str, required=True, help="Directory with the source videos")
+    parser.add_argument("--offsets", type=float, nargs="+", default=[0.0],
+                        help="Offsets in seconds around every annotated frame, 0 re-extracts the frame")
+    parser.add_argument("-q", "--quality", type=int, default=95, help="JPEG quality")
+    parser.add_argument("--overwrite", action="store_true", help="Replace existing images")
+    parser.add_argument("-w", "--workers", type=int, default=None, help="Number of processes")
+    args = parser.parse_args(argv)
+
+    times = frame_times(args.path, args.offsets)
+    counts = extract_videos(find_videos(args.videos, names=set(times)), times, args.path, quality=args.quality,
+                            overwrite=args.overwrite, n_workers=args.workers)
+    print(json.dumps(counts, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,252 @@
+import re
+import xml.etree.ElementTree as ET
+from typing import List, Optional
+
+import numpy as np
+
+_XML_DECL = re.compile(rb"^\s*<\?xml[^>]*\?>")
+_UTF8_DECL = re.compile(rb"encoding\s*=\s*[\"'](utf-?8|ascii)[\"']", re.I)
+_OBJECT = re.compile(rb"<object(?:\s[^>]*)?>(.*?)</object\s*>", re.S)
+_UNSUPPORTED = re.compile(rb"<!|&|/>|<part")  # Comments/CDATA, entities, empty tags, nested parts
+
+# Element order as written by LabelImg and VoTT, other layouts are handled by the generic scanner
+_FIXED_OBJECT = re.compile(rb"<object>\s*<name>([^<]*)</name>\s*(?:<\w+>[^<]*</\w+>\s*)*?<difficult>([^<]*)</difficult>\s*"
+                           rb"<bndbox>\s*<xmin>([^<]*)</xmin>\s*<ymin>([^<]*)</ymin>\s*"
+                           rb"<xmax>([^<]*)</xmax>\s*<ymax>([^<]*)</ymax>\s*</bndbox>\s*</object>")
+_FIXED_LEAF = {tag: re.compile(rb"<" + tag + rb">([^<]*)</" + tag + rb">") for tag in (b"filename", b"weather", b"light")}
+_FIXED_SIZE = re.compile(rb"<size>\s*<width>([^<]*)</width>\s*<height>([^<]*)</height>\s*"
+                         rb"<depth>([^<]*)</depth>\s*</size>")
+
+# Layout of the GERALD XML files, used to write stub and synthetic annotations
+XML_TEMPLATE = """<annotation>
+	<folder>JPEGImages</folder>
+	<filename>{filename}</filename>
+	<size>
+		<width>{width}</width>
+		<height>{height}</height>
+		<depth>3</depth>
+	</size>
+	<segmented>0</segmented>
+{objects}</annotation>
+"""
+
+OBJECT_TEMPLATE = """	<object>
+		<name>{name}</name>
+		<pose>Unspecified</pose>
+		<truncated>0</truncated>
+		<difficult>{difficult}</difficult>
+		<bndbox>
+			<xmin>{xmin}</xmin>
+			<ymin>{ymin}</ymin>
+			<xmax>{xmax}</xmax>
+			<ymax>{ymax}</ymax>
+		</bndbox>
+	</object>
+"""
+
+_TAGS = {}
+
+
+def _tag(name: bytes):
+    if name not in _TAGS:
+        _TAGS[name] = re.compile(rb"<" + name + rb"(?:\s[^>]*)?>(.*?)</" + name + rb"\s*>", re.S)
+    return _TAGS[name]
+
+
+def _find(name: bytes, data: bytes) -> Optional[bytes]:
+    """
+    Content of the first element with the given tag, None if there is none
+    """
+    m = _tag(name).search(data)
+    return m.group(1) if m else None
+
+
+def _text(raw: Optional[bytes]) -> Optional[str]:
+    """
+    Decodes element content like ElementTree does (empty elements have None as text)
+    """
+    return raw.replace(b"\r\n", b"\n").decode("utf-8") if raw else None
+
+
+class VOCRecord:
+    def __init__(self, filename: str, width: int, height: int, depth: int, weather: Optional[str],
+                 light: Optional[str], names: List[str], difficult: np.ndarray, boxes: np.ndarray):
+        """
+        Columnar content of a Pascal VOC annotation, restricted to the fields GERALD uses
+        :param filename: Text of <filename>
+        :param width: <size/width>
+        :param height: <size/height>
+        :param depth: <size/depth>
+        :param weather: Text of the optional <weather> element
+        :param light: Text of the optional <light> element
+        :param names: Object names
+        :param difficult: n ndarray with the difficult (relevance) flag of the objects
+        :param boxes: nx4 float ndarray with xmin, ymin, xmax, ymax of the objects as written in the file
+        """
+        self.filename = filename
+        self.width = width
+        self.height = height
+        self.depth = depth
+        self.weather = weather
+        self.light = light
+        self.names = names
+        self.difficult = difficult
+        self.boxes = boxes
+
+    def __len__(self):
+        return len(self.names)
+
+    def __eq__(self, other):
+        return isinstance(other, VOCRecord) and \
+               (self.filename, self.width, self.height, self.depth, self.weather, self.light, self.names) == \
+               (other.filename, other.width, other.height, other.depth, other.weather, other.light, other.names) \
+               and np.array_equal(self.difficult, other.difficult) and np.array_equal(self.boxes, other.boxes)
+
+    def __repr__(self):
+        return "VOCRecord | %s, %d objects" % (self.filename, len(self))
+
+
+def scan_voc_xml(data: bytes) -> Optional[VOCRecord]:
+    """
+    Single pass byte-level scanner for the fixed VOC schema of GERALD. No element tree is built.
+    :param data: Content of the XML file
+    :return: VOCRecord or None if the file uses XML features the scanner does not handle
+    """
+    decl = _XML_DECL.match(data)
+    if decl:
+        if b"encoding" in decl.group(0) and not _UTF8_DECL.search(decl.group(0)):
+            return None
+        data = data[decl.end():]
+
+    if _UNSUPPORTED.search(data):
+        return None
+
+    record = _scan_fixed(data)
+    return record if record is not None else _scan_generic(data)
+
+
+def _scan_fixed(data: bytes) -> Optional[VOCRecord]:
+    """
+    Fast path for objects and size in the usual element order, one regex match per object
+    """
+    matches = list(_FIXED_OBJECT.finditer(data))
+    if len(matches) != data.count(b"<object"):
+        return None
+
+    if matches:
+        for prev, nxt in zip(matches, matches[1:]):  # Objects have to be contiguous children of the root
+            if data[prev.end():nxt.start()].strip():
+                return None
+        outer = data[:matches[0].start()] + data[matches[-1].end():]
+    else:
+        outer = data
+
+    filename, size = _FIXED_LEAF[b"filename"].search(outer), _FIXED_SIZE.search(outer)
+    if filename is None or size is None:
+        return None
+    weather, light = _FIXED_LEAF[b"weather"].search(outer), _FIXED_LEAF[b"light"].search(outer)
+    if (weather is None and b"<weather" in outer) or (light is None and b"<light" in outer):
+        return None
+
+    try:
+        fields = [m.groups() for m in matches]
+        return VOCRecord(filename=_text(filename.group(1)),
+                         width=int(size.group(1)),
+                         height=int(size.group(2)),
+                         depth=int(size.group(3)),
+                         weather=_text(weather.group(1)) if weather else None,
+                         light=_text(light.group(1)) if light else None,
+                         names=[_text(f[0]) for f in fields],
+                         difficult=np.array([int(f[1]) for f in fields], dtype=np.int64),
+                         boxes=np.array([[float(v) for v in f[2:]] for f in fields], dtype=np.float64).reshape((-1, 4)))
+    except (TypeError, ValueError):
+        return None
+
+
+def _scan_generic(data: bytes) -> Optional[VOCRecord]:
+    """
+    Tag by tag scan for objects whose elements are in a different order
+    """
+    objects = _OBJECT.findall(data)
+    if len(objects) != data.count(b"<object"):
+        return None
+    outer = _OBJECT.sub(b"", data) if objects else data
+
+    filename, size = _find(b"filename", outer), _find(b"size", outer)
+    if filename is None or size is None:
+        return None
+
+    weather, light = _find(b"weather", outer), _find(b"light", outer)
+
+    names, difficult, coords = [], [], []
+    try:
+        for obj in objects:
+            bndbox = _find(b"bndbox", obj)
+            names.append(_text(_find(b"name", obj)))
+            difficult.append(int(_find(b"difficult", obj)))
+            row = [_find(tag, bndbox) for tag in (b"xmin", b"ymin", b"xmax", b"ymax")]
+            if None in row:
+                return None
+            coords.append(row)
+
+        boxes = np.array(coords).astype(np.float64).reshape((-1, 4))
+
+        return VOCRecord(filename=_text(filename),
+                         width=int(_find(b"width", size)),
+                         height=int(_find(b"height", size)),
+                         depth=int(_find(b"depth", size)),
+                         weather=_text(weather),
+                         light=_text(light),
+                         names=names,
+                         difficult=np.array(difficult, dtype=np.int64),
+                         boxes=boxes)
+    except (TypeError, ValueError):  # Missing or malformed fields, let ElementTree report the error
+        return None
+
+
+def etree_voc_xml(data: bytes) -> VOCRecord:
+    """
+    Reference implementation based on ElementTree, used for files the scanner does not handle
+    :param data: Content of the XML file
+    :return: VOCRecord
+    """
+    root = ET.fromstring(data)
+
+    names, difficult, boxes = [], [], []
+    for obj in root.findall("./object"):
+        names.append(obj.findall("./name")[0].text)
+        difficult.append(int(obj.findall("./difficult")[0].text))
+        boxes.append([float(obj.findall("./bndbox/" + tag)[0].text) for tag in ("xmin", "ymin", "xmax", "ymax")])
+
+    weather = root.findall("./weather")
+    light = root.findall("./light")
+
+    return VOCRecord(filename=root.findall("./filename")[0].text,
+                     width=int(root.findall("./size/width")[0].text),
+                     height=int(root.findall("./size/height")[0].text),
+                     depth=int(root.findall("./size/depth")[0].text),
+                     weather=weather[0].text if weather else None,
+                     light=light[0].text if light else None,
+                     names=names,
+                     difficult=np.array(difficult, dtype=np.int64),
+                     boxes=np.array(boxes, dtype=np.float64).reshape((-1, 4)))
+
+
+def parse_voc_xml(data: bytes) -> VOCRecord:
+    """
+    Parses a GERALD VOC annotation, falls back to ElementTree for unusual files
+    :param data: Content of the XML file
+    :return: VOCRecord
+    """
+    record = scan_voc_xml(data)
+    return record if record is not None else etree_voc_xml(data)
+
+
+def read_voc_xml(path: str) -> VOCRecord:
+    """
+    Reads and parses a GERALD VOC annotation
+    :param path: Path to the XML file
+    :return: VOCRecord
+    """
+    with open(path, 'rb') as fp:
+        return parse_voc_xml(fp.read())
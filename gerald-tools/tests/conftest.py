@@ -0,0 +1,22 @@
+import os
+
+import pytest
+
+from gerald_tools.synthetic import make_synthetic_gerald, write_sample
+
+
+@pytest.fixture
+def synthetic_gerald(tmp_path):
+    os.makedirs(tmp_path / "JPEGImages")
+    os.makedirs(tmp_path / "Annotations")
+
+    write_sample(str(tmp_path), "clip_a=1.50", [("Hp_0_HV", 1, 10, 5, 14, 20), ("Ne_4", 0, 30, 10, 33, 12)])
+    write_sample(str(tmp_path), "clip_a=2.00", [("Ks_1", 1, 20.4, 4.6, 24, 19)], weather="Rainy")
+    write_sample(str(tmp_path), "clip_b=7.25", [], light="Dark", weather="Unknown")
+
+    return str(tmp_path)
+
+
+@pytest.fixture(scope="session")
+def synthetic_gerald_large(tmp_path_factory):
+    return make_synthetic_gerald(str(tmp_path_factory.mktemp("gerald")), n_images=20, size=(320, 180))
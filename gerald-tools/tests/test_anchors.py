@@ -0,0 +1,30 @@
+import numpy as np
+
+import gerald_tools
+from gerald_tools.anchors import best_possible_recall, box_table, kmeans_anchors, kmedoids_anchors
+
+
+def test_box_table_is_rescaled(synthetic_gerald):
+    gerald = gerald_tools.GERALDDataset(path=synthetic_gerald, shuffle=False)
+    wh = box_table(gerald.annotations, im_input_size=(32, 96))
+    assert wh.tolist() == [[2.0, 30.0], [1.5, 4.0], [2.0, 28.0]]
+
+
+def test_anchor_fits_recover_clusters():
+    rng = np.random.default_rng(0)
+    centers = np.array([[4., 20.], [10., 40.], [30., 60.]])
+    wh = np.concatenate([c * rng.uniform(0.9, 1.1, (500, 2)) for c in centers])
+
+    for anchors in (kmeans_anchors(wh, 3), kmeans_anchors(wh, 3, batch_size=256), kmedoids_anchors(wh, 3)):
+        assert anchors.shape == (3, 2)
+        np.testing.assert_allclose(anchors, centers, rtol=0.1)
+        stats = best_possible_recall(wh, anchors)
+        assert stats["bpr"] == 1.0 and stats["boxes_per_anchor"] == [500, 500, 500]
+
+
+def test_fit_anchors(synthetic_gerald_large):
+    gerald = gerald_tools.GERALDDataset(path=synthetic_gerald_large)
+    result = gerald_tools.fit_anchors(gerald.annotations, n_anchors=(2, 4), im_input_sizes=((160, 90), (320, 180)))
+    assert sorted(result) == ["160x90", "320x180"]
+    assert len(result["320x180"][4]["anchors"]) == 4
+    assert result["320x180"][4]["mean_iou"] >= result["320x180"][2]["mean_iou"]
@@ -0,0 +1,12 @@
+import json
+
+from gerald_tools.benchmark import run_benchmarks
+
+
+def test_run_benchmarks(synthetic_gerald_large):
+    report = run_benchmarks(path=synthetic_gerald_large, size=(320, 180), workers=(0, 2), batch_size=4, n_batches=2)
+
+    assert set(report["results"]) == {"init", "loader", "transforms", "collate"}
+    assert report["results"]["loader"]["2"]["samples"] == 8
+    assert report["results"]["transforms"]["Rescale"]["mean_ms"] > 0
+    json.dumps(report)
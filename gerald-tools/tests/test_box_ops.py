@@ -0,0 +1,62 @@
+import numpy as np
+import torch
+
+from gerald_tools.utils import box_ops
+from gerald_tools.utils.transforms import Flip, Rescale, Rotate
+
+
+def test_conversion_roundtrip_numpy_and_batched_torch():
+    targets = np.array([[10, 20, 4, 8, 3, 0], [50, 40, 10, 2, 7, 1]], dtype=np.float32)
+    xyxy = box_ops.cxcywh_to_xyxy(targets)
+    assert xyxy[:, :4].tolist() == [[8, 16, 12, 24], [45, 39, 55, 41]]
+    assert xyxy[:, 4:].tolist() == targets[:, 4:].tolist()
+    assert np.array_equal(box_ops.xyxy_to_cxcywh(xyxy), targets)
+
+    batch = torch.from_numpy(np.stack([targets, targets[::-1]]))
+    assert torch.equal(box_ops.xyxy_to_cxcywh(box_ops.cxcywh_to_xyxy(batch)), batch)
+    assert box_ops.min_size_mask(batch, min_h=4, xyxy=False).tolist() == [[True, False], [False, True]]
+
+
+def test_crop_and_iou():
+    targets = torch.tensor([[10., 10., 4., 4., 1., 0.], [100., 100., 4., 4., 2., 0.], [2., 30., 8., 6., 3., 0.]])
+    cropped = box_ops.crop(targets, 0, 5, 50, 50, tol=1)
+    assert cropped.tolist() == [[10., 5., 4., 4., 1., 0.], [4., 25., 5., 6., 3., 0.]]
+    assert targets[:, 0].tolist() == [10., 100., 2.]  # Only the kept rows are copied
+
+    batch = np.stack([targets.numpy()] * 2)
+    swapped = box_ops.affine(batch, ((0, 1), (-1, 0)), offset=(0, 60))
+    assert swapped[0, 0].tolist() == [10., 50., 4., 4., 1., 0.] and batch[0, 0, 1] == 10
+    assert box_ops.affine(batch, ((0, 1), (-1, 0)), offset=(0, 60), inplace=True) is batch
+    assert np.array_equal(batch, swapped)
+
+    a = np.array([[0, 0, 10, 10], [0, 0, 5, 5]], dtype=np.float64)
+    iou = box_ops.box_iou(a, a[:1])
+    assert iou.shape == (2, 1) and iou[:, 0].tolist() == [1.0, 0.25]
+    assert torch.allclose(box_ops.box_iou(torch.from_numpy(a)[None], torch.from_numpy(a)[None])[0],
+                          torch.from_numpy(box_ops.box_iou(a, a)))
+
+
+def test_transforms_on_box_ops():
+    im = np.zeros((40, 60, 3))
+    targets = torch.tensor([[10., 5., 4., 2., 1., 0.]])
+    assert Flip("lr")((im, targets, 0))[1].tolist() == [[50., 5., 4., 2., 1., 0.]]
+    assert Rotate(90)((im, targets, 0))[1].tolist() == [[5., 50., 2., 4., 1., 0.]]
+    rotated = Rotate(270)(Rotate(90)((im, targets, 0)))
+    assert torch.equal(rotated[1], targets) and targets.tolist() == [[10., 5., 4., 2., 1., 0.]]
+
+
+def test_transforms_on_collated_batches():
+    ims = np.random.default_rng(0).random((3, 40, 60, 3))
+    targets = torch.tensor([[10., 5., 4., 2., 1., 0.], [30., 20., 6., 8., 2., 2.]])
+    batch = torch.from_numpy(ims.transpose((0, 3, 1, 2)).copy())
+
+    for single, batched in ((Flip("ud"), Flip("ud", is_tensor=True)), (Flip("lr"), Flip("lr", is_tensor=True)),
+                            (Rotate(90), Rotate(90, is_tensor=True)), (Rotate(270), Rotate(270, is_tensor=True))):
+        out_im, out_targets, _ = batched((batch, targets, (0, 1, 2)))
+        for i in range(3):
+            im, t, _ = single((ims[i], targets[targets[:, 5] == i], i))
+            assert np.array_equal(out_im[i].numpy().transpose((1, 2, 0)), im)
+            assert torch.equal(out_targets[out_targets[:, 5] == i], t)
+
+    out_im, out_targets, _ = Rescale((30, 20), is_tensor=True)((batch, targets, (0, 1, 2)))
+    assert out_im.shape == (3, 3, 20, 30) and out_targets[1, :4].tolist() == [15., 10., 3., 4.]
@@ -1,5 +1,10 @@
+import multiprocessing
+
 import pytest as pytest
+from torch.utils.data import DataLoader
+
 import gerald_tools
+from gerald_tools.synthetic import write_sample
 
 
 @pytest.fixture
@@ -10,3 +15,26 @@ def gerald_path():
 def test_load_gerald(gerald_path):
     gerald = gerald_tools.GERALDDataset(path=gerald_path)
     assert len(gerald) == 5000
+
+
+def test_refresh(synthetic_gerald):
+    gerald = gerald_tools.GERALDDataset(path=synthetic_gerald, subset="rainy")
+    assert len(gerald) == 1
+
+    write_sample(synthetic_gerald, "clip_c=3.00", [("Vr_1", 0, 1, 1, 5, 9)], weather="Rainy")
+    changes = gerald.refresh()
+    assert changes["added"] == ["clip_c=3.00"]
+    assert len(gerald.filenames) == 4
+    assert sorted(gerald.subset_filenames) == ["clip_a=2.00", "clip_c=3.00"]
+
+    assert gerald.refresh() == {"added": [], "modified": [], "removed": []}
+
+    other = gerald_tools.GERALDDataset(path=synthetic_gerald, subset="all")
+    assert other.annotations[other.filenames.index("clip_c=3.00")].objects[0].label == gerald_tools.GERALDLabels.Vr_1
+
+
+def test_spawn_workers(synthetic_gerald):
+    gerald = gerald_tools.GERALDDataset(path=synthetic_gerald, random_augment=False, shuffle=False)
+    loader = DataLoader(gerald, batch_size=2, num_workers=2, collate_fn=gerald.collate_fn,
+                        multiprocessing_context=multiprocessing.get_context("spawn"))
+    assert sorted(i for _, _, idxs in loader for i in idxs) == list(range(len(gerald)))
@@ -0,0 +1,82 @@
+import json
+import os
+
+import numpy as np
+
+import gerald_tools
+
+
+def test_export_formats(synthetic_gerald, tmp_path):
+    gerald = gerald_tools.GERALDDataset(path=synthetic_gerald, shuffle=False)
+    out = str(tmp_path / "export")
+
+    stats = gerald_tools.GERALDExporter(gerald, out, image_size=(32, 24), n_workers=2).export()
+    assert stats == {"exported": 3, "changed": 3, "removed": 0}
+
+    with open(os.path.join(out, "yolo", "labels", "clip_a=1.50.txt")) as fp:
+        lines = fp.read().splitlines()
+    assert lines[0] == "1 0.187500 0.260417 0.062500 0.312500"
+    assert len(lines) == 2
+
+    with open(os.path.join(out, "coco", "annotations.json")) as fp:
+        coco = json.load(fp)
+    assert [im["file_name"] for im in coco["images"]] == ["clip_a=1.50.jpg", "clip_a=2.00.jpg", "clip_b=7.25.jpg"]
+    assert coco["annotations"][0]["bbox"] == [5.0, 2.5, 2.0, 7.5]
+
+    packed = np.load(os.path.join(out, "packed", "targets.npz"))
+    assert packed["offsets"].tolist() == [0, 2, 3, 3]
+    np.testing.assert_allclose(packed["targets"][0], [6, 6, 2, 7.5, 1, 0])
+
+    assert os.path.exists(os.path.join(out, "images", "clip_b=7.25.jpg"))
+
+
+def test_incremental_export(synthetic_gerald, tmp_path):
+    gerald = gerald_tools.GERALDDataset(path=synthetic_gerald, shuffle=False)
+    out = str(tmp_path / "export")
+    exporter = gerald_tools.GERALDExporter(gerald, out, n_workers=0)
+    exporter.export()
+
+    assert exporter.export()["changed"] == 0
+
+    xml = os.path.join(synthetic_gerald, "Annotations", "clip_a=2.00.xml")
+    st = os.stat(xml)
+    os.utime(xml, ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+    assert exporter.export()["changed"] == 1
+
+
+def test_incremental_export_writes_edited_annotations(synthetic_gerald, tmp_path):
+    gerald = gerald_tools.GERALDDataset(path=synthetic_gerald, shuffle=False)
+    out = str(tmp_path / "export")
+    gerald_tools.GERALDExporter(gerald, out, formats=("yolo", "coco"), n_workers=0).export()
+
+    xml = os.path.join(synthetic_gerald, "Annotations", "clip_a=2.00.xml")
+    with open(xml) as fp:
+        text = fp.read()
+    with open(xml, 'w') as fp:
+        fp.write(text.replace("<name>Ks_1</name>", "<name>Ne_4</name>"))
+    st = os.stat(xml)
+    os.utime(xml, ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+
+    stats = gerald_tools.GERALDExporter(gerald, out, formats=("yolo", "coco"), n_workers=0).export()
+    assert stats["changed"] == 1
+    with open(os.path.join(out, "yolo", "labels", "clip_a=2.00.txt")) as fp:
+        label = int(fp.read().split()[0])
+    assert gerald.label_map.names[label] == "Ne_4"
+
+    # A fresh dataset and exporter see the written state as up to date
+    fresh = gerald_tools.GERALDDataset(path=synthetic_gerald, shuffle=False)
+    assert gerald_tools.GERALDExporter(fresh, out, formats=("yolo", "coco"), n_workers=0).export()["changed"] == 0
+
+    info_path = os.path.join(synthetic_gerald, "info.json")
+    with open(info_path) as fp:
+        infos = json.load(fp)
+    infos["clip_b=7.25.jpg"]["weather"] = "Foggy"
+    with open(info_path, 'w') as fp:
+        json.dump(infos, fp)
+    st = os.stat(info_path)
+    os.utime(info_path, ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+
+    assert gerald_tools.GERALDExporter(fresh, out, formats=("yolo", "coco"), n_workers=0).export()["changed"] == 1
+    with open(os.path.join(out, "coco", "annotations.json")) as fp:
+        coco = json.load(fp)
+    assert coco["images"][2]["weather"] == "Foggy"
@@ -0,0 +1,17 @@
+import os
+
+from gerald_tools.utils.files import file_fingerprint, map_jobs
+
+
+def test_map_jobs_keeps_order():
+    jobs = list(range(23))
+    assert map_jobs(abs, jobs, n_workers=0) == map_jobs(abs, jobs, n_workers=3) == jobs
+    assert map_jobs(abs, [], n_workers=2) == []
+
+
+def test_file_fingerprint(tmp_path):
+    path = str(tmp_path / "a.txt")
+    with open(path, 'w') as fp:
+        fp.write("abc")
+    fingerprint = file_fingerprint(path, str(tmp_path / "missing.txt"))
+    assert fingerprint == [os.stat(path).st_mtime_ns, 3, None, None]
@@ -0,0 +1,31 @@
+import json
+import subprocess
+import sys
+
+HEAVY = ["torch", "torchvision", "cv2", "PIL", "matplotlib", "imagehash", "tqdm"]
+IMPORT_BUDGET_S = 1.5
+
+CORE = """
+import json, sys, time
+t0 = time.perf_counter()
+import gerald_tools
+from gerald_tools.annotations import get_annotation_registry
+gerald_tools.GERALDLabels, gerald_tools.Annotation
+elapsed = time.perf_counter() - t0
+print(json.dumps({"elapsed": elapsed, "loaded": [m for m in %r if m in sys.modules]}))
+""" % HEAVY
+
+
+def test_core_import_is_light():
+    result = json.loads(subprocess.check_output([sys.executable, "-c", CORE]))
+    assert result["loaded"] == []
+    assert result["elapsed"] < IMPORT_BUDGET_S
+
+
+def test_lazy_names():
+    import gerald_tools
+
+    assert gerald_tools.Flip is gerald_tools.utils.transforms.Flip
+    assert gerald_tools.GERALDDataset.__module__ == "gerald_tools.dataset"
+    assert "GERALDExporter" in dir(gerald_tools) and "Rotate" in dir(gerald_tools)
+    assert gerald_tools.transforms is gerald_tools.utils.transforms
@@ -0,0 +1,48 @@
+import json
+import os
+
+import numpy as np
+import pytest
+
+import gerald_tools
+from gerald_tools.utils import GERALDLabels, LABEL_GROUPS
+from gerald_tools.utils.label_map import DROP, IGNORE, LabelMap
+
+
+def test_lut():
+    label_map = LabelMap({"main": ["Hp_0", "Hp_0_HV", "Ks_1"], "ne": ["secondary"]}, drop=["Ne_4"], ignore=["other"],
+                         keep_unmapped=False, irrelevant="ignore")
+    assert label_map.names == ["main", "ne"]
+
+    labels = [GERALDLabels.Ks_1.value, GERALDLabels.Ne_1.value, GERALDLabels.Ne_4.value,
+              GERALDLabels.Traffic_Light.value, GERALDLabels.Zs_3.value, GERALDLabels.Hp_0.value]
+    assert label_map(labels, [1, 1, 1, 1, 1, 0]).tolist() == [0, 1, DROP, IGNORE, DROP, IGNORE]
+
+    assert LabelMap().names == [label.name for label in GERALDLabels]
+    assert LabelMap.groups().names == list(LABEL_GROUPS)
+    assert LabelMap.from_dict(json.loads(json.dumps(label_map.to_dict()))).lut.tolist() == label_map.lut.tolist()
+    with pytest.raises(ValueError):
+        LabelMap({"x": ["Hp_9"]})
+
+
+def test_enum_sources_round_trip_through_json():
+    label_map = LabelMap({"main": [GERALDLabels.Hp_0, "Ks_1"]}, drop=[GERALDLabels.Ne_4], ignore=[GERALDLabels.Zs_3])
+    assert label_map.to_dict()["mapping"] == {"main": ["Hp_0", "Ks_1"]}
+    restored = LabelMap.from_dict(json.loads(json.dumps(label_map.to_dict())))
+    assert restored.names == label_map.names and restored.lut.tolist() == label_map.lut.tolist()
+
+
+def test_dataset_and_export_use_label_map(synthetic_gerald, tmp_path):
+    label_map = LabelMap({"main": ["main"]}, keep_unmapped=False, irrelevant="drop")
+    gerald = gerald_tools.GERALDDataset(path=synthetic_gerald, shuffle=False, random_augment=False,
+                                        label_map=label_map)
+    assert gerald.n_classes == 1
+    assert gerald[0][1][:, 4].tolist() == [0.0]  # Hp_0_HV kept, irrelevant Ne_4 dropped
+    assert gerald.class_counts() == {"main": 2, "ignore": 0}
+
+    out = str(tmp_path / "export")
+    gerald_tools.GERALDExporter(gerald, out, formats=("yolo", "packed")).export()
+    with open(os.path.join(out, "yolo", "classes.txt")) as fp:
+        assert fp.read() == "main\n"
+    packed = np.load(os.path.join(out, "packed", "targets.npz"))
+    assert packed["offsets"].tolist() == [0, 1, 2, 2]
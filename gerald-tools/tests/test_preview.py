@@ -0,0 +1,37 @@
+import json
+import os
+
+import numpy as np
+from cv2 import cv2
+
+import gerald_tools
+from gerald_tools.preview import IRRELEVANT_COLOR, RELEVANT_COLOR, render_preview
+
+
+def test_previews_and_label_filter(synthetic_gerald, tmp_path):
+    gerald = gerald_tools.GERALDDataset(path=synthetic_gerald)
+    out = str(tmp_path / "preview")
+
+    previewer = gerald_tools.GERALDPreviewer(gerald, out, labels=["Ks_1", gerald_tools.GERALDLabels.Ne_4],
+                                             n_workers=0)
+    assert previewer.filenames() == ["clip_a=1.50", "clip_a=2.00"]
+    assert gerald_tools.GERALDPreviewer(gerald, out, labels=["Ne_4"], relevant_only=True).filenames() == []
+
+    assert previewer.render_previews() == 2
+    assert cv2.imread(os.path.join(out, "previews", "clip_a=2.00.jpg")).shape == (48, 64, 3)
+
+    im = render_preview(gerald.im_path + "clip_a=1.50.jpg", gerald.an_path + "clip_a=1.50.xml", size=(128, 96))
+    assert im[20, 20].tolist() == list(RELEVANT_COLOR)  # Left edge of the first box, scaled by 2
+    assert im[22, 60].tolist() == list(IRRELEVANT_COLOR)
+
+
+def test_contact_sheets(synthetic_gerald_large, tmp_path):
+    gerald = gerald_tools.GERALDDataset(path=synthetic_gerald_large, subset="val")
+    sheets = gerald_tools.GERALDPreviewer(gerald, str(tmp_path), n_workers=2).render_contact_sheets(
+        tile_size=(80, 45), grid=(2, 2))
+    assert len(sheets) == -(-len(gerald) // 4)
+    assert cv2.imread(sheets[0]).shape == (90, 160, 3)
+
+    with open(os.path.join(str(tmp_path), "sheets", "index.json")) as fp:
+        index = json.load(fp)
+    assert sorted(np.concatenate(list(index.values()))) == sorted(gerald.subset_filenames)
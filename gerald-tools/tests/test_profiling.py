@@ -0,0 +1,68 @@
+import gc
+import json
+import os
+import subprocess
+import sys
+import weakref
+
+from torch.utils.data import DataLoader
+
+import gerald_tools
+
+
+def test_stage_profiler(synthetic_gerald_large, tmp_path):
+    profiler = gerald_tools.StageProfiler()
+    gerald = gerald_tools.GERALDDataset(path=synthetic_gerald_large, random_augment=False, profiler=profiler)
+    gerald.collate_fn([gerald[i] for i in range(4)])
+
+    summary = profiler.summary()
+    assert summary["read"]["count"] == 4 and summary["read"]["bytes"] > 0
+    assert {"decode", "parse", "color", "targets", "collate"} <= set(summary)
+    assert summary["decode"]["p50_ms"] <= summary["decode"]["p99_ms"]
+    assert [e[0] for e in profiler.events][:5] == ["read", "decode", "parse", "targets", "color"]
+
+    profiler.to_chrome_trace(str(tmp_path / "trace.json"))
+    with open(tmp_path / "trace.json") as fp:
+        assert len(json.load(fp)["traceEvents"]) == len(profiler.events)
+
+
+def test_stage_profiler_workers(synthetic_gerald_large, tmp_path):
+    trace_dir = str(tmp_path / "trace")
+    gerald = gerald_tools.GERALDDataset(path=synthetic_gerald_large, random_augment=False,
+                                        profiler=gerald_tools.StageProfiler(trace_dir=trace_dir))
+    for _ in DataLoader(gerald, batch_size=4, num_workers=2, collate_fn=gerald.collate_fn):
+        pass
+
+    merged = gerald_tools.StageProfiler.load(trace_dir)
+    summary = merged.summary(by_worker=True)
+    assert sum(stats["count"] for (worker, stage), stats in summary.items() if stage == "read") == len(gerald)
+    assert {worker for worker, _ in summary} == {0, 1}
+
+
+def test_stage_profiler_flushes_main_process_at_exit(synthetic_gerald_large, tmp_path):
+    trace_dir = str(tmp_path / "trace")
+    script = """
+import sys
+from torch.utils.data import DataLoader
+import gerald_tools
+
+gerald = gerald_tools.GERALDDataset(path=sys.argv[1], random_augment=False,
+                                    profiler=gerald_tools.StageProfiler(trace_dir=sys.argv[2]))
+for _ in DataLoader(gerald, batch_size=4, num_workers=0, collate_fn=gerald.collate_fn):
+    pass
+"""
+    subprocess.run([sys.executable, "-c", script, synthetic_gerald_large, trace_dir], check=True)
+
+    summary = gerald_tools.StageProfiler.load(trace_dir).summary()
+    assert summary["read"]["count"] == 20 and summary["collate"]["count"] == 5
+
+
+def test_stage_profiler_is_released(tmp_path):
+    trace_dir = str(tmp_path / "trace")
+    profiler = gerald_tools.StageProfiler(trace_dir=trace_dir)
+    profiler.record("read", 0.0, 0.5, 10)
+    ref = weakref.ref(profiler)
+    del profiler
+    gc.collect()
+    assert ref() is None
+    assert os.listdir(trace_dir) == ["stages-%d.jsonl" % os.getpid()]  # Flushed when it was collected
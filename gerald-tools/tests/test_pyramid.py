@@ -0,0 +1,36 @@
+import numpy as np
+import torch
+from torch.utils.data import DataLoader
+
+import gerald_tools
+from gerald_tools.pyramid import MultiScaleBatchSampler, build_pyramid
+
+
+def test_pyramid_matches_decoding(synthetic_gerald_large, tmp_path):
+    gerald = gerald_tools.GERALDDataset(path=synthetic_gerald_large, random_augment=False)
+    store = build_pyramid(gerald, str(tmp_path / "pyramid"), scales=(1, 0.5), n_workers=2)
+    assert len(store) == 20 and store.shapes[:, 0].tolist() == [[180, 320, 3], [90, 160, 3]]
+
+    fast = gerald_tools.GERALDDataset(path=synthetic_gerald_large, random_augment=False,
+                                      pyramid=str(tmp_path / "pyramid"))
+    for size, level in (((320, 180), 0), ((160, 90), 1), ((120, 60), 1), ((400, 200), 0)):
+        assert store.level_for(0, size) == level
+        im, targets, _ = fast[(3, size)]
+        ref_im, ref_targets, _ = gerald[(3, size)]
+        assert im.shape == ref_im.shape == (size[1], size[0], 3)
+        assert np.abs(im - ref_im).mean() < 0.02
+        torch.testing.assert_close(targets, ref_targets)
+
+    im, targets, idx = fast[5]
+    assert idx == 5 and im.shape == (180, 320, 3)
+    torch.testing.assert_close(targets, gerald[5][1])
+
+
+def test_multi_scale_batches(synthetic_gerald_large):
+    gerald = gerald_tools.GERALDDataset(path=synthetic_gerald_large, random_augment=False)
+    sampler = MultiScaleBatchSampler(gerald_tools.GERALDSampler(gerald), 4, sizes=[(64, 32), (96, 48)])
+    assert len(sampler) == 5
+
+    loader = DataLoader(gerald, batch_sampler=sampler, collate_fn=gerald.collate_fn)
+    sizes = {tuple(imgs.shape[2:]) for imgs, _, _ in loader}
+    assert sizes <= {(32, 64), (48, 96)}
@@ -0,0 +1,49 @@
+import os
+
+import numpy as np
+from torch.utils.data import DataLoader
+
+import gerald_tools
+from gerald_tools.readahead import worker_init_fn
+from gerald_tools.sampler import GERALDSampler
+
+
+def test_read_ahead(synthetic_gerald_large):
+    gerald = gerald_tools.GERALDDataset(path=synthetic_gerald_large, random_augment=False)
+    order = list(np.random.default_rng(0).permutation(len(gerald)))
+    expected = [gerald[i][0] for i in order]
+
+    gerald.enable_read_ahead(order, n_threads=2, depth=4)
+    for i, im in zip(order, expected):
+        np.testing.assert_array_equal(gerald[i][0], im)
+    assert gerald.read_ahead.hits == len(order)  # Reading started with enable_read_ahead
+
+    gerald[order[0]]  # Not part of the remaining order, read directly
+    assert gerald.read_ahead.misses == 1
+    gerald.disable_read_ahead()
+
+
+def test_read_ahead_byte_cap_and_sampler_order(synthetic_gerald_large):
+    gerald = gerald_tools.GERALDDataset(path=synthetic_gerald_large, random_augment=False)
+    sampler = GERALDSampler(gerald, seed=3)
+    size = os.path.getsize(gerald._image_path(0))
+    gerald.enable_read_ahead(sampler, n_threads=4, depth=16, max_bytes=int(2.5 * size))
+
+    read_ahead = gerald.read_ahead
+    assert len(read_ahead._pending) == 2 and read_ahead._buffered <= read_ahead.max_bytes  # Counted when scheduled
+    for i in sampler:
+        gerald[i]
+        assert read_ahead._buffered <= read_ahead.max_bytes
+    assert read_ahead.misses == 0
+    gerald.disable_read_ahead()
+
+
+def test_read_ahead_workers(synthetic_gerald_large):
+    gerald = gerald_tools.GERALDDataset(path=synthetic_gerald_large, random_augment=False)
+    order = list(range(len(gerald)))[::-1]
+    gerald.enable_read_ahead(order, batch_size=3, num_workers=2)
+
+    loader = DataLoader(gerald, batch_size=3, sampler=order, num_workers=2, collate_fn=gerald.collate_fn,
+                        worker_init_fn=worker_init_fn)
+    idxs = [i for _, _, batch_idxs in loader for i in batch_idxs]
+    assert idxs == order
@@ -0,0 +1,105 @@
+import random
+
+import numpy as np
+import torch
+
+import gerald_tools
+from gerald_tools.sampler import GERALDSampler, HardExampleSampler, SumTree
+
+
+def test_shards_are_even_and_disjoint():
+    shards = [list(GERALDSampler(10, num_replicas=3, rank=r)) for r in range(3)]
+    assert [len(s) for s in shards] == [4, 4, 4]
+    assert set(shards[0]) | set(shards[1]) | set(shards[2]) == set(range(10))
+    assert list(GERALDSampler(10, num_replicas=3, rank=1)) == shards[1]
+
+    dropped = [list(GERALDSampler(10, num_replicas=3, rank=r, drop_last=True)) for r in range(3)]
+    assert sum(len(s) for s in dropped) == 9 and len(set(sum(dropped, []))) == 9
+
+
+def test_epochs_and_resume():
+    sampler = GERALDSampler(50, num_replicas=2, rank=0)
+    first = list(sampler)
+    sampler.set_epoch(1)
+    second = list(sampler)
+    assert first != second and sorted(first + list(GERALDSampler(50, num_replicas=2, rank=1))) == list(range(50))
+
+    it = iter(sampler)
+    seen = [next(it) for _ in range(7)]
+    state = sampler.state_dict()
+
+    resumed = GERALDSampler(50, num_replicas=2, rank=0)
+    resumed.load_state_dict(state)
+    assert len(resumed) == 18
+    assert seen + list(resumed) == second
+    assert list(resumed) == second  # Only the resumed epoch skips samples
+
+
+def test_dataset_keeps_global_random_state(synthetic_gerald):
+    random.seed(1)
+    expected = random.random()
+    random.seed(1)
+    gerald_tools.GERALDDataset(path=synthetic_gerald, subset="test", test=0.5)
+    assert random.random() == expected
+
+
+def test_sum_tree_matches_cumulative_sum():
+    tree = SumTree(13)
+    priorities = np.random.default_rng(0).random(13)
+    tree.rebuild(priorities)
+    tree.update([2, 12], [5.0, 0.0])
+    priorities[[2, 12]] = [5.0, 0.0]
+    assert np.isclose(tree.total, priorities.sum())
+
+    values = np.random.default_rng(1).random(500) * tree.total
+    assert (tree.sample(values) == np.searchsorted(np.cumsum(priorities), values, side="right")).all()
+
+
+def test_hard_examples_are_sampled_more_often():
+    sampler = HardExampleSampler(100, num_samples=2000, uniform=0.1, momentum=0.0, num_replicas=1, rank=0)
+    sampler.update(torch.arange(100), torch.full((100,), 0.1))
+    sampler.update([7], [10.0])
+    sampler.set_epoch(0)
+    counts = np.bincount(list(sampler), minlength=100)
+    assert counts[7] > 500 and counts.min() > 0  # 0.9 * 10 / 19.9 + 0.1 / 100 of the draws
+
+    weights = sampler.importance_weights([7, 8])
+    assert weights[0] < weights[1] == 1
+
+
+def test_hard_example_ranks_and_resume():
+    samplers = [HardExampleSampler(30, temperature=0.5, num_replicas=2, rank=r) for r in range(2)]
+    for sampler in samplers:  # Without torch.distributed, every rank gets the feedback of all ranks
+        sampler.update([1, 2, 3], [4.0, 0.5, 2.0])
+        sampler.set_epoch(0)
+    shards = [list(sampler) for sampler in samplers]
+    assert len(shards[0]) == len(shards[1]) == 15
+    assert samplers[0].permutation().tolist() == samplers[1].permutation().tolist()
+    assert samplers[0].permutation()[1::2].tolist() == shards[1]
+
+    sampler = samplers[0]
+    sampler.set_epoch(1)
+    it = iter(sampler)
+    seen = [next(it) for _ in range(4)]
+    sampler.update(seen, [9.0] * 4)
+    state = sampler.state_dict()
+    rest = list(it)
+
+    resumed = HardExampleSampler(30, num_replicas=2, rank=0)
+    resumed.load_state_dict(state)
+    assert list(resumed) == rest
+    assert resumed.temperature == 0.5 and np.isnan(resumed.losses[seen]).sum() == np.isnan(sampler.losses[seen]).sum()
+    resumed.set_epoch(2)  # Applies the restored feedback
+    assert not np.isnan(resumed.losses[seen]).any()
+
+
+def test_hard_example_indices_match_iteration():
+    sampler = HardExampleSampler(50, num_replicas=1, rank=0)
+    sampler.update(range(10), np.linspace(0, 5, 10))
+    sampler.set_epoch(1)
+    assert list(sampler) == sampler.indices().tolist()
+
+    sampler.update([3], [100.0])  # Recorded during the epoch, used from the next one
+    assert list(sampler) == sampler.indices().tolist()
+    sampler.set_epoch(2)
+    assert sampler.losses[3] > 10 and list(sampler) == sampler.indices().tolist()
@@ -0,0 +1,87 @@
+import shutil
+
+import numpy as np
+import pytest
+
+import gerald_tools
+from gerald_tools.synthetic import write_sample
+from gerald_tools.splits import GERALDSplits, iterative_stratification, video_of
+
+
+def test_iterative_stratification_balances_labels():
+    # 40 groups, a rare label in 4 of them and a common one in 20
+    counts = np.zeros((40, 2), dtype=np.int64)
+    counts[:4, 0] = 1
+    counts[::2, 1] = 1
+    folds = iterative_stratification(counts, np.ones(40), [0.5, 0.25, 0.25], seed=0)
+    assert np.bincount(folds, minlength=3).tolist() == [20, 10, 10]
+    assert np.bincount(folds[:4], minlength=3).tolist() == [2, 1, 1]
+    assert np.bincount(folds[::2], minlength=3).tolist() == [10, 5, 5]
+
+
+def test_subsets_are_disjoint_and_grouped_by_video(synthetic_gerald_large):
+    subsets = {name: gerald_tools.GERALDDataset(path=synthetic_gerald_large, subset=name, test=0.2)
+               for name in ("train", "val", "test")}
+    filenames = {name: set(d.subset_filenames) for name, d in subsets.items()}
+    assert sum(len(fns) for fns in filenames.values()) == 20
+    assert set.union(*filenames.values()) == set(subsets["train"].filenames)
+
+    videos = {name: {video_of(fn) for fn in fns} for name, fns in filenames.items()}
+    assert not videos["train"] & videos["val"] and not videos["train"] & videos["test"]
+    assert len(subsets["test"]) == subsets["test"].n_test_images > 0
+
+
+def test_k_fold_and_split_file(synthetic_gerald_large, tmp_path):
+    split_file = str(tmp_path / "splits.npz")
+    vals = [set(gerald_tools.GERALDDataset(path=synthetic_gerald_large, subset="val", k_folds=3, fold=i,
+                                           split_file=split_file).subset_filenames) for i in range(3)]
+    test = gerald_tools.GERALDDataset(path=synthetic_gerald_large, subset="test", k_folds=3, split_file=split_file)
+    assert sum(len(v) for v in vals) + len(test) == 20
+    assert not (vals[0] & vals[1]) and not (vals[1] & vals[2])
+
+    splits = GERALDSplits.load(split_file)
+    assert splits.k_folds == 3 and len(splits.folds) == 20 and splits.folds.dtype == np.int8
+    train = gerald_tools.GERALDDataset(path=synthetic_gerald_large, subset="train", k_folds=3, fold=1,
+                                       split_file=split_file)
+    assert set(train.subset_filenames) == vals[0] | vals[2]
+
+
+def test_new_images_keep_existing_assignments(synthetic_gerald_large, tmp_path):
+    path = str(tmp_path / "gerald")
+    shutil.copytree(synthetic_gerald_large, path)
+    split_file = str(tmp_path / "splits.npz")
+    gerald = gerald_tools.GERALDDataset(path=path, test=0.2, split_file=split_file)
+    in_memory = gerald_tools.GERALDDataset(path=path, test=0.2)
+    before = dict(zip(gerald.splits.filenames, gerald.splits.folds.tolist()))
+    first = gerald.splits.filenames[0]
+    known_video = video_of(first)
+
+    write_sample(path, known_video + "=99.00", [("Hp_0_HV", 1, 10, 5, 14, 20)], size=(320, 180))
+    write_sample(path, "new_video=1.00", [("Ne_4", 1, 10, 5, 14, 20)], size=(320, 180))
+    for dataset in (gerald, in_memory):
+        dataset.refresh()
+        after = dict(zip(dataset.splits.filenames, dataset.splits.folds.tolist()))
+        assert len(after) == len(before) + 2
+        assert all(after[fn] == fold for fn, fold in before.items())
+        assert after[known_video + "=99.00"] == before[first]
+
+    stored = GERALDSplits.load(split_file)
+    assert stored.select(list(before)).folds.tolist() == list(before.values())
+    assert gerald_tools.GERALDDataset(path=path, test=0.2, split_file=split_file).splits.folds.tolist() == \
+        gerald.splits.folds.tolist()
+
+    with pytest.raises(ValueError):
+        gerald_tools.GERALDDataset(path=path, test=0.3, split_file=split_file)
+
+
+@pytest.mark.parametrize("seed", range(4))
+def test_fold_sizes_follow_the_ratios(seed):
+    # 10 videos with 6 frames each, every fold has to get whole videos
+    rng = np.random.default_rng(seed)
+    counts = (rng.random((10, 20)) < 0.3) * 6
+    folds = iterative_stratification(counts, np.full(10, 6), [0.1, 0.72, 0.18], seed=seed)
+    assert np.bincount(folds, minlength=3).tolist() == [1, 7, 2]
+
+    # Without any room, a fold with a non-zero ratio still gets a group
+    folds = iterative_stratification(np.ones((3, 1)), np.array([5, 5, 5]), [0.02, 0.9, 0.08], seed=seed)
+    assert sorted(np.bincount(folds, minlength=3).tolist()) == [1, 1, 1]
@@ -0,0 +1,41 @@
+import json
+import os
+
+import numpy as np
+
+import gerald_tools
+from gerald_tools.synthetic import write_sample
+
+
+def test_validate_and_cache(synthetic_gerald):
+    path = synthetic_gerald
+    validator = gerald_tools.GERALDValidator(path, n_workers=2)
+    report = validator.validate()
+    assert report["files"] == 3 and report["issues"] == {} and report["problems"] == []
+
+    noise = np.random.default_rng(0).integers(0, 255, (48, 64, 3), dtype=np.uint8)
+    write_sample(path, "clip_c=1.00", [("Hp_0", 0, 60, 10, 70, 20), ("Foo", 0, 5, 5, 5, 9)], im=noise)
+    with open(os.path.join(path, "JPEGImages", "clip_a=2.00.jpg"), 'rb+') as fp:
+        fp.truncate(200)
+    with open(os.path.join(path, "info.json")) as fp:
+        infos = json.load(fp)
+    del infos["clip_b=7.25.jpg"]
+    with open(os.path.join(path, "info.json"), 'w') as fp:
+        json.dump(infos, fp)
+
+    report = validator.validate()
+    assert report["validated"] == 3 and report["cached"] == 1
+    codes = {stem: [issue[0] for issue in issues] for stem, issues in report["issues"].items()}
+    assert codes == {"clip_a=2.00": ["truncated_jpeg", "undecodable_image"],
+                     "clip_b=7.25": ["missing_info"],
+                     "clip_c=1.00": ["unknown_label", "empty_box", "box_out_of_frame", "stale_phash"]}
+
+    with open(os.path.join(path, "Annotations", "clip_a=1.50.xml")) as fp:
+        xml = fp.read()
+    with open(os.path.join(path, "Annotations", "clip_a=1.50.xml"), 'w') as fp:
+        fp.write(xml.replace("<width>64</width>", "<width>640</width>"))
+
+    report = validator.validate()
+    assert report["validated"] == 1
+    assert report["issues"]["clip_a=1.50"] == [["size_mismatch", "XML size 640x48, image size 64x48"]]
+    assert report["counts"]["missing_info"] == 1
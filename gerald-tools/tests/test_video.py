@@ -0,0 +1,68 @@
+import json
+import os
+
+import numpy as np
+from cv2 import cv2
+
+import gerald_tools
+from gerald_tools.video import extract_frames, extract_videos, find_videos, frame_times
+from gerald_tools.voc import read_voc_xml
+
+
+def write_video(path, n_frames=100, fps=10, size=(64, 48)):
+    """
+    Every frame is flat gray with brightness 2 * frame index, so extracted frames can be identified
+    """
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), fps, size)
+    for i in range(n_frames):
+        writer.write(np.full((size[1], size[0], 3), 2 * i, dtype=np.uint8))
+    writer.release()
+
+
+def brightness(path):
+    return cv2.imread(path).mean()
+
+
+def test_extract_frames(tmp_path):
+    video = str(tmp_path / "clip.mp4")
+    write_video(video)
+    out = str(tmp_path / "gerald")
+
+    entries = extract_frames(video, [0.5, 3.0, 3.01, 20.0], out, n_threads=2)
+    assert sorted(entries) == ["clip=0.50.jpg", "clip=3.00.jpg", "clip=3.01.jpg"]  # 20s is past the end
+    assert abs(brightness(os.path.join(out, "JPEGImages", "clip=0.50.jpg")) - 10) < 3
+    assert abs(brightness(os.path.join(out, "JPEGImages", "clip=3.00.jpg")) - 60) < 3
+
+    record = read_voc_xml(os.path.join(out, "Annotations", "clip=3.00.xml"))
+    assert (record.width, record.height, len(record.names)) == (64, 48, 0)
+
+    assert extract_frames(video, [0.5], out) == {}  # Existing images are skipped
+
+
+def test_extract_videos_into_dataset(synthetic_gerald, tmp_path):
+    video_dir = tmp_path / "videos"
+    os.makedirs(video_dir / "sub")
+    write_video(str(video_dir / "clip_a.mp4"))
+    write_video(str(video_dir / "sub" / "clip_b.mp4"))
+    write_video(str(video_dir / "unrelated.mp4"), n_frames=5)
+
+    times = frame_times(synthetic_gerald, offsets=(0, 0.5))
+    assert times == {"clip_a": [1.5, 2.0, 2.5], "clip_b": [7.25, 7.75]}
+    videos = find_videos(str(video_dir), names=set(times))
+    assert sorted(videos) == ["clip_a", "clip_b"]
+
+    counts = extract_videos(videos, times, synthetic_gerald, n_workers=2)
+    assert counts == {"clip_a": 1, "clip_b": 1}  # Annotated frames already exist
+
+    with open(os.path.join(synthetic_gerald, "info.json")) as fp:
+        infos = json.load(fp)
+    assert infos["clip_a=2.50.jpg"]["weather"] == "Sunny"  # Inherited from the other frames of the video
+    assert infos["clip_b=7.75.jpg"]["light"] == "Dark"
+    assert len(infos["clip_a=2.50.jpg"]["pHash"]) == 16
+
+    counts = extract_videos(videos, times, synthetic_gerald, overwrite=True, n_workers=0)
+    assert counts == {"clip_a": 3, "clip_b": 2}
+    assert len(read_voc_xml(os.path.join(synthetic_gerald, "Annotations", "clip_a=1.50.xml")).names) == 2
+
+    gerald = gerald_tools.GERALDDataset(path=synthetic_gerald, shuffle=False)
+    assert len(gerald) == 5
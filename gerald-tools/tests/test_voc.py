@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+
+import gerald_tools
+from gerald_tools.voc import OBJECT_TEMPLATE, XML_TEMPLATE, etree_voc_xml, parse_voc_xml, scan_voc_xml
+
+OBJECTS = "".join(OBJECT_TEMPLATE.format(name=name, difficult=i % 2, xmin=10.5 + i, ymin=4, xmax=20.49, ymax=30)
+                  for i, name in enumerate(["Hp_0_HV", "Zs_3", "Ne_4"]))
+SAMPLE = XML_TEMPLATE.format(filename="clip=12.50.jpg", width=1920, height=1080, objects=OBJECTS)
+
+
+@pytest.mark.parametrize("xml", [
+    SAMPLE,
+    XML_TEMPLATE.format(filename="clip=0.00.jpg", width=1280, height=720, objects=""),
+    '<?xml version="1.0" encoding="utf-8"?>\n' + SAMPLE.replace("<annotation>", '<annotation verified="yes">'),
+    SAMPLE.replace("</annotation>", "<weather>Foggy</weather><light>Dark</light></annotation>"),
+    SAMPLE.replace("\n", "\r\n"),
+    SAMPLE.replace("<difficult>1</difficult>", "").replace("</bndbox>", "</bndbox><difficult>1</difficult>"),
+])
+def test_scanner_matches_etree(xml):
+    data = xml.encode("utf-8")
+    record = scan_voc_xml(data)
+    assert record is not None
+    assert record == etree_voc_xml(data)
+
+
+@pytest.mark.parametrize("xml", [
+    SAMPLE.replace("<segmented>", "<!-- comment --><segmented>"),
+    SAMPLE.replace("clip=12.50.jpg", "clip&amp;co=12.50.jpg"),
+    SAMPLE.replace("<segmented>0</segmented>", "<segmented/>"),
+])
+def test_fallback_to_etree(xml):
+    data = xml.encode("utf-8")
+    assert scan_voc_xml(data) is None
+    assert parse_voc_xml(data) == etree_voc_xml(data)
+
+
+def test_targets_match_annotation(synthetic_gerald):
+    gerald = gerald_tools.GERALDDataset(path=synthetic_gerald, shuffle=False, random_augment=False)
+
+    for i, an in enumerate(gerald.subset_annotations):
+        expected = np.array([[o.x_c, o.y_c, o.w, o.h, o.label.value, 0] for o in an.objects]).reshape((-1, 6))
+        np.testing.assert_array_equal(gerald[i][1].numpy(), expected)
+
+    an = gerald.registry["clip_a=2.00"]
+    assert (an.objects[0].x_min, an.objects[0].y_min) == (20, 5)
+    assert an.objects[0].relevant and an.weather == gerald_tools.WeatherCondition.Rainy